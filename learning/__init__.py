@@ -27,6 +27,7 @@ from learning.data import datasets
 
 # Add transfer functions
 from learning.transfer import (LinearTransfer, TanhTransfer, ReluTransfer,
+                               LeakyReluTransfer, SoftplusTransfer,
                                GaussianTransfer, SoftmaxTransfer)
 
 # Add error functions
@@ -22,14 +22,13 @@
 # SOFTWARE.
 ###############################################################################
 
-import random
 import copy
 import functools
 import operator
 
 import numpy
 
-from learning import calculate, optimize
+from learning import calculate, chunking, optimize, profile, sparse
 from learning import Model, LinearTransfer, ReluTransfer, MeanSquaredError
 from learning.transfer import Transfer
 from learning.optimize import Problem, SteepestDescent
@@ -51,6 +50,19 @@ class MLP(Model):
         error_func: ErrorFunc; Error function for optimizing weight matrices.
         jacobian_norm_break: Training will end if objective gradient norm
             is less than this value.
+        max_batch_rows: Optional. Maximum number of rows to activate at once,
+            when computing objective value and gradient.
+            Larger datasets are evaluated in chunks of rows.
+        memory_budget: Optional. Maximum bytes of activations to store at once,
+            when computing objective value and gradient.
+            Rows in each chunk are chosen from layer widths.
+        num_threads: Optional. Number of threads used to compute
+            objective value and gradient. Rows are split into one shard
+            for each thread, and shard gradients are summed.
+            Large datasets benefit most. When using more than 1 thread,
+            consider limiting BLAS threads, to avoid oversubscription.
+        optimizer_memory_budget: Optional. Maximum bytes of optimizer state,
+            used to choose an optimizer when optimizer is not given.
     """
 
     def __init__(self,
@@ -58,7 +70,11 @@ class MLP(Model):
                  transfers=None,
                  optimizer=None,
                  error_func=None,
-                 jacobian_norm_break=1e-10):
+                 jacobian_norm_break=1e-10,
+                 max_batch_rows=None,
+                 memory_budget=None,
+                 num_threads=None,
+                 optimizer_memory_budget=None):
         super(MLP, self).__init__()
 
         if transfers is None:
@@ -88,7 +104,8 @@ class MLP(Model):
                 sum([
                     reduce(operator.mul, weight_matrix.shape)
                     for weight_matrix in self._weight_matrices
-                ]))
+                ]),
+                memory_budget=optimizer_memory_budget)
 
         self._optimizer = optimizer
 
@@ -100,11 +117,29 @@ class MLP(Model):
         # Convergence criteria
         self._jacobian_norm_break = jacobian_norm_break
 
+        # Chunking of large datasets
+        self._max_batch_rows = max_batch_rows
+        self._memory_budget = memory_budget
+
+        # Sharding across threads
+        if num_threads is None:
+            num_threads = 1
+        if num_threads < 1:
+            raise ValueError('num_threads must be >= 1')
+        self._num_threads = num_threads
+
         # Activation vectors
         # 1 for input, then 2 for each hidden and output (1 for transfer, 1 for perceptron))
         # To help with jacobian calculation
         self._weight_inputs = [None]*(len(self._shape))
         self._transfer_inputs = [None]*(len(self._shape)-1)
+        # Transfer outputs, before dropout masks, for transfer derivatives
+        self._transfer_outputs = [None]*(len(self._shape)-1)
+
+        # Optional dropout masks, multiplied with the inputs of each weight matrix.
+        # None, or a list with None or a (num_samples, num_inputs) matrix
+        # for each weight matrix. Used by DropoutMLP during training.
+        self._masks = None
 
         self.reset()
 
@@ -134,7 +169,9 @@ class MLP(Model):
     def activate(self, input_tensor):
         """Return the model outputs for given input_tensor."""
         # Make sure input_tensor is a numpy array, for consistency
-        if not isinstance(input_tensor, numpy.ndarray):
+        # Sparse matrices are kept sparse, for sparse products in first layer
+        if not (isinstance(input_tensor, numpy.ndarray)
+                or sparse.issparse(input_tensor)):
             input_tensor = numpy.array(input_tensor)
 
         try:
@@ -145,19 +182,35 @@ class MLP(Model):
             # Do not check shape
             pass
 
+        # Dropout mask for inputs, each hidden layer, and (never) output
+        if self._masks is None:
+            masks = [None] * len(self._weight_inputs)
+        else:
+            masks = self._masks + [None]
+
+        if masks[0] is not None:
+            if sparse.issparse(input_tensor):
+                input_tensor = input_tensor.toarray()
+            input_tensor = input_tensor * masks[0]
+
         self._weight_inputs[0] = input_tensor
         # First part includes bias vector
-        self._transfer_inputs[0] = numpy.dot(
+        self._transfer_inputs[0] = sparse.dot(
             self._weight_inputs[0], self._weight_matrices[0]) + self._bias_vec
-        self._weight_inputs[1] = self._transfers[0](self._transfer_inputs[0])
+        self._transfer_outputs[0] = self._transfers[0](
+            self._transfer_inputs[0])
+        self._weight_inputs[1] = _apply_mask(self._transfer_outputs[0],
+                                             masks[1])
 
         for i, (weight_matrix, transfer_func) in list(
                 enumerate(zip(self._weight_matrices, self._transfers)))[1:]:
             # Track all activations for learning, and layer inputs
             self._transfer_inputs[i] = numpy.dot(self._weight_inputs[i],
                                                  weight_matrix)
-            self._weight_inputs[i + 1] = transfer_func(
+            self._transfer_outputs[i] = transfer_func(
                 self._transfer_inputs[i])
+            self._weight_inputs[i + 1] = _apply_mask(
+                self._transfer_outputs[i], masks[i + 1])
 
         # Return activation of the only layer that feeds into output
         return numpy.copy(self._weight_inputs[-1])
@@ -172,10 +225,11 @@ class MLP(Model):
                 obj_func=
                 lambda xk: self._get_obj(xk, input_matrix, target_matrix),
                 obj_jac_func=
-                lambda xk: self._get_obj_jac(xk, input_matrix, target_matrix)),
-            _flatten(self._bias_vec, self._weight_matrices))
-        self._bias_vec, self._weight_matrices = _unflatten_weights(
-            flat_weights, self._shape)
+                lambda xk: self._get_obj_jac(xk, input_matrix, target_matrix),
+                residual_jac_func=
+                lambda xk: self._get_residual_jac(xk, input_matrix, target_matrix)),
+            self._get_flat_parameters())
+        self._set_flat_parameters(flat_weights)
 
         self.converged = self._optimizer.jacobian is not None and numpy.linalg.norm(
             self._optimizer.jacobian) < self._jacobian_norm_break
@@ -186,26 +240,156 @@ class MLP(Model):
 
         Optional.
         """
-        # Reset optimizer, because problem may change on next train call
-        self._optimizer.reset()
+        if self._keep_optimizer_state:
+            # Keep learned state, for the next mini-batch
+            self._optimizer.problem_changed()
+        else:
+            # Reset optimizer, because problem may change on next train call
+            self._optimizer.reset()
+
+        # Do not hold arrays cached for the training set
+        for transfer in self._transfers:
+            transfer.clear_cache()
 
     ######################################
     # Helper functions for optimizer
     ######################################
-    def _get_obj(self, parameter_vec, input_matrix, target_matrix):
-        """Helper function for Optimizer to get objective value."""
+    def _get_flat_parameters(self):
+        """Return flat vector of model parameters."""
+        return _flatten(self._bias_vec, self._weight_matrices)
+
+    def _set_flat_parameters(self, parameter_vec):
+        """Set model parameters from flat vector."""
         self._bias_vec, self._weight_matrices = _unflatten_weights(
             parameter_vec, self._shape)
-        return self._error_func(self.activate(input_matrix), target_matrix)
 
+    def _get_obj(self, parameter_vec, input_matrix, target_matrix):
+        """Helper function for Optimizer to get objective value."""
+        self._set_flat_parameters(parameter_vec)
+        num_rows = chunking.num_rows(input_matrix)
+        num_shards = chunking.get_num_shards(num_rows, self._num_threads)
+        if num_shards > 1:
+            return chunking.sharded_obj(
+                functools.partial(self._call_on_worker, '_get_chunked_error',
+                                  input_matrix, target_matrix), num_rows,
+                num_shards)
+        return self._get_chunked_error(input_matrix, target_matrix)
 
     def _get_obj_jac(self, parameter_vec, input_matrix, target_matrix):
         """Helper function for Optimizer to get objective value and derivative."""
-        self._bias_vec, self._weight_matrices = _unflatten_weights(
-            parameter_vec, self._shape)
-        # Return error and flattened jacobians
-        return (lambda obj, vec, jac: (obj, _flatten(vec, jac)))(
-            *self._get_jacobians(input_matrix, target_matrix))
+        self._set_flat_parameters(parameter_vec)
+        num_rows = chunking.num_rows(input_matrix)
+        num_shards = chunking.get_num_shards(num_rows, self._num_threads)
+        if num_shards > 1:
+            return chunking.sharded_obj_jac(
+                functools.partial(self._call_on_worker,
+                                  '_get_chunked_error_flat_jacobian',
+                                  input_matrix, target_matrix), num_rows,
+                num_shards)
+        return self._get_chunked_error_flat_jacobian(input_matrix,
+                                                     target_matrix)
+
+    def _get_chunked_error(self, input_matrix, target_matrix):
+        """Return error for given dataset, activating chunks of rows if needed."""
+        chunk_rows = self._get_chunk_rows(input_matrix)
+        if chunk_rows is None:
+            return self._get_error(input_matrix, target_matrix)
+        return chunking.chunked_obj(
+            functools.partial(self._call_on_rows, self._get_error,
+                              input_matrix, target_matrix),
+            chunking.num_rows(input_matrix), chunk_rows)
+
+    def _get_chunked_error_flat_jacobian(self, input_matrix, target_matrix):
+        """Return error and flattened jacobians, activating chunks of rows if needed."""
+        chunk_rows = self._get_chunk_rows(input_matrix)
+        if chunk_rows is None:
+            return self._get_error_flat_jacobian(input_matrix, target_matrix)
+        return chunking.chunked_obj_jac(
+            functools.partial(self._call_on_rows,
+                              self._get_error_flat_jacobian, input_matrix,
+                              target_matrix),
+            chunking.num_rows(input_matrix), chunk_rows)
+
+    def _get_residual_jac(self, parameter_vec, input_matrix, target_matrix):
+        """Helper function for Optimizer to get residuals and residual jacobian.
+
+        Requires a sum of squares error function, such as MeanSquaredError.
+        """
+        self._set_flat_parameters(parameter_vec)
+        with profile.phase(profile.FORWARD):
+            residuals, scale = self._error_func.residuals(
+                self.activate(input_matrix), target_matrix)
+        with profile.phase(profile.BACKWARD):
+            output_jacobian = self._get_output_jacobian()
+        return residuals, scale * output_jacobian.reshape(
+            len(residuals), -1)
+
+    def _get_error(self, input_matrix, target_matrix):
+        """Return error for given dataset."""
+        with profile.phase(profile.FORWARD):
+            return self._error_func(self.activate(input_matrix), target_matrix)
+
+    def _get_error_flat_jacobian(self, input_matrix, target_matrix):
+        """Return error and flattened jacobians for given dataset."""
+        error, bias_jacobian, jacobians = self._get_jacobians(
+            input_matrix, target_matrix)
+        return error, _flatten(bias_jacobian, jacobians)
+
+    ######################################
+    # Chunking
+    ######################################
+    def _get_chunk_rows(self, input_matrix):
+        """Return number of rows in each chunk, or None to use all rows."""
+        if self._max_batch_rows is None and self._memory_budget is None:
+            return None
+
+        # Inputs, and transfer inputs, outputs, and partial jacobian of each layer
+        row_values = self._shape[0] + 3 * sum(self._shape[1:])
+        return chunking.get_chunk_rows(
+            chunking.num_rows(input_matrix), row_values,
+            max_batch_rows=self._max_batch_rows,
+            memory_budget=self._memory_budget)
+
+    def _call_on_rows(self, func, input_matrix, target_matrix, rows):
+        """Return func of selected rows of inputs and targets.
+
+        Dropout masks, if any, are also selected.
+        """
+        masks = self._masks
+        if masks is not None:
+            self._masks = [
+                None if mask is None else mask[rows] for mask in masks
+            ]
+        try:
+            return func(input_matrix[rows], target_matrix[rows])
+        finally:
+            self._masks = masks
+
+    ######################################
+    # Threading
+    ######################################
+    def _call_on_worker(self, method_name, input_matrix, target_matrix,
+                        rows):
+        """Return method of a worker copy of this model, on selected rows.
+
+        Safe to call from multiple threads at once.
+        """
+        worker = self._get_worker()
+        return worker._call_on_rows(
+            getattr(worker, method_name), input_matrix, target_matrix, rows)
+
+    def _get_worker(self):
+        """Return copy of this model, sharing parameters, with its own activations.
+
+        Activations and transfer caches are stored on the model,
+        so each thread must use its own copy.
+        """
+        worker = copy.copy(self)
+        worker._transfers = [copy.copy(transfer) for transfer in self._transfers]
+        worker._weight_inputs = [None] * len(self._weight_inputs)
+        worker._transfer_inputs = [None] * len(self._transfer_inputs)
+        worker._transfer_outputs = [None] * len(self._transfer_outputs)
+        return worker
 
     ######################################
     # Objective Derivative
@@ -230,12 +414,22 @@ class MLP(Model):
         # d/dw_1 e(MLP(X), Y) = X W_2 ... W_n f_1'(X W_1 + b) ... f_2'(f_1(X W_1 + b)W_2) ... f_n'(...(f_1(X W_1 + b)...)W_n) e'(f_n(...(f_1(X W_1 + b)...)W_n), Y)
         # d/db e(MLP(X), Y) = \vec{1}^T W_2 ... W_n f_1'(X W_1 + b) ... f_2'(f_1(X W_1 + b)W_2) ... f_n'(...(f_1(X W_1 + b)...)W_n) e'(f_n(...(f_1(X W_1 + b)...)W_n), Y)
 
-        output_matrix = self.activate(input_matrix)
+        with profile.phase(profile.FORWARD):
+            output_matrix = self.activate(input_matrix)
 
-        # Error and error derivative: e'(mlp(X), Y) = e'(f_n(...(f_1(X W_1 + b)...)W_n), Y)
-        error, error_jac = self._error_func.derivative(output_matrix,
-                                                       target_matrix)
+            # Error and error derivative: e'(mlp(X), Y) = e'(f_n(...(f_1(X W_1 + b)...)W_n), Y)
+            error, error_jac = self._error_func.derivative(output_matrix,
+                                                           target_matrix)
 
+        with profile.phase(profile.BACKWARD):
+            bias_jacobian, jacobians = self._backpropagate(error_jac)
+        return error, bias_jacobian, jacobians
+
+    def _backpropagate(self, error_jac):
+        """Return bias jacobian, and jacobian matrix for each weight matrix.
+
+        Uses transfer inputs and outputs from the last call to activate.
+        """
         # Calculate a series of partial jacobians (from d/dW_n to d/dW_1).
         # These jacobians include everything except the final f_{i-1}(...(f_1(X W_1 + b)...)W_{i-1}) (or X for d/W_1)
         # multiplication with partial jacobian corresponding to d/dW_i
@@ -245,21 +439,7 @@ class MLP(Model):
         # ...
         # For d/dW_1: ((((e'(f_n(...(f_1(X W_1 + b)...)W_n), Y) f_n'(...(f_1(X W_1 + b)...)W_n)) W_n^T) f_{n-1}'(...(f_1(X W_1 + b)...)W_{n-1}) ... ) W_2^T) f_1'(X W_1 + b)
 
-        # TODO: Add optimization for cross entropy and softmax output (just o - t)
-        # Derivative of error_vec w.r.t. output transfer
-        partial_jacobians = [
-            _dot_diag_or_matrix(error_jac, self._transfers[-1].derivative(
-                self._transfer_inputs[-1], self._weight_inputs[-1]))
-        ]
-        for weight_matrix, transfer_func, transfer_inputs, weight_inputs in reversed(
-                zip(self._weight_matrices[1:], self._transfers[:-1],
-                    self._transfer_inputs[:-1], self._weight_inputs[1:])):
-            partial_jacobians.append(
-                _dot_diag_or_matrix(partial_jacobians[-1].dot(weight_matrix.T),
-                                    transfer_func.derivative(
-                                        transfer_inputs, weight_inputs)))
-        # Reverse so partial_jacobians[0] corresponds to d/dW_1
-        partial_jacobians = list(reversed(partial_jacobians))
+        partial_jacobians = self._get_partial_jacobians(error_jac)
 
         # Finalize jacobian for each weight matrix
         # by multiplying final f_{i-1}(...(f_1(X W_1 + b)...)W_{i-1}) (or X for d/W_1)
@@ -273,7 +453,102 @@ class MLP(Model):
         ]
 
         # Bias is \vec{1}^T times partial jacobian (instead of inputs X)
-        return error, numpy.sum(partial_jacobians[0], axis=0), jacobians
+        return numpy.sum(partial_jacobians[0], axis=0), jacobians
+
+    def _get_partial_jacobians(self, error_jac):
+        """Return partial jacobian of each layer, with a row for each sample.
+
+        Partial jacobian i is the jacobian with regard to the transfer inputs
+        of layer i, for each sample.
+        Uses transfer inputs and outputs from the last call to activate.
+        """
+        # TODO: Add optimization for cross entropy and softmax output (just o - t)
+        # Derivative of error_vec w.r.t. output transfer
+        partial_jacobians = [
+            _dot_transfer_derivative(error_jac, self._transfers[-1],
+                                     self._transfer_inputs[-1],
+                                     self._transfer_outputs[-1])
+        ]
+        # Dropout mask of each hidden layer output
+        masks = self._masks[1:] if self._masks is not None else [None] * (
+            len(self._weight_matrices) - 1)
+        for weight_matrix, transfer_func, transfer_inputs, transfer_outputs, mask in reversed(
+                zip(self._weight_matrices[1:], self._transfers[:-1],
+                    self._transfer_inputs[:-1], self._transfer_outputs[:-1],
+                    masks)):
+            output_jacobian = partial_jacobians[-1].dot(weight_matrix.T)
+            if mask is not None:
+                # Dropped out neurons have no gradient,
+                # others are scaled like their outputs
+                output_jacobian *= mask
+            partial_jacobians.append(
+                _dot_transfer_derivative(output_jacobian, transfer_func,
+                                         transfer_inputs, transfer_outputs))
+        # Reverse so partial_jacobians[0] corresponds to d/dW_1
+        return list(reversed(partial_jacobians))
+
+    def _get_output_jacobian(self):
+        """Return jacobian of each output of each sample, with regard to flat parameters.
+
+        Returns a (num_samples, num_outputs, num_parameters) tensor.
+        Uses transfer inputs and outputs from the last call to activate.
+        """
+        # Layer inputs for each sample, dense for per sample products
+        weight_inputs = [
+            inputs.toarray() if sparse.issparse(inputs) else inputs
+            for inputs in self._weight_inputs[:-1]
+        ]
+        num_samples, num_outputs = self._weight_inputs[-1].shape
+
+        output_jacobian = numpy.empty(
+            (num_samples, num_outputs,
+             self._shape[1] + sum(inputs.shape[1] * width
+                                  for inputs, width in zip(
+                                      weight_inputs, self._shape[1:]))))
+        for output in range(num_outputs):
+            # Backpropagate derivative of this output only
+            output_jac = numpy.zeros((num_samples, num_outputs))
+            output_jac[:, output] = 1.0
+            partial_jacobians = self._get_partial_jacobians(output_jac)
+
+            # Jacobian of each weight matrix, for each sample, is the
+            # outer product of layer inputs and partial jacobian.
+            # Bias jacobian is the first partial jacobian.
+            output_jacobian[:, output] = numpy.hstack(
+                [partial_jacobians[0]] + [
+                    (inputs[:, :, None] * partial[:, None, :]).reshape(
+                        num_samples, -1)
+                    for inputs, partial in zip(weight_inputs,
+                                               partial_jacobians)
+                ])
+        return output_jacobian
+
+
+def _dot_transfer_derivative(tensor, transfer_func, transfer_inputs,
+                             transfer_outputs):
+    """Dot tensor with derivative of transfer_func.
+
+    Derivatives of identity transfers are skipped,
+    and diagonal derivatives are multiplied in place.
+    """
+    if transfer_func.identity:
+        return tensor
+
+    derivative = transfer_func.derivative(transfer_inputs, transfer_outputs)
+    if derivative.shape == tensor.shape:
+        # Derivative is a new array, only used here
+        return numpy.multiply(tensor, derivative, out=derivative)
+    return _dot_diag_or_matrix(tensor, derivative)
+
+
+def _apply_mask(transfer_outputs, mask):
+    """Return transfer_outputs multiplied by dropout mask, if any.
+
+    Transfer outputs are not modified, because they are needed for derivatives.
+    """
+    if mask is None:
+        return transfer_outputs
+    return transfer_outputs * mask
 
 
 def _dot_diag_or_matrix(tensor_a, tensor_b):
@@ -328,135 +603,145 @@ def _unflatten_weights(flat_weights, shape):
 
 
 class DropoutMLP(MLP):
+    """MultiLayer Perceptron trained with (inverted) dropout.
+
+    During training, each sample drops out random inputs and hidden neurons,
+    and active inputs and neurons are scaled by 1 / active probability.
+    Because of this scaling, the trained model is used as a plain MLP,
+    with all inputs and neurons active.
+
+    Args:
+        shape: Number of inputs, followed by number of outputs of each layer.
+        transfers: Optional. List of transfer layers, as in MLP.
+        optimizer: Optimizer; Defaults to SteepestDescent.
+        error_func: ErrorFunc; Error function for optimizing weight matrices.
+        input_active_probability: Probability that each input is active
+            during training. 0 < input_active_probability <= 1.
+        hidden_active_probability: Probability that each hidden neuron is active
+            during training. 0 < hidden_active_probability <= 1.
+        seed: Optional. Seed for the random state used to draw dropout masks.
+            Defaults to the global numpy random state.
+        max_batch_rows: Optional. Maximum number of rows to activate at once,
+            as in MLP.
+        memory_budget: Optional. Maximum bytes of activations to store at once,
+            as in MLP.
+        num_threads: Optional. Number of threads used to compute
+            objective value and gradient, as in MLP.
+    """
+
+    # (active, masks) buffers, reused by _get_masks
+    _mask_buffers = None
+
     def __init__(self,
                  shape,
                  transfers=None,
                  optimizer=None,
                  error_func=None,
                  input_active_probability=0.8,
-                 hidden_active_probability=0.5):
+                 hidden_active_probability=0.5,
+                 seed=None,
+                 max_batch_rows=None,
+                 memory_budget=None,
+                 num_threads=None):
         if optimizer is None:
             # Don't use BFGS for Dropout
             # BFGS cannot effectively approximate hessian when problem
             # is constantly changing
             optimizer = SteepestDescent()
 
-        super(DropoutMLP, self).__init__(shape, transfers, optimizer,
-                                         error_func)
+        super(DropoutMLP, self).__init__(
+            shape,
+            transfers,
+            optimizer,
+            error_func,
+            max_batch_rows=max_batch_rows,
+            memory_budget=memory_budget,
+            num_threads=num_threads)
 
         # Dropout hyperparams
+        if not 0.0 < input_active_probability <= 1.0:
+            raise ValueError('0 < input_active_probability <= 1')
+        if not 0.0 < hidden_active_probability <= 1.0:
+            raise ValueError('0 < hidden_active_probability <= 1')
         self._inp_act_prob = input_active_probability
         self._hid_act_prob = hidden_active_probability
 
-        # We modify transfers to disable hidden neurons
-        # To disable inputs, we need a transfer for the input vector
-        # To re-enable hidden neurons, we need to remember the original transfers
-        self._input_transfer = LinearTransfer()
-        self._real_transfers = self._transfers
-
-        # We perform the post-training procedure on the first activation after training
-        self._during_training = False
-        self._did_post_training = True
-
-    def activate(self, input_tensor):
-        """Return the model outputs for given inputs."""
-        # Perform post-training procedure on the first activate after training.
-        # If done during train method, post-training will not occur when model is used
-        # incrementally
-        if (not self._during_training) and (not self._did_post_training):
-            self._post_training()
-            self._did_post_training = True
-
-        # Use input transfer to disable inputs (during training)
-        return super(DropoutMLP,
-                     self).activate(self._input_transfer(input_tensor))
-
-    def _post_training(self):
-        # Activate all inputs
-        self._input_transfer = LinearTransfer()
-
-        # Activate all hidden
-        self._transfers = self._real_transfers
-
-        # Adjust weight matrices, based on active probabilities
-        # TODO: Do we need to adjust any weights based on self._inp_act_prob?
-        for i, _ in enumerate(self._weight_matrices):
-            self._weight_matrices[i] *= self._hid_act_prob
+        # None uses the global numpy random state,
+        # which cannot be pickled with the model
+        if seed is None:
+            self._random_state = None
+        else:
+            self._random_state = numpy.random.RandomState(seed)
 
     def train_step(self, input_matrix, target_matrix):
         """Adjust the model towards the targets for given inputs.
 
         Train on a mini-batch.
         """
-        # Enter training mode
-        self._during_training = True
-        self._did_post_training = False
-
-        # Disable inputs
-        self._input_transfer = DropoutTransfer(
-            LinearTransfer(), self._inp_act_prob, self._shape[0])
-
-        # Disable hidden neurons
-        self._disable_hiddens()
-
-        error = super(DropoutMLP, self).train_step(input_matrix, target_matrix)
-
-        # No longer in training mode
-        self._during_training = False
-
-        return error
-
-    def _disable_hiddens(self):
-        """Disable random neurons in hidden layers."""
-        dropout_transfers = []
-
-        # Don't disable output neurons
-        for transfer_func, num_neurons in zip(self._real_transfers[:-1],
-                                              self._shape[1:-1]):
-            dropout_transfers.append(
-                DropoutTransfer(transfer_func, self._hid_act_prob,
-                                num_neurons))
-
-        # Use original output transfer
-        dropout_transfers.append(self._real_transfers[-1])
-
-        self._transfers = dropout_transfers
-
-
-################################################
-# Transfer functions
-################################################
-class DropoutTransfer(Transfer):
-    def __init__(self, transfer_func, active_probability, num_neurons):
-        self._transfer = transfer_func
-        self._active_neurons = _get_active_neurons(active_probability,
-                                                   num_neurons)
-
-    def __call__(self, input_tensor):
-        return self._transfer(input_tensor) * self._active_neurons
-
-    def derivative(self, input_tensor, output_vec):
-        """Return the derivative of this function.
-
-        We take both input and output vector because
-        some derivatives can be more efficiently calculated from
-        the output of this function.
+        # The same masks are used for every evaluation in this step,
+        # so the optimizer sees a consistent problem
+        self._masks = self._get_masks(len(input_matrix))
+        try:
+            return super(DropoutMLP, self).train_step(input_matrix,
+                                                      target_matrix)
+        finally:
+            # Use all inputs and neurons outside of training
+            self._masks = None
+
+    def _get_masks(self, num_samples):
+        """Return dropout mask for the inputs of each weight matrix.
+
+        Masks for inputs and every hidden layer are drawn in one call,
+        and active values are scaled by 1 / active probability.
+        Layers with active probability 1 have a mask of None.
+        Masks are only valid until the next call.
         """
-        return self._transfer.derivative(input_tensor, output_vec)
-
-
-def _get_active_neurons(active_probability, num_neurons):
-    """Return list of active neurons."""
-    if active_probability <= 0.0 or active_probability > 1.0:
-        raise ValueError('0 < active_probability <= 1')
-
-    active_neurons = [
-        1.0 if random.uniform(0, 1) < active_probability else 0.0
-        for _ in range(num_neurons)
-    ]
-
-    # Do not allow none active
-    if 1.0 not in active_neurons:
-        active_neurons[random.randint(0, len(active_neurons) - 1)] = 1.0
-
-    return numpy.array(active_neurons)
+        # Inputs, then every hidden layer
+        layer_probabilities = [self._inp_act_prob] + [self._hid_act_prob] * (
+            len(self._shape) - 2)
+        masked_layers = [
+            i for i, probability in enumerate(layer_probabilities)
+            if probability < 1.0
+        ]
+        if not masked_layers:
+            return [None] * len(layer_probabilities)
+
+        widths = [self._shape[i] for i in masked_layers]
+        mask_shape = (num_samples, sum(widths))
+        if (self._mask_buffers is None
+                or self._mask_buffers[0].shape != mask_shape):
+            self._mask_buffers = (numpy.empty(mask_shape, dtype=bool),
+                                  numpy.empty(mask_shape))
+        active, combined_masks = self._mask_buffers
+
+        # A neuron is active if a random 16 bit integer is less than
+        # active probability * 2^16, which is much cheaper than random floats
+        probabilities = numpy.hstack([
+            numpy.repeat(layer_probabilities[i], width)
+            for i, width in zip(masked_layers, widths)
+        ])
+        thresholds = numpy.minimum(
+            numpy.round(probabilities * 65536), 65535).astype(numpy.uint16)
+        random_state = (numpy.random if self._random_state is None else
+                        self._random_state)
+        random_ints = numpy.frombuffer(
+            random_state.bytes(2 * mask_shape[0] * mask_shape[1]),
+            dtype=numpy.uint16).reshape(mask_shape)
+        numpy.less(random_ints, thresholds, out=active)
+
+        # Casting uint8 to float is much faster than casting bool
+        numpy.copyto(combined_masks, active.view(numpy.uint8))
+        numpy.multiply(combined_masks, 1.0 / probabilities, out=combined_masks)
+
+        masks = [None] * len(layer_probabilities)
+        for i, mask in zip(
+                masked_layers,
+                numpy.split(combined_masks, numpy.cumsum(widths)[:-1], axis=1)):
+            masks[i] = mask
+        return masks
+
+    def __getstate__(self):
+        # Do not pickle or copy mask buffers
+        state = self.__dict__.copy()
+        state.pop('_mask_buffers', None)
+        return state
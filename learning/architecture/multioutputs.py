@@ -25,10 +25,12 @@
 import copy
 import types
 import pickle
+import logging
 
 import numpy
 
 from learning import Model
+from learning.callbacks import LOGGER_NAME
 from learning.rlearn import RLTable
 
 
@@ -146,9 +148,7 @@ class MultiOutputs(Model):
         for i, (model, targets) in enumerate(
                 zip(self._models, _transpose_rowcol(target_matrix))):
             if self.logging:
-                if i != 0:
-                    print
-                print 'Training Model %d:' % (i + 1)
+                logging.getLogger(LOGGER_NAME).info('Training model %d', i + 1)
             else:
                 model.logging = self.logging
             model.train(input_matrix, targets, *args, **kwargs)
@@ -26,7 +26,8 @@ import operator
 
 import numpy
 
-from learning import calculate, optimize, Model, SOM, MeanSquaredError
+from learning import (calculate, chunking, optimize, profile, Model, SOM,
+                      MeanSquaredError)
 from learning.optimize import Problem
 
 INITIAL_WEIGHTS_RANGE = 0.25
@@ -52,6 +53,14 @@ class RBF(Model):
           apply clustering once before training main RBF model.
           If True, clustering_model will train one step before
           every main RBF step.
+        max_batch_rows: Optional. Maximum number of rows to activate at once,
+            when computing objective value and gradient.
+            Larger datasets are evaluated in chunks of rows.
+        memory_budget: Optional. Maximum bytes of activations to store at once,
+            when computing objective value and gradient.
+            Rows in each chunk are chosen from num_clusters and num_outputs.
+        optimizer_memory_budget: Optional. Maximum bytes of optimizer state,
+            used to choose an optimizer when optimizer is not given.
     """
     # TODO: Remove attributes,
     # clustering_model can take int as shorthand for attributes with default
@@ -65,7 +74,10 @@ class RBF(Model):
                  variance=None,
                  scale_by_similarity=True,
                  clustering_model=None,
-                 cluster_incrementally=False):
+                 cluster_incrementally=False,
+                 max_batch_rows=None,
+                 memory_budget=None,
+                 optimizer_memory_budget=None):
         super(RBF, self).__init__()
 
         # Clustering algorithm
@@ -94,7 +106,8 @@ class RBF(Model):
         # Optimizer to optimize weight_matrix
         if optimizer is None:
             optimizer = optimize.make_optimizer(
-                reduce(operator.mul, self._weight_matrix.shape))
+                reduce(operator.mul, self._weight_matrix.shape),
+                memory_budget=optimizer_memory_budget)
 
         self._optimizer = optimizer
 
@@ -106,6 +119,10 @@ class RBF(Model):
         # Convergence criteria
         self._jacobian_norm_break = jacobian_norm_break
 
+        # Chunking of large datasets
+        self._max_batch_rows = max_batch_rows
+        self._memory_budget = memory_budget
+
         # Optional scaling output by total gaussian similarity
         self._scale_by_similarity = scale_by_similarity
 
@@ -168,10 +185,11 @@ class RBF(Model):
                 obj_func=
                 lambda xk: self._get_obj(xk, input_matrix, target_matrix),
                 obj_jac_func=
-                lambda xk: self._get_obj_jac(xk, input_matrix, target_matrix)),
-            _flatten_weights(self._weight_matrix, self._bias_vec))
-        self._bias_vec, self._weight_matrix = _unflatten_weights(
-            flat_weights, self._shape)
+                lambda xk: self._get_obj_jac(xk, input_matrix, target_matrix),
+                residual_jac_func=
+                lambda xk: self._get_residual_jac(xk, input_matrix, target_matrix)),
+            self._get_flat_parameters())
+        self._set_flat_parameters(flat_weights)
 
         self.converged = self._optimizer.jacobian is not None and numpy.linalg.norm(
             self._optimizer.jacobian) < self._jacobian_norm_break
@@ -191,36 +209,124 @@ class RBF(Model):
 
         Optional.
         """
-        # Reset optimizer, because problem may change on next train call
-        self._optimizer.reset()
+        if self._keep_optimizer_state:
+            # Keep learned state, for the next mini-batch
+            self._optimizer.problem_changed()
+        else:
+            # Reset optimizer, because problem may change on next train call
+            self._optimizer.reset()
+
+    def _get_snapshot(self):
+        """Return a copy of the trained state of this model."""
+        if self._cluster_incrementally:
+            # Clusters change during training
+            return (self._get_flat_parameters(),
+                    self._clustering_model._get_snapshot())
+        return self._get_flat_parameters(), None
+
+    def _restore_snapshot(self, snapshot):
+        """Restore a snapshot from Model._get_snapshot."""
+        parameter_vec, clustering_snapshot = snapshot
+        self._set_flat_parameters(parameter_vec)
+        if clustering_snapshot is not None:
+            self._clustering_model._restore_snapshot(clustering_snapshot)
 
     ######################################
     # Helper functions for optimizer
     ######################################
+    def _get_flat_parameters(self):
+        """Return flat vector of model parameters."""
+        return _flatten_weights(self._weight_matrix, self._bias_vec)
+
+    def _set_flat_parameters(self, parameter_vec):
+        """Set model parameters from flat vector."""
+        self._bias_vec, self._weight_matrix = _unflatten_weights(
+            parameter_vec, self._shape)
+
     def _get_obj(self, parameter_vec, input_matrix, target_matrix):
         """Helper function for Optimizer to get objective value."""
-        self._bias_vec, self._weight_matrix = _unflatten_weights(parameter_vec, self._shape)
-        return self._error_func(self.activate(input_matrix), target_matrix)
+        self._set_flat_parameters(parameter_vec)
+        chunk_rows = self._get_chunk_rows(input_matrix)
+        if chunk_rows is None:
+            return self._get_error(input_matrix, target_matrix)
+        return chunking.chunked_obj(
+            lambda rows: self._get_error(input_matrix[rows], target_matrix[rows]),
+            chunking.num_rows(input_matrix), chunk_rows)
 
     def _get_obj_jac(self, parameter_vec, input_matrix, target_matrix):
         """Helper function for Optimizer to get objective value and derivative."""
-        self._bias_vec, self._weight_matrix = _unflatten_weights(parameter_vec, self._shape)
+        self._set_flat_parameters(parameter_vec)
+        chunk_rows = self._get_chunk_rows(input_matrix)
+        if chunk_rows is None:
+            return self._get_error_flat_jacobian(input_matrix, target_matrix)
+        return chunking.chunked_obj_jac(
+            lambda rows: self._get_error_flat_jacobian(input_matrix[rows],
+                                                       target_matrix[rows]),
+            chunking.num_rows(input_matrix), chunk_rows)
+
+    def _get_residual_jac(self, parameter_vec, input_matrix, target_matrix):
+        """Helper function for Optimizer to get residuals and residual jacobian.
+
+        Requires a sum of squares error function, such as MeanSquaredError.
+        """
+        self._set_flat_parameters(parameter_vec)
+        with profile.phase(profile.FORWARD):
+            residuals, scale = self._error_func.residuals(
+                self.activate(input_matrix), target_matrix)
+
+        with profile.phase(profile.BACKWARD):
+            # Output k of each sample depends only on column k of weights,
+            # with derivative given by similarities, and bias k
+            num_samples, num_clusters = self._similarity_tensor.shape
+            num_outputs = self._weight_matrix.shape[1]
+            output_jacobian = numpy.zeros(
+                (num_samples, num_outputs, 1 + num_clusters, num_outputs))
+            for output in range(num_outputs):
+                output_jacobian[:, output, 0, output] = 1.0
+                output_jacobian[:, output, 1:, output] = self._similarity_tensor
+
+            # Flat parameters are bias, followed by weight matrix
+            output_jacobian = output_jacobian.reshape(
+                num_samples * num_outputs, -1)
+        return residuals, scale * output_jacobian
+
+    def _get_error(self, input_matrix, target_matrix):
+        """Return error for given dataset."""
+        with profile.phase(profile.FORWARD):
+            return self._error_func(self.activate(input_matrix), target_matrix)
+
+    def _get_error_flat_jacobian(self, input_matrix, target_matrix):
+        """Return error and flattened jacobian for given dataset."""
         error, weight_jacobian, bias_jacobian = self._get_jacobian(
             input_matrix, target_matrix)
         return error, _flatten_weights(weight_jacobian, bias_jacobian)
 
+    def _get_chunk_rows(self, input_matrix):
+        """Return number of rows in each chunk, or None to use all rows."""
+        if self._max_batch_rows is None and self._memory_budget is None:
+            return None
+
+        # Distances and similarities to each cluster, outputs, and error jacobian
+        row_values = 2 * self._shape[0] + 2 * self._shape[1]
+        return chunking.get_chunk_rows(
+            chunking.num_rows(input_matrix), row_values,
+            max_batch_rows=self._max_batch_rows,
+            memory_budget=self._memory_budget)
+
     ######################################
     # Objective Derivative
     ######################################
     def _get_jacobian(self, input_matrix, target_matrix):
         """Return jacobian and error for given dataset."""
-        output_matrix = self.activate(input_matrix)
+        with profile.phase(profile.FORWARD):
+            output_matrix = self.activate(input_matrix)
 
-        error, error_jac = self._error_func.derivative(output_matrix,
-                                                       target_matrix)
+            error, error_jac = self._error_func.derivative(output_matrix,
+                                                           target_matrix)
 
-        weight_jacobian = self._similarity_tensor.T.dot(error_jac)
-        bias_jacobian = numpy.sum(error_jac, axis=0)
+        with profile.phase(profile.BACKWARD):
+            weight_jacobian = self._similarity_tensor.T.dot(error_jac)
+            bias_jacobian = numpy.sum(error_jac, axis=0)
 
         return error, weight_jacobian, bias_jacobian
 
@@ -26,7 +26,8 @@ import operator
 
 import numpy
 
-from learning import calculate, optimize, Model, MeanSquaredError
+from learning import (calculate, chunking, optimize, profile, sparse, Model,
+                      MeanSquaredError)
 from learning.optimize import Problem
 
 INITIAL_WEIGHTS_RANGE = 0.25
@@ -43,6 +44,14 @@ class RegressionModel(Model):
         error_func: Instance of learning.error.ErrorFunc.
         jacobian_norm_break: Training will end if objective gradient norm
             is less than this value.
+        max_batch_rows: Optional. Maximum number of rows to activate at once,
+            when computing objective value and gradient.
+            Larger datasets are evaluated in chunks of rows.
+        memory_budget: Optional. Maximum bytes of outputs to store at once,
+            when computing objective value and gradient.
+            Rows in each chunk are chosen from num_outputs.
+        optimizer_memory_budget: Optional. Maximum bytes of optimizer state,
+            used to choose an optimizer when optimizer is not given.
     """
 
     def __init__(self,
@@ -51,7 +60,10 @@ class RegressionModel(Model):
                  optimizer=None,
                  error_func=None,
                  penalty_func=None,
-                 jacobian_norm_break=1e-10):
+                 jacobian_norm_break=1e-10,
+                 max_batch_rows=None,
+                 memory_budget=None,
+                 optimizer_memory_budget=None):
         super(RegressionModel, self).__init__()
 
         # Weight matrix, optimized during training
@@ -61,7 +73,8 @@ class RegressionModel(Model):
         # Optimizer to optimize weight_matrix
         if optimizer is None:
             optimizer = optimize.make_optimizer(
-                reduce(operator.mul, self._weight_matrix.shape))
+                reduce(operator.mul, self._weight_matrix.shape),
+                memory_budget=optimizer_memory_budget)
 
         self._optimizer = optimizer
 
@@ -76,6 +89,10 @@ class RegressionModel(Model):
         # Convergence criteria
         self._jacobian_norm_break = jacobian_norm_break
 
+        # Chunking of large datasets
+        self._max_batch_rows = max_batch_rows
+        self._memory_budget = memory_budget
+
     def reset(self):
         """Reset this model."""
         super(RegressionModel, self).reset()
@@ -113,9 +130,11 @@ class RegressionModel(Model):
                 obj_func=
                 lambda xk: self._get_obj(xk, input_matrix, target_matrix),
                 obj_jac_func=
-                lambda xk: self._get_obj_jac(xk, input_matrix, target_matrix)),
-            self._weight_matrix.ravel())
-        self._weight_matrix = flat_weights.reshape(self._weight_matrix.shape)
+                lambda xk: self._get_obj_jac(xk, input_matrix, target_matrix),
+                residual_jac_func=
+                lambda xk: self._get_residual_jac(xk, input_matrix, target_matrix)),
+            self._get_flat_parameters())
+        self._set_flat_parameters(flat_weights)
 
         # TODO: Numerical Optimization uses ||grad_f_k||_inf < 10^-5 (1 + |f_k|) as a stopping criteria
         # Perhaps we should as well (also in MLP, RBF, etc.)
@@ -128,30 +147,94 @@ class RegressionModel(Model):
 
         Optional.
         """
-        # Reset optimizer, because problem may change on next train call
-        self._optimizer.reset()
+        if self._keep_optimizer_state:
+            # Keep learned state, for the next mini-batch
+            self._optimizer.problem_changed()
+        else:
+            # Reset optimizer, because problem may change on next train call
+            self._optimizer.reset()
 
     ######################################
     # Helper functions for optimizer
     ######################################
+    def _get_flat_parameters(self):
+        """Return flat vector of model parameters."""
+        return self._weight_matrix.ravel()
+
+    def _set_flat_parameters(self, parameter_vec):
+        """Set model parameters from flat vector."""
+        self._weight_matrix = parameter_vec.reshape(self._weight_matrix.shape)
+
     def _get_obj(self, parameter_vec, input_matrix, target_matrix):
         """Helper function for Optimizer to get objective value."""
-        self._weight_matrix = parameter_vec.reshape(self._weight_matrix.shape)
+        self._set_flat_parameters(parameter_vec)
         return self._get_objective_value(input_matrix, target_matrix)
 
     def _get_obj_jac(self, parameter_vec, input_matrix, target_matrix):
         """Helper function for Optimizer to get objective value and derivative."""
-        self._weight_matrix = parameter_vec.reshape(self._weight_matrix.shape)
+        self._set_flat_parameters(parameter_vec)
         error, jacobian = self._get_error_jacobian_with_penalty(
             input_matrix, target_matrix)
         return error, jacobian.ravel()
 
+    def _get_residual_jac(self, parameter_vec, input_matrix, target_matrix):
+        """Helper function for Optimizer to get residuals and residual jacobian.
+
+        Requires a sum of squares error function, such as MeanSquaredError.
+        A weight penalty is added as one more residual, sqrt(penalty).
+        """
+        self._set_flat_parameters(parameter_vec)
+        with profile.phase(profile.FORWARD):
+            residuals, scale = self._error_func.residuals(
+                self.activate(input_matrix), target_matrix)
+
+        with profile.phase(profile.BACKWARD):
+            # Output k of each sample depends only on column k of weights
+            output_derivative = self._equation_output_derivative(input_matrix)
+            if sparse.issparse(input_matrix):
+                input_matrix = input_matrix.toarray()
+            num_samples, num_outputs = output_derivative.shape
+            output_jacobian = numpy.zeros(
+                (num_samples, num_outputs) + self._weight_matrix.shape)
+            for output in range(num_outputs):
+                derivative = output_derivative[:, output, None]
+                # Bias, then weight matrix
+                output_jacobian[:, output, 0, output] = derivative[:, 0]
+                output_jacobian[:, output, 1:, output] = (
+                    input_matrix * derivative)
+            residual_jac = scale * output_jacobian.reshape(
+                num_samples * num_outputs, -1)
+
+        if self._penalty_func is not None:
+            # Penalty is sqrt(penalty)^2, with jacobian
+            # penalty' / (2 sqrt(penalty))
+            flat_weights = self._weight_matrix.ravel()
+            penalty = self._penalty_func(flat_weights)
+            penalty_residual = numpy.sqrt(penalty)
+            if penalty_residual > 0.0:
+                penalty_jac = self._penalty_func.derivative(
+                    flat_weights, penalty_output=penalty) / (
+                        2.0 * penalty_residual)
+            else:
+                penalty_jac = numpy.zeros(flat_weights.shape)
+            residuals = numpy.hstack((residuals, penalty_residual))
+            residual_jac = numpy.vstack((residual_jac, penalty_jac))
+
+        return residuals, residual_jac
+
     ######################################
     # Objective Value
     ######################################
     def _get_objective_value(self, input_matrix, target_matrix):
         """Return error on given dataset."""
-        error = self._error_func(self.activate(input_matrix), target_matrix)
+        chunk_rows = self._get_chunk_rows(input_matrix)
+        if chunk_rows is None:
+            error = self._get_error(input_matrix, target_matrix)
+        else:
+            error = chunking.chunked_obj(
+                lambda rows: self._get_error(input_matrix[rows],
+                                             target_matrix[rows]),
+                chunking.num_rows(input_matrix), chunk_rows)
 
         # Calculate and add weight penalty
         if self._penalty_func is not None:
@@ -161,13 +244,26 @@ class RegressionModel(Model):
 
         return error
 
+    def _get_error(self, input_matrix, target_matrix):
+        """Return error on given dataset, without weight penalty."""
+        with profile.phase(profile.FORWARD):
+            return self._error_func(self.activate(input_matrix), target_matrix)
+
     ######################################
     # Objective Derivative
     ######################################
     def _get_error_jacobian_with_penalty(self, input_matrix, target_matrix):
         """Return error and jacobian for given dataset with weight penalty."""
         # Calculate jacobian, given error function
-        error, jacobian = self._get_error_jacobian(input_matrix, target_matrix)
+        chunk_rows = self._get_chunk_rows(input_matrix)
+        if chunk_rows is None:
+            error, jacobian = self._get_error_jacobian(input_matrix,
+                                                       target_matrix)
+        else:
+            error, jacobian = chunking.chunked_obj_jac(
+                lambda rows: self._get_error_jacobian(input_matrix[rows],
+                                                      target_matrix[rows]),
+                chunking.num_rows(input_matrix), chunk_rows)
 
         # Calculate weight penalty, and add it to error and jacobian
         if self._penalty_func is not None:
@@ -186,19 +282,35 @@ class RegressionModel(Model):
 
     def _get_error_jacobian(self, input_matrix, target_matrix):
         """Return error and jacobian for given dataset."""
-        output_matrix = self.activate(input_matrix)
-        if output_matrix.shape != target_matrix.shape:
-            raise ValueError(
-                'target_matrix.shape does not match output_matrix.shape')
+        with profile.phase(profile.FORWARD):
+            output_matrix = self.activate(input_matrix)
+            if output_matrix.shape != target_matrix.shape:
+                raise ValueError(
+                    'target_matrix.shape does not match output_matrix.shape')
 
-        error, error_jac = self._error_func.derivative(output_matrix, target_matrix)
-        jacobian = self._error_equation_derivative(input_matrix, error_jac)
+            error, error_jac = self._error_func.derivative(output_matrix,
+                                                           target_matrix)
+
+        with profile.phase(profile.BACKWARD):
+            jacobian = self._error_equation_derivative(input_matrix, error_jac)
 
         assert reduce(operator.mul, jacobian.shape) == reduce(
             operator.mul, self._weight_matrix.shape)
 
         return error, jacobian
 
+    def _get_chunk_rows(self, input_matrix):
+        """Return number of rows in each chunk, or None to use all rows."""
+        if self._max_batch_rows is None and self._memory_budget is None:
+            return None
+
+        # Equation inputs, outputs, and error jacobian
+        row_values = 3 * self._weight_matrix.shape[1]
+        return chunking.get_chunk_rows(
+            chunking.num_rows(input_matrix), row_values,
+            max_batch_rows=self._max_batch_rows,
+            memory_budget=self._memory_budget)
+
     def _weights_shape(self, attributes, num_outputs):
         """Return shape of this models weight matrix."""
         raise NotImplementedError()
@@ -214,6 +326,13 @@ class RegressionModel(Model):
         """
         raise NotImplementedError()
 
+    def _equation_output_derivative(self, input_matrix):
+        r"""Return derivative of each output, with regard to its linear term, W \vec{x}.
+
+        Optional. Used for residual jacobians.
+        """
+        raise NotImplementedError()
+
 
 class LinearRegressionModel(RegressionModel):
     r"""Regression model with an equation of the form: f(\vec{x}) = W \vec{x}."""
@@ -226,8 +345,8 @@ class LinearRegressionModel(RegressionModel):
     def _equation_output(self, input_tensor):
         """Return the output of this models equation."""
         # First weight (for each output) is independent of input_tensor
-        return self._weight_matrix[0] + numpy.dot(input_tensor,
-                                                  self._weight_matrix[1:])
+        return self._weight_matrix[0] + sparse.dot(input_tensor,
+                                                   self._weight_matrix[1:])
 
     def _error_equation_derivative(self, input_matrix, error_jac):
         """Return the jacobian of this models equation corresponding to the given error.
@@ -241,6 +360,11 @@ class LinearRegressionModel(RegressionModel):
             input_matrix.T.dot(error_jac)
         ))
 
+    def _equation_output_derivative(self, input_matrix):
+        r"""Return derivative of each output, with regard to its linear term, W \vec{x}."""
+        return numpy.ones(
+            (input_matrix.shape[0], self._weight_matrix.shape[1]))
+
 
 # TODO: Logistic regression is expected to be paried with a specific
 # error function, which should be implemented and set as the default
@@ -265,7 +389,7 @@ class LogisticRegressionModel(RegressionModel):
         # Logistic regression is simply lienar regression passed through
         # a logit function
         # First weight (for each output) is independent of input_tensor
-        return calculate.logit(self._weight_matrix[0] + numpy.dot(
+        return calculate.logit(self._weight_matrix[0] + sparse.dot(
             input_tensor, self._weight_matrix[1:]))
 
     def _error_equation_derivative(self, input_matrix, error_jac):
@@ -279,7 +403,7 @@ class LogisticRegressionModel(RegressionModel):
         # W = weight_matrix
         # X = input_matrix
         equation_derivative_times_error_jac = calculate.dlogit(
-            self._weight_matrix[0] + numpy.dot(
+            self._weight_matrix[0] + sparse.dot(
                 input_matrix, self._weight_matrix[1:])) * error_jac
 
         return numpy.vstack((
@@ -288,3 +412,8 @@ class LogisticRegressionModel(RegressionModel):
             numpy.sum(equation_derivative_times_error_jac, axis=0),
             # Weight matrix: de(f)/dW = X^T f'(X W + b) e'(f(X W + b))
             input_matrix.T.dot(equation_derivative_times_error_jac)))
+
+    def _equation_output_derivative(self, input_matrix):
+        r"""Return derivative of each output, with regard to its linear term, W \vec{x}."""
+        return calculate.dlogit(self._weight_matrix[0] + sparse.dot(
+            input_matrix, self._weight_matrix[1:]))
@@ -60,6 +60,14 @@ class SOM(Model):
                          ) * self.initial_weights_range
         self._distances = numpy.zeros(self._size)
 
+    def _get_snapshot(self):
+        """Return a copy of the trained state of this model."""
+        return numpy.copy(self._weights)
+
+    def _restore_snapshot(self, snapshot):
+        """Restore a snapshot from Model._get_snapshot."""
+        self._weights = snapshot
+
     def activate(self, input_tensor):
         """Return the model outputs for given input_tensor."""
         if not isinstance(input_tensor, numpy.ndarray):
@@ -23,15 +23,26 @@
 ###############################################################################
 """Base model and functions for learning methods."""
 
+import sys
 import math
+import copy
 import random
 import pickle
 import numbers
+import threading
+import multiprocessing
+import Queue
 
 import numpy
 
-from learning import validation
+from learning import profile, sparse, validation
+from learning.callbacks import CallbackList, LoggingCallback, PatternCallback
+from learning.data import stream
+from learning.error import MeanSquaredError
 
+# Dataset for training attempts in worker processes,
+# see Model._train_parallel
+_WORKER_DATASET = None
 
 ##############################
 # Pattern selection functions
@@ -64,6 +75,274 @@ def select_random(input_matrix, target_matrix, size=None):
     return input_matrix[selected_rows], target_matrix[selected_rows]
 
 
+class EpochSelector(object):
+    """Select mini-batches from shuffled epochs of a dataset.
+
+    Rows are shuffled once per epoch, and each epoch is split into
+    mini-batches, so every row is seen once per epoch.
+    Use as pattern_selection_func in Model.stochastic_train.
+    Each call returns the next mini-batch of the given dataset.
+
+    Args:
+        size: Number of rows in each mini-batch.
+            Defaults to a size based on number of rows in dataset.
+        drop_last: If True, the last mini-batch of an epoch is skipped
+            when it has fewer than size rows.
+        stratify: If True, each mini-batch has approximately the same
+            proportion of each class as the whole dataset.
+            Classes are given by target_matrix, as onehot rows or labels.
+        copy_dataset: If True, a shuffled copy of the dataset is made
+            every epoch, and mini-batches are views of this copy.
+            If False, rows are gathered into a reused buffer for each mini-batch,
+            using less memory. Mini-batches are then only valid until the next call.
+        seed: Seed for the random state used to shuffle.
+            If None, the global numpy random state is used,
+            so selection is reproducible with numpy.random.seed.
+    """
+
+    def __init__(self,
+                 size=None,
+                 drop_last=False,
+                 stratify=False,
+                 copy_dataset=True,
+                 seed=None):
+        self._size = size
+        self._drop_last = drop_last
+        self._stratify = stratify
+        self._copy_dataset = copy_dataset
+        if seed is None:
+            self._random_state = numpy.random
+        else:
+            self._random_state = numpy.random.RandomState(seed)
+
+        self.epoch = 0
+
+        # Mini-batch generator, and the dataset it selects from
+        self._dataset = None
+        self._batches = None
+
+    def __call__(self, input_matrix, target_matrix):
+        """Return next mini-batch of given dataset."""
+        # Start a new generator if dataset changes
+        if (self._dataset is None or self._dataset[0] is not input_matrix
+                or self._dataset[1] is not target_matrix):
+            self._dataset = (input_matrix, target_matrix)
+            self._batches = self.iterate(input_matrix, target_matrix)
+
+        return next(self._batches)
+
+    def iterate(self, input_matrix, target_matrix):
+        """Yield (input_matrix, target_matrix) mini-batches, for every epoch."""
+        # Sparse rows cannot be gathered into a buffer, so sparse inputs are copied
+        copy_dataset = self._copy_dataset or sparse.issparse(input_matrix)
+        if not sparse.issparse(input_matrix):
+            input_matrix = numpy.asarray(input_matrix)
+        target_matrix = numpy.asarray(target_matrix)
+
+        num_rows = input_matrix.shape[0]
+        size = self._size
+        if size is None:
+            size = _selection_size_heuristic(num_rows)
+        size = min(size, num_rows)
+
+        if self._stratify:
+            labels = _row_labels(target_matrix)
+
+        if not copy_dataset:
+            input_buffer = numpy.empty((size, ) + input_matrix.shape[1:],
+                                       dtype=input_matrix.dtype)
+            target_buffer = numpy.empty((size, ) + target_matrix.shape[1:],
+                                        dtype=target_matrix.dtype)
+
+        while True:
+            if self._stratify:
+                indices = _stratified_permutation(labels, self._random_state)
+            else:
+                indices = self._random_state.permutation(num_rows)
+
+            if copy_dataset:
+                # Contiguous slices of a shuffled copy are views, not copies
+                if sparse.issparse(input_matrix):
+                    epoch_inputs = input_matrix[indices]
+                else:
+                    epoch_inputs = input_matrix.take(indices, axis=0)
+                epoch_targets = target_matrix.take(indices, axis=0)
+
+            for start in range(0, num_rows, size):
+                stop = min(start + size, num_rows)
+                if stop - start < size and self._drop_last:
+                    break
+
+                if copy_dataset:
+                    yield epoch_inputs[start:stop], epoch_targets[start:stop]
+                else:
+                    batch_inputs = input_buffer[:stop - start]
+                    batch_targets = target_buffer[:stop - start]
+                    input_matrix.take(
+                        indices[start:stop], axis=0, out=batch_inputs)
+                    target_matrix.take(
+                        indices[start:stop], axis=0, out=batch_targets)
+                    yield batch_inputs, batch_targets
+
+            self.epoch += 1
+
+
+class PrefetchSelector(object):
+    """Prepare mini-batches in a background thread, while the model trains.
+
+    Use as pattern_selection_func in Model.stochastic_train.
+    Mini-batches are selected in the same order as calling
+    pattern_selection_func directly, so results are deterministic
+    when pattern_selection_func is seeded.
+
+    NOTE: pattern_selection_func must return new arrays on every call,
+    because prepared mini-batches are held until used.
+    EpochSelector must not be used with copy_dataset=False.
+
+    Args:
+        pattern_selection_func: Function that takes (input_matrix, target_matrix),
+            and returns a selection of rows. Defaults to an EpochSelector.
+        num_prefetch: Maximum number of mini-batches prepared ahead of use.
+        transform: Optional function that takes (input_matrix, target_matrix)
+            of a mini-batch, and returns a new (input_matrix, target_matrix).
+            Applied in the background thread, such as to normalize inputs.
+    """
+
+    def __init__(self, pattern_selection_func=None, num_prefetch=2,
+                 transform=None):
+        if pattern_selection_func is None:
+            pattern_selection_func = EpochSelector()
+        if num_prefetch < 1:
+            raise ValueError('num_prefetch must be at least 1')
+
+        self._pattern_selection_func = pattern_selection_func
+        self._num_prefetch = num_prefetch
+        self._transform = transform
+
+        # Background thread, and the dataset it selects from
+        self._dataset = None
+        self._queue = None
+        self._stop_event = None
+        self._thread = None
+
+    def __call__(self, input_matrix, target_matrix):
+        """Return next mini-batch of given dataset."""
+        # Start a new thread if dataset changes
+        if (self._dataset is None or self._dataset[0] is not input_matrix
+                or self._dataset[1] is not target_matrix):
+            self.close()
+            self._start((input_matrix, target_matrix))
+
+        batch, exc_info = self._queue.get()
+        if exc_info is not None:
+            # Re-raise error from background thread, with original traceback
+            self._dataset = None
+            raise exc_info[0], exc_info[1], exc_info[2]
+        return batch
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """Stop background thread."""
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+
+        self._dataset = None
+        self._queue = None
+        self._stop_event = None
+        self._thread = None
+
+    def _start(self, dataset):
+        """Start background thread for dataset."""
+        self._dataset = dataset
+        self._queue = Queue.Queue(maxsize=self._num_prefetch)
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(
+            target=_prefetch_batches,
+            args=(self._pattern_selection_func, self._transform, dataset,
+                  self._queue, self._stop_event))
+        self._thread.daemon = True
+        self._thread.start()
+
+
+def _prefetch_batches(pattern_selection_func, transform, dataset, batch_queue,
+                      stop_event):
+    """Put (batch, exc_info) in batch_queue, until stop_event is set."""
+    while not stop_event.is_set():
+        try:
+            batch = pattern_selection_func(*dataset)
+            if transform is not None:
+                batch = transform(*batch)
+            item = (batch, None)
+        except Exception:
+            item = (None, sys.exc_info())
+
+        # Wait for space in queue, checking for stop periodically
+        while not stop_event.is_set():
+            try:
+                batch_queue.put(item, timeout=0.1)
+                break
+            except Queue.Full:
+                pass
+
+        if item[1] is not None:
+            # No more batches after an error
+            return
+
+
+def _chunk_batches(dataset, pattern_selection_func=None):
+    """Yield mini-batches of every chunk, for every pass over a ChunkedDataset."""
+    while True:
+        num_chunks = 0
+        for chunk in dataset:
+            num_chunks += 1
+            if pattern_selection_func is None:
+                yield chunk
+            else:
+                yield pattern_selection_func(*chunk)
+
+        if num_chunks == 0:
+            raise ValueError('dataset has no chunks')
+
+
+def _row_labels(target_matrix):
+    """Return a class label for each row of target_matrix.
+
+    target_matrix can be a column vector of labels, or matrix of onehot rows.
+    """
+    if len(target_matrix.shape) == 1:
+        return target_matrix
+    if target_matrix.shape[1] == 1:
+        return target_matrix.ravel()
+    return numpy.argmax(target_matrix, axis=1)
+
+
+def _stratified_permutation(labels, random_state):
+    """Return a random permutation, with classes spread evenly throughout.
+
+    Any contiguous slice of the permutation has approximately
+    the same class proportions as labels.
+    """
+    permutation = random_state.permutation(labels.shape[0])
+    _, class_indices, class_counts = numpy.unique(
+        labels[permutation], return_inverse=True, return_counts=True)
+
+    # Rank of each row within its class, in permuted order
+    by_class = numpy.argsort(class_indices, kind='mergesort')
+    class_starts = numpy.cumsum(class_counts) - class_counts
+    ranks = numpy.empty(labels.shape[0])
+    ranks[by_class] = (numpy.arange(labels.shape[0]) -
+                       numpy.repeat(class_starts, class_counts))
+
+    # Order by relative position in class, with jitter so ties between
+    # classes are broken randomly
+    positions = ((ranks + random_state.random_sample(labels.shape[0])) /
+                 class_counts[class_indices])
+    return permutation[numpy.argsort(positions, kind='mergesort')]
+
+
 def _selection_size_heuristic(num_samples):
     """Return size of mini-batch, given size of dataset."""
     # Incrase size of mini-batch gradually as number of samples increases,
@@ -77,8 +356,16 @@ def _selection_size_heuristic(num_samples):
 class Model(object):
     """A supervised learning model."""
 
+    # If True, optimizer state is kept after train,
+    # for the next mini-batch of stochastic_train
+    _keep_optimizer_state = False
+
+    # LoggingCallback shared by every mini-batch of stochastic_train,
+    # so logging is rate limited over all mini-batches
+    _logging_callback = None
+
     def __init__(self):
-        self._post_pattern_callback = None
+        self._pattern_callbacks = []
 
         # Bookkeeping
         self.logging = True
@@ -99,35 +386,63 @@ class Model(object):
 
     def stochastic_train(self,
                          input_matrix,
-                         target_matrix,
+                         target_matrix=None,
                          max_iterations=100,
                          error_break=0.002,
-                         pattern_selection_func=select_sample,
-                         train_kwargs={'iterations': 100}):
+                         pattern_selection_func=None,
+                         train_kwargs={'iterations': 100},
+                         reset_optimizer=True):
         """Train model on multiple subsets of the given dataset.
 
         Use for stochastic gradient descent.
 
         Args:
             input_matrix: A matrix with samples in rows and attributes in columns.
+                Or a stream.ChunkedDataset, with no target_matrix,
+                for datasets that do not fit in memory.
             target_matrix: A matrix with samples in rows and target values in columns.
             max_iterations: Maximum number of times that Model.train is called.
             error_break: Training will end once error is less than this, on entire dataset.
             pattern_select_func: Function that takes (input_matrix, target_matrix),
                 and returns a selection of rows. Use partial function to embed arguments.
+                Defaults to an EpochSelector, shuffling the dataset every epoch.
+                For a ChunkedDataset, it is given each chunk in turn,
+                and defaults to training on every chunk in full.
+            reset_optimizer: If False, optimizer state, such as approximate
+                curvature of BFGS and L-BFGS, and initial step size memory,
+                is kept between mini-batches, instead of reset after every
+                call to Model.train. Each mini-batch then starts with
+                a well scaled step.
         """
-        for iteration in range(1, max_iterations + 1):
-            train_error = self.train(*pattern_selection_func(
-                input_matrix, target_matrix), **train_kwargs)
-
-            if self.converged:
-                # Break early to prevent overtraining
-                if (train_error <= error_break
-                        # Perform a second test on whole dataset
-                        # TODO: Use user provided error function
-                        and validation.get_error(
-                            self, input_matrix, target_matrix) <= error_break):
-                    return train_error
+        if isinstance(input_matrix, stream.ChunkedDataset):
+            batches = _chunk_batches(input_matrix, pattern_selection_func)
+        else:
+            if pattern_selection_func is None:
+                pattern_selection_func = EpochSelector()
+            batches = None
+
+        self._keep_optimizer_state = not reset_optimizer
+        self._logging_callback = LoggingCallback()
+        try:
+            for iteration in range(1, max_iterations + 1):
+                if batches is not None:
+                    batch = next(batches)
+                else:
+                    batch = pattern_selection_func(input_matrix, target_matrix)
+                train_error = self.train(*batch, **train_kwargs)
+
+                if self.converged:
+                    # Break early to prevent overtraining
+                    if (train_error <= error_break
+                            # Perform a second test on whole dataset
+                            # TODO: Use user provided error function
+                            and validation.get_error(
+                                self, input_matrix,
+                                target_matrix) <= error_break):
+                        return train_error
+        finally:
+            self._keep_optimizer_state = False
+            self._logging_callback = None
 
         # Override iteration from inner loop, with iteration number from outer loop
         self.iteration = iteration
@@ -143,7 +458,14 @@ class Model(object):
               error_stagnant_distance=5,
               error_stagnant_threshold=0.00001,
               error_improve_iters=20,
-              post_pattern_callback=None):
+              post_pattern_callback=None,
+              retry_processes=None,
+              retry_cancel_on_converge=True,
+              validation_set=None,
+              validation_interval=1,
+              validation_patience=10,
+              profiler=None,
+              callbacks=None):
         """Train model on the given dataset.
 
         Note: Override this method for batch learning models.
@@ -161,7 +483,31 @@ class Model(object):
                 error_stagnant_distance iterations, or training ends.
             error_improve_iters: Best error must decrease within this many iterations,
                 or training ends.
+            post_pattern_callback: Optional function taking (model, input_vec, target_vec),
+                called after each pattern. Shorthand for a callbacks.PatternCallback.
+            retry_processes: Number of processes used to run retries + 1
+                independently seeded attempts in parallel.
+                If None, attempts are run sequentially.
+                The attempt with the best error is kept.
+            retry_cancel_on_converge: If True, and retry_processes is given,
+                remaining attempts are cancelled once any attempt converges.
+            validation_set: Optional (input_matrix, target_matrix) tuple.
+                If given, error on this set is checked every validation_interval
+                iterations, and the model with the lowest validation error
+                is restored after each attempt.
+            validation_interval: Iterations between validation error checks.
+            validation_patience: Training ends if validation error does not improve
+                within this many checks.
+            profiler: Optional profile.TrainingProfiler. If given, evaluation counts
+                and phase timings are recorded for every iteration.
+                Not supported with retry_processes.
+            callbacks: Optional list of callbacks.Callback, given training events.
+                A callbacks.LoggingCallback is added when self.logging is True.
+                With retry_processes, only attempt end and converged events are given.
         """
+        if profiler is not None and retry_processes is not None:
+            raise ValueError('profiler is not supported with retry_processes')
+
         # Even if we don't reset, users will expect the Model to train if train is called
         # So we reset self.converged
         self.converged = False
@@ -169,11 +515,36 @@ class Model(object):
         # Pre training callback
         self._pre_train(input_matrix, target_matrix)
 
+        callback_list = _make_callback_list(self, callbacks,
+                                            post_pattern_callback)
+
         # Train, with given arguments
-        train_error = self._train(
-            input_matrix, target_matrix, iterations, retries, error_break,
-            error_stagnant_distance, error_stagnant_threshold,
-            error_improve_iters, post_pattern_callback)
+        if retry_processes is None:
+            # Only replace the active profiler when given one,
+            # so nested calls to train are recorded by an outer profiler
+            if profiler is not None:
+                previous_profiler = profile.set_profiler(profiler)
+            try:
+                train_error = self._train(
+                    input_matrix, target_matrix, iterations, retries,
+                    error_break, error_stagnant_distance,
+                    error_stagnant_threshold, error_improve_iters,
+                    callback_list, validation_set, validation_interval,
+                    validation_patience)
+            finally:
+                if profiler is not None:
+                    profile.set_profiler(previous_profiler)
+        else:
+            if callback_list.pattern_callbacks:
+                raise ValueError(
+                    'post_pattern_callback and pattern callbacks are not supported '
+                    'with retry_processes')
+            train_error = self._train_parallel(
+                input_matrix, target_matrix, iterations, retries, error_break,
+                error_stagnant_distance, error_stagnant_threshold,
+                error_improve_iters, validation_set, validation_interval,
+                validation_patience, retry_processes, retry_cancel_on_converge,
+                callback_list)
 
         # Post training callback
         self._post_train(input_matrix, target_matrix)
@@ -183,20 +554,27 @@ class Model(object):
 
     def _train(self, input_matrix, target_matrix, iterations, retries,
                error_break, error_stagnant_distance, error_stagnant_threshold,
-               error_improve_iters, post_pattern_callback):
+               error_improve_iters, callback_list, validation_set,
+               validation_interval, validation_patience):
         """Train model on the given dataset."""
         self._reset_bookkeeping()
-        self._post_pattern_callback = post_pattern_callback  # For calling in other method
+        self._pattern_callbacks = callback_list.pattern_callbacks  # For calling in train_step
 
         # Initialize variables for retries
         best_try = (float('inf'), None)  # (error, serialized_model)
 
         # Learn on each pattern for each iteration
         for attempt in range(retries + 1):
+            profiler = profile.get_profiler()
+            if profiler is not None:
+                profiler.start_attempt(attempt)
+
             attempt_error = self._train_attempt(
                 input_matrix, target_matrix, iterations, error_break,
                 error_stagnant_distance, error_stagnant_threshold,
-                error_improve_iters, post_pattern_callback)
+                error_improve_iters, callback_list, validation_set,
+                validation_interval, validation_patience)
+            callback_list.on_attempt_end(self, attempt, attempt_error)
 
             # End if model converged
             # No need to use best attempt (since this is the first to reach best error)
@@ -227,14 +605,80 @@ class Model(object):
 
         return attempt_error
 
+    def _train_parallel(self, input_matrix, target_matrix, iterations, retries,
+                        error_break, error_stagnant_distance,
+                        error_stagnant_threshold, error_improve_iters,
+                        validation_set, validation_interval,
+                        validation_patience, num_processes, cancel_on_converge,
+                        callback_list):
+        """Train model on the given dataset, with attempts run in parallel.
+
+        The first attempt starts from the current model,
+        all other attempts reset the model before training.
+        Each attempt is given its own random seed.
+        """
+        self._reset_bookkeeping()
+        self._pattern_callbacks = []
+
+        # Seeds are drawn from the parent, so parallel runs are
+        # reproducible under a seeded random state
+        seeds = numpy.random.randint(0, 2**31 - 1, size=retries + 1)
+        serialized_model = self.serialize()
+        attempt_args = (iterations, error_break, error_stagnant_distance,
+                        error_stagnant_threshold, error_improve_iters, None,
+                        validation_set, validation_interval,
+                        validation_patience)
+        tasks = [(attempt, type(self), serialized_model, seed, attempt > 0,
+                  attempt_args) for attempt, seed in enumerate(seeds)]
+
+        # Dataset is given to workers once, on process creation,
+        # instead of with every attempt
+        pool = multiprocessing.Pool(
+            processes=min(num_processes, len(tasks)),
+            initializer=_init_attempt_worker,
+            initargs=(input_matrix, target_matrix))
+        try:
+            best_try = (float('inf'), None)  # (error, serialized_model)
+            # Attempts are given in order of completion
+            for (attempt, attempt_error, converged,
+                 attempt_model) in pool.imap_unordered(
+                     _train_attempt_worker, tasks):
+                callback_list.on_attempt_end(self, attempt, attempt_error)
+                if converged:
+                    callback_list.on_converged(self, attempt_error)
+                    if cancel_on_converge:
+                        # Use first attempt to converge, like sequential retries
+                        best_try = (attempt_error, attempt_model)
+                        break
+
+                # Otherwise, use attempt with lowest error
+                if (attempt_error < best_try[0]
+                        # Keep any attempt, even if error is nan
+                        or best_try[1] is None):
+                    best_try = (attempt_error, attempt_model)
+        finally:
+            pool.terminate()
+            pool.join()
+
+        # Use best attempt
+        best_model = self.unserialize(best_try[1])
+        self.__dict__ = best_model.__dict__
+        return best_try[0]
+
     def _train_attempt(self, input_matrix, target_matrix, iterations,
                        error_break, error_stagnant_distance,
                        error_stagnant_threshold, error_improve_iters,
-                       post_pattern_callback):
+                       callback_list=None, validation_set=None,
+                       validation_interval=1, validation_patience=10):
         """Attempt to train this model.
 
         Return True if model converged (error <= error_break)
         """
+        # Initialize validation early stopping,
+        # best_validation is (validation_error, error, snapshot)
+        best_validation = (float('inf'), None, None)
+        checks_since_improvement = 0
+
         # Initialize error history with errors that are
         # unlikely to be close in reality
         error_history = [1e10] * error_stagnant_distance
@@ -243,33 +687,42 @@ class Model(object):
         best_error = float('inf')
         iters_since_improvement = 0
 
+        if callback_list is None:
+            callback_list = CallbackList()
+        profiler = profile.get_profiler()
+
         for self.iteration in range(1, iterations + 1):
             # Perform a single training step
+            if profiler is not None:
+                profiler.start_iteration()
             error = self.train_step(input_matrix, target_matrix)
+            if profiler is not None:
+                profiler.end_iteration(self.iteration, error)
 
             # Logging and breaking
-            if self.logging:
-                print "Iteration {}, Error: {}".format(self.iteration, error)
+            callback_list.on_iteration_end(self, self.iteration, error)
 
             if self.converged:  # If model set converged with custom criteria
-                return error
+                callback_list.on_converged(self, error)
+                break
 
             if error is not None:
                 # Break if error is sufficient, useful to prevent overfitting
                 if error <= error_break:
                     self.converged = True
-                    return error
+                    callback_list.on_converged(self, error)
+                    break
 
                 # Skip the rest if we're already out of iterations (optimization)
                 # Useful for situations where we only run 1 iteration
                 if self.iteration == iterations:
-                    return error
+                    break
 
                 # Break if no progress is made
                 if _all_close(error_history, error, error_stagnant_threshold):
                     # Break if not enough difference between all resent errors
                     # and current error
-                    return error
+                    break
                 error_history.append(error)
                 error_history.pop(0)
 
@@ -282,7 +735,29 @@ class Model(object):
                     iters_since_improvement += 1
                 # If it has been too many iterations since improvement, break
                 if iters_since_improvement >= error_improve_iters:
-                    return error
+                    break
+
+            # Break if validation error has not improved within n checks
+            if (validation_set is not None
+                    and self.iteration % validation_interval == 0):
+                validation_error = self._get_validation_error(*validation_set)
+                if validation_error < best_validation[0]:
+                    best_validation = (validation_error, error,
+                                       self._get_snapshot())
+                    checks_since_improvement = 0
+                else:
+                    checks_since_improvement += 1
+                if checks_since_improvement >= validation_patience:
+                    break
+
+        if validation_set is not None:
+            # Restore model with best validation error,
+            # unless the final model is better
+            if (best_validation[2] is not None
+                    and self._get_validation_error(*validation_set) >
+                    best_validation[0]):
+                self._restore_snapshot(best_validation[2])
+                return best_validation[1]
 
         return error
 
@@ -306,10 +781,10 @@ class Model(object):
                     '%s._train_increment must return an error number or None' %
                     type(self))
 
-            # Optional callback for user extension,
+            # Optional callbacks for user extension,
             # such as a visualization or history tracking
-            if self._post_pattern_callback:
-                self._post_pattern_callback(self, input_vec, target_vec)
+            for callback in self._pattern_callbacks:
+                callback.on_pattern_end(self, input_vec, target_vec)
 
             # Sum errors
             try:
@@ -333,6 +808,35 @@ class Model(object):
         """
         raise NotImplementedError()
 
+    def _get_validation_error(self, input_matrix, target_matrix):
+        """Return error on a validation set, for early stopping.
+
+        Uses the error function of this model (_error_func) if it has one,
+        otherwise mean squared error.
+
+        Optional: Override for models that cannot activate a matrix of inputs.
+        """
+        error_func = getattr(self, '_error_func', None)
+        if error_func is None:
+            error_func = MeanSquaredError()
+        return error_func(self.activate(input_matrix), target_matrix)
+
+    def _get_snapshot(self):
+        """Return a copy of the trained state of this model.
+
+        Optional: Override for models with other trained state,
+        or without _get_flat_parameters.
+        Defaults to a copy of the flat vector of model parameters.
+        """
+        return numpy.copy(self._get_flat_parameters())
+
+    def _restore_snapshot(self, snapshot):
+        """Restore a snapshot from Model._get_snapshot.
+
+        Optional: Override with Model._get_snapshot.
+        """
+        self._set_flat_parameters(snapshot)
+
     def _pre_train(self, input_matrix, target_matrix):
         """Call before Model.train.
 
@@ -381,6 +885,44 @@ class Model(object):
             print inp_vec, '->', self.activate(inp_vec), '(%s)' % tar_vec
 
 
+def _init_attempt_worker(input_matrix, target_matrix):
+    """Store dataset for _train_attempt_worker calls in this process."""
+    global _WORKER_DATASET
+    _WORKER_DATASET = (input_matrix, target_matrix)
+
+
+def _train_attempt_worker(task):
+    """Run a single training attempt, for Model._train_parallel.
+
+    Returns (attempt, error, converged, serialized_model).
+    """
+    attempt, model_class, serialized_model, seed, reset, attempt_args = task
+
+    # Independently seed each attempt
+    random.seed(seed)
+    numpy.random.seed(seed)
+
+    model = model_class.unserialize(serialized_model)
+    if reset:
+        model.reset()
+    error = model._train_attempt(_WORKER_DATASET[0], _WORKER_DATASET[1],
+                                 *attempt_args)
+    return attempt, error, model.converged, model.serialize()
+
+
+def _make_callback_list(model, callbacks, post_pattern_callback):
+    """Return CallbackList for Model.train arguments."""
+    callbacks = list(callbacks) if callbacks is not None else []
+    if post_pattern_callback is not None:
+        callbacks.insert(0, PatternCallback(post_pattern_callback))
+    if model.logging:
+        if model._logging_callback is not None:
+            callbacks.append(model._logging_callback)
+        else:
+            callbacks.append(LoggingCallback())
+    return CallbackList(callbacks)
+
+
 def _all_close(values, other_value, threshold):
     """Return true if all values are within threshold distance of other_value."""
     for value in values:
@@ -0,0 +1,115 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Justin Lovinger
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+"""Run benchmarks, and optionally compare them with a baseline.
+
+Usage:
+    python -m learning.benchmarks --output results.json
+    python -m learning.benchmarks --baseline baseline.json
+    python -m learning.benchmarks --micro --baseline micro_baseline.json
+
+Exits with status 1 if any benchmark regressed from the baseline.
+"""
+
+import sys
+import argparse
+
+from learning.benchmarks import micro, suite
+
+
+def main(argv=None):
+    """Run benchmarks from command line arguments, and return exit status."""
+    parser = argparse.ArgumentParser(
+        description='Benchmark models, optimizers, and line searches.')
+    parser.add_argument('--output', help='Save results to this JSON file.')
+    parser.add_argument(
+        '--baseline', help='Compare results with this JSON file.')
+    parser.add_argument(
+        '--filter',
+        default='',
+        help='Only run benchmarks with names containing this string.')
+    parser.add_argument(
+        '--repeats',
+        type=int,
+        default=3,
+        help='Times each benchmark is run. Fastest time is kept.')
+    parser.add_argument(
+        '--scales',
+        type=int,
+        nargs='+',
+        default=[100, 1000, 10000],
+        help='Number of samples in synthetic datasets.')
+    parser.add_argument(
+        '--micro',
+        action='store_true',
+        help='Run micro-benchmarks of calculate and transfer functions instead.')
+    args = parser.parse_args(argv)
+
+    if args.micro:
+        mismatches = micro.verify_fast_paths()
+        for name in mismatches:
+            print 'MISMATCH {}: fast path does not match reference'.format(name)
+        if mismatches:
+            return 1
+
+        results = micro.run_micro_benchmarks(
+            names=[
+                name for name in sorted(micro.MICRO_BENCHMARKS.keys())
+                if args.filter in name
+            ],
+            repeats=args.repeats)
+        tolerances = micro.DEFAULT_TOLERANCES
+
+        for name, measurements in sorted(results['benchmarks'].iteritems()):
+            print '{}: {:.6f}s'.format(name, measurements['time'])
+    else:
+        benchmarks = [
+            benchmark
+            for benchmark in suite.default_benchmarks(scales=args.scales)
+            if args.filter in benchmark.name
+        ]
+        results = suite.run_benchmarks(benchmarks, repeats=args.repeats)
+        tolerances = suite.DEFAULT_TOLERANCES
+
+        for name, measurements in sorted(results['benchmarks'].iteritems()):
+            print '{}: {:.4f}s, {} obj evals, {} jac evals, error {}'.format(
+                name, measurements['wall_time'], measurements['obj_evals'],
+                measurements['jac_evals'], measurements['error'])
+
+    if args.output is not None:
+        suite.save_results(results, args.output)
+
+    if args.baseline is not None:
+        regressions = suite.compare_results(
+            results, suite.load_results(args.baseline), tolerances)
+        for regression in regressions:
+            print 'REGRESSION {name} {measurement}: {baseline} -> {current}'.format(
+                **regression)
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Justin Lovinger
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+"""Micro-benchmarks for calculate and transfer functions.
+
+Also verifies that each fast path in calculate.FAST_PATHS
+matches its reference implementation.
+"""
+
+import time
+
+import numpy
+
+from learning import calculate, transfer
+from learning.benchmarks.suite import _get_environment
+
+# Relative increase, over baseline, that is considered a regression
+DEFAULT_TOLERANCES = {'time': 0.25}
+
+
+def _matrix(shape):
+    """Return random matrix, in roughly the range of transfer inputs."""
+    return numpy.random.randn(*shape) * 5.0
+
+
+def _vector_pair(shape):
+    """Return two random vectors, with zeros in the second."""
+    size = shape[0] * shape[1]
+    vec_b = numpy.random.random(size)
+    vec_b[::10] = 0.0
+    return numpy.random.random(size), vec_b
+
+
+def _extreme_matrix(shape):
+    """Return random matrix, with values that overflow or underflow exp."""
+    matrix = _matrix(shape)
+    matrix.flat[::7] = 1000.0
+    matrix.flat[3::7] = -1000.0
+    matrix.flat[5::7] = 0.0
+    return matrix
+
+
+def _transfer_call(transfer_func):
+    return lambda matrix: transfer_func(matrix)
+
+
+def _transfer_derivative(transfer_func):
+    # Includes the call to transfer_func, that the derivative may use
+    def derivative(matrix):
+        return transfer_func.derivative(matrix, transfer_func(matrix))
+
+    return derivative
+
+
+# Name: (function, function taking shape and returning tuple of args)
+MICRO_BENCHMARKS = {
+    'calculate.distance': (calculate.distance,
+                           lambda shape: tuple(_vector_pair(shape))),
+    'calculate.protvecdiv': (calculate.protvecdiv, _vector_pair),
+    'calculate.logit': (calculate.logit, lambda shape: (_matrix(shape), )),
+    'calculate.dlogit': (calculate.dlogit, lambda shape: (_matrix(shape), )),
+    'calculate.tanh': (calculate.tanh, lambda shape: (_matrix(shape), )),
+    'calculate.dtanh': (calculate.dtanh, lambda shape: (_matrix(shape), )),
+    'calculate.gaussian': (calculate.gaussian,
+                           lambda shape: (_matrix(shape), )),
+    'calculate.dgaussian': (calculate.dgaussian,
+                            lambda shape: (_matrix(shape), _matrix(shape))),
+    'calculate.relu': (calculate.relu, lambda shape: (_matrix(shape), )),
+    'calculate.drelu': (calculate.drelu, lambda shape: (_matrix(shape), )),
+    'calculate.leaky_relu': (calculate.leaky_relu,
+                             lambda shape: (_matrix(shape), )),
+    'calculate.dleaky_relu': (calculate.dleaky_relu,
+                              lambda shape: (_matrix(shape), )),
+    'calculate.softplus': (calculate.softplus,
+                           lambda shape: (_matrix(shape), )),
+    'calculate.dsoftplus': (calculate.dsoftplus,
+                            lambda shape: (_matrix(shape), )),
+    'calculate.softplus_from_exp': (
+        calculate.softplus_from_exp,
+        lambda shape: (lambda matrix: (matrix, numpy.exp(matrix)))(_matrix(shape))),
+    'calculate.dsoftplus_from_exp': (
+        calculate.dsoftplus_from_exp,
+        lambda shape: (numpy.exp(_matrix(shape)), )),
+    'calculate.softmax': (calculate.softmax,
+                          lambda shape: (_matrix(shape), )),
+    'calculate.dsoftmax': (
+        calculate.dsoftmax,
+        lambda shape: (calculate.softmax(_matrix((shape[0], 10))), )),
+}
+for _name, _transfer_class in [
+        ('LinearTransfer', transfer.LinearTransfer),
+        ('TanhTransfer', transfer.TanhTransfer),
+        ('ReluTransfer', transfer.ReluTransfer),
+        ('LeakyReluTransfer', transfer.LeakyReluTransfer),
+        ('SoftplusTransfer', transfer.SoftplusTransfer),
+        ('GaussianTransfer', transfer.GaussianTransfer),
+        ('SoftmaxTransfer', transfer.SoftmaxTransfer)
+]:
+    MICRO_BENCHMARKS['transfer.%s' % _name] = (
+        _transfer_call(_transfer_class()), lambda shape: (_matrix(shape), ))
+    MICRO_BENCHMARKS['transfer.%s.derivative' % _name] = (
+        _transfer_derivative(_transfer_class()),
+        # Small matrix, because softmax derivative is a 3-tensor
+        lambda shape: (_matrix((shape[0], 10)), ))
+
+
+def time_function(func, args, number=20, repeats=5):
+    """Return fastest mean seconds per call of func(*args).
+
+    func is called number times, repeats times, and the fastest mean is kept.
+    """
+    best_time = float('inf')
+    for _ in range(repeats):
+        start_time = time.time()
+        for _ in range(number):
+            func(*args)
+        best_time = min(best_time, (time.time() - start_time) / number)
+    return best_time
+
+
+def run_micro_benchmarks(names=None,
+                         shape=(1000, 50),
+                         number=20,
+                         repeats=5,
+                         seed=0):
+    """Time each micro-benchmark, and return results.
+
+    Args:
+        names: Names of MICRO_BENCHMARKS to run. Defaults to all.
+        shape: Shape of input matrices.
+        number: Calls per timing.
+        repeats: Number of timings. Fastest is kept.
+        seed: Random seed for inputs.
+
+    Returns:
+        dict; {'environment': dict, 'benchmarks': {name: {'time': seconds per call}}}
+    """
+    if names is None:
+        names = sorted(MICRO_BENCHMARKS.keys())
+
+    results = {}
+    for name in names:
+        func, make_args = MICRO_BENCHMARKS[name]
+        numpy.random.seed(seed)
+        args = make_args(shape)
+        with numpy.errstate(over='ignore'):
+            results[name] = {
+                'time': time_function(func, args, number, repeats)
+            }
+
+    return {'environment': _get_environment(), 'benchmarks': results}
+
+
+def verify_fast_paths(shape=(100, 10), seed=0, rtol=1e-12, atol=1e-15):
+    """Return names of calculate.FAST_PATHS that do not match their reference.
+
+    Inputs include values that overflow and underflow exp.
+    """
+    numpy.random.seed(seed)
+    matrix = _extreme_matrix(shape)
+    vec_a, vec_b = _vector_pair(shape)
+
+    mismatches = []
+    for name, (fast_func, reference_func) in sorted(
+            calculate.FAST_PATHS.iteritems()):
+        if name == 'protvecdiv':
+            args = (vec_a, vec_b)
+        else:
+            args = (matrix, )
+
+        with numpy.errstate(over='ignore'):
+            fast_out = fast_func(*args)
+            reference_out = reference_func(*args)
+        if not (fast_out.shape == reference_out.shape and numpy.allclose(
+                fast_out, reference_out, rtol=rtol, atol=atol)):
+            mismatches.append(name)
+    return mismatches
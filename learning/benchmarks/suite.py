@@ -0,0 +1,376 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Justin Lovinger
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+"""Benchmark suite, with JSON results and baseline comparison."""
+
+import json
+import time
+import random
+import platform
+import multiprocessing
+import traceback
+
+import numpy
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+from learning import (validation, MLP, DropoutMLP, RBF, PBNN, SOM,
+                      LinearRegressionModel, LogisticRegressionModel)
+from learning.data import datasets
+from learning.optimize import (SteepestDescent, SteepestDescentMomentum, BFGS,
+                               LBFGS, BacktrackingLineSearch, WolfeLineSearch)
+from learning.profile import TrainingProfiler
+
+# Relative increase, over baseline, that is considered a regression
+DEFAULT_TOLERANCES = {
+    'wall_time': 0.25,
+    'activate_time': 0.25,
+    'obj_evals': 0.0,
+    'jac_evals': 0.0,
+    'peak_memory': 0.25,
+    'error': 0.05
+}
+
+
+class Benchmark(object):
+    """A single, seeded, training run.
+
+    Args:
+        name: Unique name, used to compare results with a baseline.
+        make_model: Function taking (attributes, num_outputs), and returning a Model.
+        make_dataset: Function returning an (input_matrix, target_matrix) tuple.
+        train_kwargs: Args passed to Model.train.
+        measure_error: If True, final error is measured on the dataset.
+            Set False for models with outputs that do not match targets, such as SOM.
+    """
+
+    def __init__(self,
+                 name,
+                 make_model,
+                 make_dataset,
+                 train_kwargs=None,
+                 measure_error=True):
+        self.name = name
+        self._make_model = make_model
+        self._make_dataset = make_dataset
+        self._train_kwargs = train_kwargs if train_kwargs is not None else {}
+        self._measure_error = measure_error
+
+    def run(self, seed=0):
+        """Train a new model, and return dict of measurements.
+
+        wall_time: Seconds spent in Model.train.
+        iterations, obj_evals, jac_evals, line_search_trials: Totals over training.
+        peak_memory: Increase in peak resident memory of this process, in bytes.
+            Only memory above the previous peak is counted,
+            so run in a new process (see run_benchmarks)
+            for a measurement independent of earlier benchmarks.
+            None if unavailable.
+        activate_time: Seconds spent measuring final error, or None.
+        error: Final error on the dataset, or None.
+        """
+        # Seed before making dataset, so random datasets are also reproducible
+        random.seed(seed)
+        numpy.random.seed(seed)
+
+        input_matrix, target_matrix = self._make_dataset()
+        model = self._make_model(input_matrix.shape[1], target_matrix.shape[1])
+        model.logging = False
+
+        profiler = TrainingProfiler()
+        start_peak_memory = _get_peak_memory()
+        start_time = time.time()
+        model.train(
+            input_matrix, target_matrix, profiler=profiler,
+            **self._train_kwargs)
+        wall_time = time.time() - start_time
+        end_peak_memory = _get_peak_memory()
+
+        if self._measure_error:
+            start_time = time.time()
+            error = float(
+                validation.get_error(model, input_matrix, target_matrix))
+            activate_time = time.time() - start_time
+        else:
+            error = None
+            activate_time = None
+
+        summary = profiler.summary()
+        return {
+            'wall_time': wall_time,
+            'iterations': summary['iterations'],
+            'obj_evals': summary['obj_evals'],
+            'jac_evals': summary['jac_evals'],
+            'line_search_trials': summary['line_search_trials'],
+            'peak_memory': (None if start_peak_memory is None else
+                            end_peak_memory - start_peak_memory),
+            'activate_time': activate_time,
+            'error': error
+        }
+
+
+def default_benchmarks(scales=(100, 1000, 10000)):
+    """Return list of Benchmark for all models and optimizers.
+
+    Args:
+        scales: Number of samples in each synthetic dataset.
+    """
+    train_kwargs = {'iterations': 20, 'error_break': 0.0}
+
+    benchmarks = [
+        # Models on real datasets
+        Benchmark('mlp/iris', lambda a, o: MLP((a, 10, o)),
+                  datasets.get_iris, train_kwargs),
+        Benchmark('mlp/yeast', lambda a, o: MLP((a, 10, o)),
+                  datasets.get_yeast, train_kwargs),
+        Benchmark('rbf/iris', lambda a, o: RBF(a, 10, o), datasets.get_iris,
+                  train_kwargs),
+        Benchmark('pbnn/iris', lambda a, o: PBNN(), datasets.get_iris,
+                  train_kwargs),
+        Benchmark('pbnn/yeast', lambda a, o: PBNN(), datasets.get_yeast,
+                  train_kwargs),
+        Benchmark(
+            'som/iris',
+            lambda a, o: SOM(a, 10),
+            datasets.get_iris, {'iterations': 5,
+                                'error_break': 0.0},
+            measure_error=False),
+        Benchmark('linear_regression/calhousing',
+                  lambda a, o: LinearRegressionModel(a, o),
+                  datasets.get_calhousing, train_kwargs),
+        Benchmark('logistic_regression/yeast',
+                  lambda a, o: LogisticRegressionModel(a, o),
+                  datasets.get_yeast, train_kwargs),
+    ]
+
+    # Models on synthetic datasets, at several scales
+    for num_points in scales:
+        benchmarks.extend([
+            Benchmark('mlp/random_classification_%d' % num_points,
+                      lambda a, o: MLP((a, 20, o)),
+                      _partial_dataset(datasets.get_random_classification,
+                                       num_points, 10, 3), train_kwargs),
+            Benchmark('dropout_mlp/random_classification_%d' % num_points,
+                      lambda a, o: DropoutMLP((a, 20, o)),
+                      _partial_dataset(datasets.get_random_classification,
+                                       num_points, 10, 3), train_kwargs),
+            Benchmark('linear_regression/random_regression_%d' % num_points,
+                      lambda a, o: LinearRegressionModel(a, o),
+                      _partial_dataset(datasets.get_random_regression,
+                                       num_points, 10, 2), train_kwargs),
+        ])
+
+    # Each optimizer and line search combination
+    for optimizer_name, optimizer_class in [
+            ('steepest_descent', SteepestDescent),
+            ('steepest_descent_momentum', SteepestDescentMomentum),
+            ('bfgs', BFGS), ('lbfgs', LBFGS)
+    ]:
+        for line_search_name, line_search_class in [
+                ('backtracking', BacktrackingLineSearch),
+                ('wolfe', WolfeLineSearch)
+        ]:
+            benchmarks.append(
+                Benchmark('optimizer/%s_%s' % (optimizer_name,
+                                               line_search_name),
+                          _make_mlp_with_optimizer(optimizer_class,
+                                                   line_search_class),
+                          datasets.get_iris, train_kwargs))
+
+    return benchmarks
+
+
+def run_benchmarks(benchmarks, repeats=1, seed=0, isolate=None):
+    """Run each benchmark, and return results.
+
+    Benchmarks are run repeats times, and the fastest wall_time is kept.
+    All other measurements are the same for every repeat, due to seeding.
+
+    Args:
+        isolate: If True, every run is in a new process,
+            so peak_memory does not depend on earlier runs.
+            Requires a platform that forks processes.
+            Defaults to True when peak memory can be measured.
+
+    Returns:
+        dict; {'environment': dict, 'benchmarks': {name: measurements}}
+    """
+    if repeats < 1:
+        raise ValueError('repeats must be >= 1')
+    if isolate is None:
+        isolate = resource is not None
+    run_func = _run_isolated if isolate else _run
+
+    results = {}
+    for benchmark in benchmarks:
+        if benchmark.name in results:
+            raise ValueError('Duplicate benchmark name: %s' % benchmark.name)
+
+        runs = [run_func(benchmark, seed) for _ in range(repeats)]
+        results[benchmark.name] = runs[0]
+        results[benchmark.name]['wall_time'] = min(
+            run['wall_time'] for run in runs)
+
+    return {'environment': _get_environment(), 'benchmarks': results}
+
+
+def save_results(results, filename):
+    """Save results as JSON."""
+    with open(filename, 'w') as results_file:
+        json.dump(results, results_file, indent=2, sort_keys=True)
+
+
+def load_results(filename):
+    """Return results saved with save_results."""
+    with open(filename) as results_file:
+        return json.load(results_file)
+
+
+def compare_results(results, baseline, tolerances=None):
+    """Return list of regressions in results, compared to baseline.
+
+    A regression is a measurement that increased by more than
+    its relative tolerance, over the baseline.
+    A baseline of 0 has no relative scale, so it is only compared
+    for measurements with a tolerance of 0, such as evaluation counts,
+    and the ratio of these regressions is None.
+    Benchmarks missing from either results are ignored.
+
+    Args:
+        results: Results from run_benchmarks.
+        baseline: Results from run_benchmarks, such as from a previous release.
+        tolerances: Dict of measurement name to relative tolerance.
+            Defaults to DEFAULT_TOLERANCES.
+
+    Returns:
+        list; Dicts with name, measurement, baseline, current, and ratio.
+    """
+    if tolerances is None:
+        tolerances = DEFAULT_TOLERANCES
+
+    regressions = []
+    for name in sorted(results['benchmarks']):
+        if name not in baseline['benchmarks']:
+            continue
+
+        current_measurements = results['benchmarks'][name]
+        baseline_measurements = baseline['benchmarks'][name]
+        for measurement, tolerance in sorted(tolerances.iteritems()):
+            current_value = current_measurements.get(measurement)
+            baseline_value = baseline_measurements.get(measurement)
+            if current_value is None or baseline_value is None:
+                continue
+            if baseline_value == 0 and tolerance != 0:
+                continue
+
+            if current_value > baseline_value * (1.0 + tolerance) and (
+                    # Ignore noise in measurements near 0
+                    current_value - baseline_value > 1e-10):
+                regressions.append({
+                    'name': name,
+                    'measurement': measurement,
+                    'baseline': baseline_value,
+                    'current': current_value,
+                    'ratio': (current_value / float(baseline_value)
+                              if baseline_value != 0 else None)
+                })
+    return regressions
+
+
+def _run(benchmark, seed):
+    """Return measurements of benchmark, run in this process."""
+    return benchmark.run(seed)
+
+
+def _run_isolated(benchmark, seed):
+    """Return measurements of benchmark, run in a new process."""
+    connection, worker_connection = multiprocessing.Pipe()
+    process = multiprocessing.Process(
+        target=_run_worker, args=(benchmark, seed, worker_connection))
+    process.start()
+    # Close our copy of the worker end,
+    # so recv raises EOFError if the worker dies
+    worker_connection.close()
+    try:
+        result = connection.recv()
+    except EOFError:
+        result = None
+    finally:
+        process.join()
+        connection.close()
+
+    if result is None:
+        raise RuntimeError(
+            'Benchmark process for %s exited with code %s, without results' %
+            (benchmark.name, process.exitcode))
+    measurements, error = result
+    if error is not None:
+        raise RuntimeError('Error in benchmark process:\n%s' % error)
+    return measurements
+
+
+def _run_worker(benchmark, seed, connection):
+    """Send (measurements, None), or (None, traceback string), to connection."""
+    try:
+        connection.send((benchmark.run(seed), None))
+    except Exception:
+        connection.send((None, traceback.format_exc()))
+    finally:
+        connection.close()
+
+
+def _partial_dataset(dataset_func, *args):
+    """Return function returning dataset_func(*args)."""
+    return lambda: dataset_func(*args)
+
+
+def _make_mlp_with_optimizer(optimizer_class, line_search_class):
+    """Return function making MLP with given optimizer and line search."""
+    return lambda a, o: MLP(
+        (a, 10, o), optimizer=optimizer_class(
+            step_size_getter=line_search_class()))
+
+
+def _get_peak_memory():
+    """Return peak resident memory of this process in bytes, or None."""
+    if resource is None:
+        return None
+
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, Mac OS reports bytes
+    if platform.system() != 'Darwin':
+        peak_memory *= 1024
+    return peak_memory
+
+
+def _get_environment():
+    """Return dict describing environment, to store alongside results."""
+    return {
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'platform': platform.platform()
+    }
@@ -40,22 +40,10 @@ def protvecdiv(vec_a, vec_b):
 
     When vec_b_i == 0, return 0 for component i.
     """
-    with numpy.errstate(divide='raise', invalid='raise'):
-        try:
-            # Try to quickly divide vectors
-            return vec_a / vec_b
-        except FloatingPointError:
-            # Fallback to dividing component at a time
-            # Slower, but lets us handle divide by 0
-            # TODO: Use procedure in preprocess.normalzie instead
-            #   Divide, then np_matrix[~ numpy.isfinite(np_matrix)] = 0.0
-            result_vec = numpy.zeros(vec_a.shape)
-            for i in range(vec_a.shape[0]):
-                try:
-                    result_vec[i] = vec_a[i] / vec_b[i]
-                except FloatingPointError:
-                    pass  # Already 0 from numpy.zeros
-            return result_vec
+    out = numpy.zeros(
+        numpy.broadcast(vec_a, vec_b).shape,
+        dtype=numpy.result_type(vec_a, vec_b, 1.0))
+    return numpy.divide(vec_a, vec_b, out=out, where=(vec_b != 0))
 
 
 #####################################
@@ -69,33 +57,30 @@ def logit(x):
 def dlogit(x):
     """Return derivative of logistic function."""
     e_pow_x = numpy.exp(x)
-    try:
-        # Replace inf's with 1, because with infinite precision,
-        # output will be approximately 1
-        # inf is caused by overflow in exp
-        # NOTE: More efficient to replace non-infs
-        out = numpy.ones(x.shape)
-        not_infs = e_pow_x != numpy.Infinity
-        out[not_infs] = e_pow_x[not_infs] / (e_pow_x[not_infs] + 1.0)**2
-        return out
-    except AttributeError:  # Scalar
-        # Check for overflow
-        if e_pow_x == INFINITY:
-            # Return 1 if overflow, because with infinite precision,
-            # output will be approximately 1
-            return 1.0
-        else:  # No overflow
-            return e_pow_x / (e_pow_x + 1.0)**2
-
-
-def tanh(x):
+    denominator = e_pow_x + 1.0
+    denominator *= denominator
+
+    # Replace inf's with 1, because with infinite precision,
+    # output will be approximately 1
+    # inf is caused by overflow in exp
+    out = numpy.ones(numpy.shape(x))
+    numpy.divide(e_pow_x, denominator, out=out, where=(e_pow_x != INFINITY))
+    if out.shape == ():  # Scalar
+        return out[()]
+    return out
+
+
+def tanh(x, out=None):
     """Sigmoid like function using tanh."""
-    return numpy.tanh(x)
+    return numpy.tanh(x, out=out)
 
 
-def dtanh(y):
+def dtanh(y, out=None):
     """Derivative of tanh."""
-    return 1.0 - y**2
+    if out is None:
+        return 1.0 - y**2
+    numpy.square(y, out=out)
+    return numpy.subtract(1.0, out, out=out)
 
 
 def gaussian(x, variance=1.0):
@@ -106,41 +91,83 @@ def dgaussian(x, y, variance=1.0):
     return -2.0 * x * y / variance
 
 
-def relu(x):
+def relu(x, out=None):
+    """Return rectified linear unit, max(0, x), for each input value."""
+    return numpy.maximum(x, 0.0, out=out)
+
+
+def drelu(x, out=None):
+    """Return the derivative of the relu function for x.
+
+    1 where x > 0, otherwise 0.
+    """
+    if out is None:
+        out = numpy.empty(numpy.shape(x))
+    return numpy.greater(x, 0.0, out=out)
+
+
+def leaky_relu(x, alpha=0.01, out=None):
+    """Return leaky rectified linear unit, max(alpha x, x), for each input value.
+
+    Requires 0 <= alpha < 1.
+    """
+    return numpy.maximum(x, numpy.multiply(x, alpha), out=out)
+
+
+def dleaky_relu(x, alpha=0.01, out=None):
+    """Return the derivative of the leaky relu function for x.
+
+    1 where x > 0, otherwise alpha.
+    """
+    if out is None:
+        out = numpy.empty(numpy.shape(x))
+    out.fill(alpha)
+    numpy.copyto(out, 1.0, where=(x > 0.0))
+    return out
+
+
+def softplus(x):
     """Return ln(1 + e^x) for each input value."""
-    # NOTE: numpy.errstate is very expensive, so the following is slower
-    # Maybe numpy will optimize errstate in the future, to make this more effective
-    # try:
-    #     with numpy.errstate(over='raise'):
-    #         return numpy.log(1.0 + numpy.exp(x))
-    # except FloatingPointError:
-    #     with numpy.errstate(over='ignore'):
-    #         out = numpy.log(1.0 + numpy.exp(x))
-
-    #     # Replace inf's with corresponding components in x
-    #     # inf is caused by overflow in exp
-    #     infs = out == numpy.Infinity
-    #     out[infs] = x[infs]
-
-    #     return out
-
-    # Don't use try except with numpy.errstate, because it is slow
-    out = numpy.log(1.0 + numpy.exp(x))
+    # ln(e^0 + e^x), without overflow in e^x
+    return numpy.logaddexp(0.0, x)
+
+
+def softplus_from_exp(x, e_pow_x, out=None):
+    """Return ln(1 + e^x) for each input value, given e^x.
+
+    Use with dsoftplus_from_exp, to share e^x between softplus and its derivative.
+    """
+    out = numpy.log1p(e_pow_x, out=out)
 
     # Replace inf's with corresponding components in x
     # inf is caused by overflow in exp
-    infs = out == numpy.Infinity
-    out[infs] = x[infs]
+    infs = numpy.isinf(out)
+    if infs.any():
+        if isinstance(out, numpy.ndarray):
+            numpy.copyto(out, x, where=infs)
+        else:  # Scalar
+            out = x
 
     return out
 
 
-def drelu(x):
-    """Return the derivative of the softplus relu function for x."""
-    # NOTE: Can be optimized by caching numpy.e**(x) and returning e^x / (e^x + 1)
+def dsoftplus(x):
+    """Return the derivative of the softplus function for x."""
     return 1.0 / (1.0 + numpy.exp(-x))
 
 
+def dsoftplus_from_exp(e_pow_x, out=None):
+    """Return the derivative of the softplus function, given e^x."""
+    # Return 1 if overflow, because with infinite precision,
+    # output will be approximately 1
+    if out is None:
+        out = numpy.ones(numpy.shape(e_pow_x))
+    else:
+        out.fill(1.0)
+    return numpy.divide(
+        e_pow_x, e_pow_x + 1.0, out=out, where=(e_pow_x != INFINITY))
+
+
 def softmax(x):
     """Return the softmax of vector x."""
     # Subtract max to prevent overflow
@@ -174,3 +201,46 @@ def dsoftmax(y):
         raise ValueError('Unsupported tensor y in dsoftmax.')
 
     return jacobian
+
+
+#####################################
+# Reference implementations
+#####################################
+# Straightforward implementations of functions with fast paths.
+# benchmarks.micro verifies fast paths against these.
+def _protvecdiv_reference(vec_a, vec_b):
+    """Divide vec_a by vec_b, one component at a time."""
+    result_vec = numpy.zeros(vec_a.shape)
+    for i in range(vec_a.shape[0]):
+        if vec_b[i] != 0:
+            result_vec[i] = vec_a[i] / vec_b[i]
+    return result_vec
+
+
+def _dlogit_reference(x):
+    """Return derivative of logistic function, with masked division."""
+    e_pow_x = numpy.exp(x)
+    out = numpy.ones(x.shape)
+    not_infs = e_pow_x != INFINITY
+    out[not_infs] = e_pow_x[not_infs] / (e_pow_x[not_infs] + 1.0)**2
+    return out
+
+
+def _softplus_reference(x):
+    """Return ln(1 + e^x), replacing overflow with x."""
+    out = numpy.log(1.0 + numpy.exp(x))
+    infs = out == INFINITY
+    out[infs] = x[infs]
+    return out
+
+
+# Name: (fast function, reference function), taking the same arguments
+FAST_PATHS = {
+    'protvecdiv': (protvecdiv, _protvecdiv_reference),
+    'dlogit': (dlogit, _dlogit_reference),
+    'softplus': (softplus, _softplus_reference),
+    'softplus_from_exp': (lambda x: softplus_from_exp(x, numpy.exp(x)),
+                          _softplus_reference),
+    'dsoftplus_from_exp': (lambda x: dsoftplus_from_exp(numpy.exp(x)),
+                           dsoftplus)
+}
@@ -0,0 +1,206 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Justin Lovinger
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+"""Training events, and handlers for them.
+
+Model.train and validation.cross_validate give events to a CallbackList:
+    on_pattern_end: After each pattern, for models that train incrementally.
+    on_iteration_end: After each training iteration.
+    on_converged: When error reaches error_break, or a model sets converged.
+    on_attempt_end: After each training attempt (retry).
+    on_fold_end: After each cross validation fold.
+"""
+import logging
+import time
+
+# Logger used by LoggingCallback, by default
+LOGGER_NAME = 'learning'
+
+
+class Callback(object):
+    """Handler for training events.
+
+    Override any of the event methods. All events do nothing by default.
+    """
+
+    def on_pattern_end(self, model, input_vec, target_vec):
+        """Called after model trains on a single pattern."""
+        pass
+
+    def on_iteration_end(self, model, iteration, error):
+        """Called after each training iteration."""
+        pass
+
+    def on_converged(self, model, error):
+        """Called when model converges."""
+        pass
+
+    def on_attempt_end(self, model, attempt, error):
+        """Called after each training attempt."""
+        pass
+
+    def on_fold_end(self, model, fold, stats):
+        """Called after each cross validation fold, with stats for that fold."""
+        pass
+
+
+class CallbackList(Callback):
+    """Give each event to a list of callbacks.
+
+    Args:
+        callbacks: List of Callback.
+    """
+
+    def __init__(self, callbacks=()):
+        super(CallbackList, self).__init__()
+        self.callbacks = list(callbacks)
+
+        # Pattern events are given once for every pattern,
+        # so only callbacks that handle them are called
+        self.pattern_callbacks = [
+            callback for callback in self.callbacks
+            if _overrides(callback, 'on_pattern_end')
+        ]
+
+    def on_pattern_end(self, model, input_vec, target_vec):
+        """Called after model trains on a single pattern."""
+        for callback in self.pattern_callbacks:
+            callback.on_pattern_end(model, input_vec, target_vec)
+
+    def on_iteration_end(self, model, iteration, error):
+        """Called after each training iteration."""
+        for callback in self.callbacks:
+            callback.on_iteration_end(model, iteration, error)
+
+    def on_converged(self, model, error):
+        """Called when model converges."""
+        for callback in self.callbacks:
+            callback.on_converged(model, error)
+
+    def on_attempt_end(self, model, attempt, error):
+        """Called after each training attempt."""
+        for callback in self.callbacks:
+            callback.on_attempt_end(model, attempt, error)
+
+    def on_fold_end(self, model, fold, stats):
+        """Called after each cross validation fold, with stats for that fold."""
+        for callback in self.callbacks:
+            callback.on_fold_end(model, fold, stats)
+
+
+class PatternCallback(Callback):
+    """Call a function after every pattern.
+
+    Args:
+        func: Function taking (model, input_vec, target_vec).
+    """
+
+    def __init__(self, func):
+        super(PatternCallback, self).__init__()
+        self._func = func
+
+    def on_pattern_end(self, model, input_vec, target_vec):
+        """Called after model trains on a single pattern."""
+        self._func(model, input_vec, target_vec)
+
+
+class LoggingCallback(Callback):
+    """Log training progress with the logging module.
+
+    Iterations are sampled, and rate limited, so logging does not slow training.
+    Converged, attempt, and fold events are always logged.
+
+    Args:
+        sample_every: Only every sample_every-th iteration may be logged.
+            Iterations are counted over every call to Model.train
+            this callback is given to, such as every mini-batch of
+            Model.stochastic_train.
+        min_interval: Minimum seconds between logged iterations.
+            None to log every sampled iteration.
+        logger_name: Name of logger.
+        level: Logging level of messages.
+        timer: Function returning the current time in seconds.
+    """
+
+    def __init__(self,
+                 sample_every=1,
+                 min_interval=1.0,
+                 logger_name=LOGGER_NAME,
+                 level=logging.INFO,
+                 timer=time.time):
+        super(LoggingCallback, self).__init__()
+
+        if sample_every < 1:
+            raise ValueError('sample_every must be >= 1')
+
+        self._sample_every = sample_every
+        self._min_interval = min_interval
+        # Logger is retrieved by name, so this callback can be pickled
+        self._logger_name = logger_name
+        self._level = level
+        self._timer = timer
+
+        self._num_iterations = 0
+        self._last_log_time = None
+
+    def on_iteration_end(self, model, iteration, error):
+        """Log iteration, if sampled and not logged too recently."""
+        self._num_iterations += 1
+        if self._num_iterations % self._sample_every != 0:
+            return
+
+        logger = logging.getLogger(self._logger_name)
+        if not logger.isEnabledFor(self._level):
+            return
+
+        if self._min_interval is not None:
+            current_time = self._timer()
+            if (self._last_log_time is not None and
+                    current_time - self._last_log_time < self._min_interval):
+                return
+            self._last_log_time = current_time
+
+        logger.log(self._level, 'Iteration %d, Error: %s', iteration, error)
+
+    def on_converged(self, model, error):
+        """Log convergence."""
+        logging.getLogger(self._logger_name).log(
+            self._level, 'Converged at iteration %d, Error: %s',
+            model.iteration, error)
+
+    def on_attempt_end(self, model, attempt, error):
+        """Log end of attempt."""
+        logging.getLogger(self._logger_name).log(
+            self._level, 'Attempt %d finished, Error: %s', attempt, error)
+
+    def on_fold_end(self, model, fold, stats):
+        """Log testing error of fold."""
+        logging.getLogger(self._logger_name).log(
+            self._level, 'Fold %d finished, Testing error: %s', fold,
+            stats.get('testing_error'))
+
+
+def _overrides(callback, method_name):
+    """Return True if callback overrides method_name of Callback."""
+    return (getattr(type(callback), method_name).__func__ is not getattr(
+        Callback, method_name).__func__)
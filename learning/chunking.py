@@ -0,0 +1,223 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Justin Lovinger
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+"""Evaluate objective values and gradients in chunks of rows.
+
+Models normally compute activations for every row of a dataset at once.
+For very large datasets, these activations may not fit in memory.
+Instead, error and gradient can be computed for chunks of rows,
+and combined into the error and gradient of the full dataset.
+
+Rows can also be split into one shard for each thread of a thread pool.
+NumPy releases the GIL during large array operations,
+so shards are evaluated in parallel.
+
+This requires that error is the mean of row errors,
+as with MeanSquaredError and CrossEntropyError.
+"""
+import os
+import threading
+from multiprocessing.pool import ThreadPool
+
+# Bytes of each float64 value
+FLOAT_BYTES = 8
+
+# Minimum rows in each thread shard.
+# Smaller shards spend more time in Python than in NumPy.
+MIN_SHARD_ROWS = 100
+
+_thread_pools = {}
+_thread_pools_lock = threading.Lock()
+
+
+def get_chunk_rows(num_rows, row_values, max_batch_rows=None,
+                   memory_budget=None):
+    """Return number of rows in each chunk, or None if chunks are not needed.
+
+    Args:
+        num_rows: Number of rows in dataset.
+        row_values: Number of intermediate values a model stores for each row,
+            such as activations of each layer.
+        max_batch_rows: Optional. Maximum number of rows in each chunk.
+        memory_budget: Optional. Maximum bytes of intermediate values
+            for each chunk. Chunk rows are chosen from row_values.
+    """
+    chunk_rows = None
+    if max_batch_rows is not None:
+        if max_batch_rows < 1:
+            raise ValueError('max_batch_rows must be >= 1')
+        chunk_rows = max_batch_rows
+    if memory_budget is not None:
+        if memory_budget <= 0:
+            raise ValueError('memory_budget must be > 0')
+        budget_rows = max(
+            1, int(memory_budget // (FLOAT_BYTES * max(row_values, 1))))
+        chunk_rows = budget_rows if chunk_rows is None else min(
+            chunk_rows, budget_rows)
+
+    if chunk_rows is None or chunk_rows >= num_rows:
+        return None
+    return chunk_rows
+
+
+def get_num_shards(num_rows, num_threads):
+    """Return number of thread shards for a dataset, or 1 if sharding is not worthwhile.
+
+    Args:
+        num_rows: Number of rows in dataset.
+        num_threads: Maximum number of threads.
+    """
+    if num_threads < 1:
+        raise ValueError('num_threads must be >= 1')
+    return max(1, min(num_threads, num_rows // MIN_SHARD_ROWS))
+
+
+def get_thread_pool(num_threads):
+    """Return a pool of num_threads threads, shared by all models.
+
+    Threads are not copied into forked processes,
+    so each process has its own pools.
+    """
+    key = (os.getpid(), num_threads)
+    with _thread_pools_lock:
+        try:
+            return _thread_pools[key]
+        except KeyError:
+            pool = ThreadPool(num_threads)
+            _thread_pools[key] = pool
+            return pool
+
+
+def num_rows(matrix):
+    """Return number of rows in a dense or sparse matrix, or list of rows."""
+    try:
+        return matrix.shape[0]
+    except AttributeError:  # List
+        return len(matrix)
+
+
+def iter_chunks(num_rows, chunk_rows):
+    """Yield slice of rows for each chunk."""
+    for start in range(0, num_rows, chunk_rows):
+        yield slice(start, min(start + chunk_rows, num_rows))
+
+
+def chunked_obj(obj_func, num_rows, chunk_rows):
+    """Return mean objective value of obj_func over chunks of rows.
+
+    Args:
+        obj_func: Function taking a slice of rows,
+            returning mean error of rows in chunk.
+        num_rows: Number of rows in dataset.
+        chunk_rows: Number of rows in each chunk.
+    """
+    obj_value = 0.0
+    for rows in iter_chunks(num_rows, chunk_rows):
+        obj_value += obj_func(rows) * _chunk_weight(rows, num_rows)
+    return obj_value
+
+
+def sharded_obj(obj_func, num_rows, num_shards):
+    """Return mean objective value of obj_func over shards of rows, one per thread.
+
+    Args:
+        obj_func: Function taking a slice of rows,
+            returning mean error of rows in shard.
+            Must be safe to call from multiple threads at once.
+        num_rows: Number of rows in dataset.
+        num_shards: Number of shards, and threads.
+    """
+    shards = get_shards(num_rows, num_shards)
+    obj_values = get_thread_pool(num_shards).map(obj_func, shards)
+    return sum(
+        obj_value * _chunk_weight(rows, num_rows)
+        for obj_value, rows in zip(obj_values, shards))
+
+
+def chunked_obj_jac(obj_jac_func, num_rows, chunk_rows):
+    """Return mean objective value and gradient of obj_jac_func over chunks of rows.
+
+    Gradients of each chunk are summed into one gradient buffer.
+
+    Args:
+        obj_jac_func: Function taking a slice of rows,
+            returning (mean error, gradient vector) of rows in chunk.
+            The returned gradient may be modified.
+        num_rows: Number of rows in dataset.
+        chunk_rows: Number of rows in each chunk.
+    """
+    return _sum_obj_jacs(((rows, obj_jac_func(rows))
+                          for rows in iter_chunks(num_rows, chunk_rows)),
+                         num_rows)
+
+
+def sharded_obj_jac(obj_jac_func, num_rows, num_shards):
+    """Return mean objective value and gradient of obj_jac_func over shards of rows.
+
+    Each shard is evaluated in its own thread, into its own gradient buffer.
+    Shard gradients are then reduced into one gradient.
+
+    Args:
+        obj_jac_func: Function taking a slice of rows,
+            returning (mean error, gradient vector) of rows in shard.
+            The returned gradient may be modified.
+            Must be safe to call from multiple threads at once.
+        num_rows: Number of rows in dataset.
+        num_shards: Number of shards, and threads.
+    """
+    shards = get_shards(num_rows, num_shards)
+    results = get_thread_pool(num_shards).map(obj_jac_func, shards)
+    return _sum_obj_jacs(zip(shards, results), num_rows)
+
+
+def get_shards(num_rows, num_shards):
+    """Return list of slices, splitting rows into num_shards near equal shards."""
+    return list(iter_chunks(num_rows, -(-num_rows // num_shards)))
+
+
+def _sum_obj_jacs(rows_results, num_rows):
+    """Return weighted sum of (rows, (obj, jac)) results.
+
+    Gradients are summed into the first gradient buffer.
+    """
+    obj_value = 0.0
+    jacobian = None
+    for rows, (chunk_obj, chunk_jac) in rows_results:
+        weight = _chunk_weight(rows, num_rows)
+        obj_value += chunk_obj * weight
+        chunk_jac *= weight
+        if jacobian is None:
+            jacobian = chunk_jac
+        else:
+            jacobian += chunk_jac
+
+    return obj_value, jacobian
+
+
+def _chunk_weight(rows, num_rows):
+    """Return fraction of rows in chunk.
+
+    Errors and gradients are means of rows,
+    so chunks are weighted by their fraction of rows.
+    """
+    return (rows.stop - rows.start) / float(num_rows)
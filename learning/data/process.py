@@ -22,63 +22,26 @@
 # SOFTWARE.
 ###############################################################################
 
+import json
+import os
 import re
 
 import numpy
 
 from learning import preprocess
 
+INPUTS_FILENAME = 'inputs.npy'
+TARGETS_FILENAME = 'targets.npy'
+HEADER_FILENAME = 'header.json'
+
 
 def get_data(file_name,
              attr_start_pos,
              attr_end_pos=-1,
              target_pos=-1,
              classification=True):
-    if classification:
-        # Get data from file
-        data_file = open(file_name)
-        # Determine the classes
-        classes = set()
-        for line in data_file:
-            attributes = _get_attributes(line)
-            class_ = attributes[target_pos].strip()
-            classes.add(class_)
-        class_dict = {}
-        # Sorted for easier validation
-        for i, class_ in enumerate(sorted(classes)):
-            class_dict[class_] = i
-
-    # Obtain a data point from each line of the file
-    input_matrix = []
-    target_matrix = []
-
-    data_file = open(file_name)
-    for line in data_file:
-        attributes = _get_attributes(line)
-
-        try:
-            input = [
-                float(value)
-                for value in attributes[attr_start_pos:attr_end_pos]
-            ]
-        except ValueError:
-            continue
-
-        if classification:
-            class_ = attributes[target_pos].strip()
-            output = [0.0] * len(classes)
-            # Class dict maps the name to the position
-            # This position is given a value of 1.0
-            output[class_dict[class_]] = 1.0
-        else:
-            output = [float(attributes[target_pos].strip())]
-
-        input_matrix.append(input)
-        target_matrix.append(output)
-
-    # Make numpy arrays
-    input_matrix = numpy.array(input_matrix)
-    target_matrix = numpy.array(target_matrix)
+    input_matrix, target_matrix, _ = _read_data(
+        file_name, attr_start_pos, attr_end_pos, target_pos, classification)
 
     # Re-scale input matrix to [-1, 1]
     input_matrix = preprocess.rescale(input_matrix)
@@ -89,6 +52,246 @@ def get_data(file_name,
     return input_matrix, target_matrix
 
 
-def _get_attributes(line):
-    line_processed = re.sub(r' +', ',', line.strip())
-    return line_processed.split(',')
+def convert_data(file_name,
+                 directory,
+                 attr_start_pos,
+                 attr_end_pos=-1,
+                 target_pos=-1,
+                 classification=True):
+    """Convert a text data file to a binary dataset directory.
+
+    The directory holds inputs.npy and targets.npy, already re-scaled
+    like get_data, and a header.json with the class names
+    (in target column order) and the column min and max used for scaling.
+    Use load_data to open the converted dataset.
+
+    Args:
+        file_name: Text data file, as given to get_data.
+        directory: Directory to write the dataset to. Created if missing.
+        attr_start_pos, attr_end_pos, target_pos, classification:
+            See get_data.
+    """
+    input_matrix, target_matrix, classes = _read_data(
+        file_name, attr_start_pos, attr_end_pos, target_pos, classification)
+
+    input_rescaler = preprocess.Rescaler().fit(input_matrix)
+    input_matrix = input_rescaler.transform(input_matrix, copy=False)
+    header = {
+        'classes': classes,
+        'input_min': input_rescaler.min.tolist(),
+        'input_max': input_rescaler.max.tolist()
+    }
+    if classification is False:
+        target_rescaler = preprocess.Rescaler().fit(target_matrix)
+        target_matrix = target_rescaler.transform(target_matrix, copy=False)
+        header['target_min'] = target_rescaler.min.tolist()
+        header['target_max'] = target_rescaler.max.tolist()
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    numpy.save(os.path.join(directory, INPUTS_FILENAME), input_matrix)
+    numpy.save(os.path.join(directory, TARGETS_FILENAME), target_matrix)
+    with open(os.path.join(directory, HEADER_FILENAME), 'w') as header_file:
+        json.dump(header, header_file)
+
+
+def load_data(directory, mmap_mode='r'):
+    """Return input and target matrices from a binary dataset directory.
+
+    Matrices are memory-mapped by default, so loading is near instant
+    and the operating system page cache is shared between processes
+    reading the same dataset.
+
+    Args:
+        directory: Directory written by convert_data.
+        mmap_mode: Memory-map mode given to numpy.load.
+            'r' for read-only, 'c' for copy-on-write,
+            or None to read the matrices into memory.
+    """
+    return (numpy.load(
+        os.path.join(directory, INPUTS_FILENAME), mmap_mode=mmap_mode),
+            numpy.load(
+                os.path.join(directory, TARGETS_FILENAME),
+                mmap_mode=mmap_mode))
+
+
+def load_header(directory):
+    """Return header dict of a binary dataset directory.
+
+    Contains 'classes', list of class names for each target column,
+    or None for regression, and 'input_min', 'input_max'
+    ('target_min', 'target_max' for regression) used for re-scaling.
+    """
+    with open(os.path.join(directory, HEADER_FILENAME)) as header_file:
+        return json.load(header_file)
+
+
+def get_data_chunks(file_name,
+                    attr_start_pos,
+                    attr_end_pos=-1,
+                    target_pos=-1,
+                    classification=True,
+                    classes=None,
+                    chunk_size=2**22):
+    """Yield (input_matrix, target_matrix) chunks of a text data file.
+
+    For files too large to fit in memory.
+    Unlike get_data, values are not re-scaled,
+    because scaling requires the min and max of the whole file.
+
+    Args:
+        file_name, attr_start_pos, attr_end_pos, target_pos, classification:
+            See get_data.
+        classes: Sorted list of class names, for classification.
+            If None, classes are determined by a quick pass over the file.
+        chunk_size: Approximate number of bytes read for each chunk.
+    """
+    if classification:
+        if classes is None:
+            classes = _read_classes(file_name, target_pos, chunk_size)
+        classes = numpy.array(classes)
+        num_classes = len(classes)
+    else:
+        num_classes = None
+
+    with open(file_name) as data_file:
+        while True:
+            lines = data_file.readlines(chunk_size)
+            if not lines:
+                break
+
+            tokens = _tokenize(''.join(lines))
+            if len(tokens) == 0:
+                continue
+
+            if classification:
+                class_indices = _class_indices(tokens[:, target_pos],
+                                               classes)
+            else:
+                class_indices = None
+            yield _parse_tokens(tokens, attr_start_pos, attr_end_pos,
+                                target_pos, class_indices, num_classes)
+
+
+def _read_data(file_name, attr_start_pos, attr_end_pos, target_pos,
+               classification):
+    """Return unscaled input matrix, target matrix, and list of classes."""
+    with open(file_name) as data_file:
+        text = data_file.read()
+
+    if not classification:
+        # Fast path, for files with only numbers
+        values, num_rows, num_columns = _join_lines(text)
+        matrix = numpy.fromstring(values, sep=',')
+        if matrix.size == num_rows * num_columns:
+            matrix = matrix.reshape(num_rows, num_columns)
+            return (matrix[:, attr_start_pos:attr_end_pos],
+                    matrix[:, target_pos][:, None], None)
+
+    tokens = _tokenize(text)
+    if classification:
+        # Sorted for easier validation
+        classes, class_indices = numpy.unique(
+            tokens[:, target_pos], return_inverse=True)
+        num_classes = len(classes)
+        classes = classes.tolist()
+    else:
+        classes = None
+        class_indices = None
+        num_classes = None
+
+    input_matrix, target_matrix = _parse_tokens(
+        tokens, attr_start_pos, attr_end_pos, target_pos, class_indices,
+        num_classes)
+    return input_matrix, target_matrix, classes
+
+
+def _read_classes(file_name, target_pos, chunk_size):
+    """Return sorted list of classes in a text data file."""
+    classes = set()
+    with open(file_name) as data_file:
+        while True:
+            lines = data_file.readlines(chunk_size)
+            if not lines:
+                break
+
+            tokens = _tokenize(''.join(lines))
+            if len(tokens) > 0:
+                classes.update(numpy.unique(tokens[:, target_pos]).tolist())
+    return sorted(classes)
+
+
+def _class_indices(class_tokens, classes):
+    """Return index in sorted classes array of each class token."""
+    class_indices = numpy.searchsorted(classes, class_tokens)
+    class_indices[class_indices == len(classes)] = 0
+    if not numpy.array_equal(classes[class_indices], class_tokens):
+        raise ValueError('Data contains classes not in given classes')
+    return class_indices
+
+
+def _parse_tokens(tokens, attr_start_pos, attr_end_pos, target_pos,
+                  class_indices, num_classes):
+    """Return input and target matrix from matrix of string tokens.
+
+    Rows with attributes that are not numbers (ex. '?') are skipped.
+    class_indices is None for regression.
+    """
+    attr_tokens = tokens[:, attr_start_pos:attr_end_pos]
+    try:
+        input_matrix = attr_tokens.astype('float64')
+        valid_rows = slice(None)
+    except ValueError:
+        # Slow path, only for files with missing values
+        valid_rows = numpy.array(
+            [_is_numeric(row) for row in attr_tokens], dtype=bool)
+        input_matrix = attr_tokens[valid_rows].astype('float64')
+
+    if class_indices is not None:
+        class_indices = class_indices[valid_rows]
+        # Class index is given a value of 1.0
+        target_matrix = numpy.zeros((len(class_indices), num_classes))
+        target_matrix[numpy.arange(len(class_indices)), class_indices] = 1.0
+    else:
+        target_matrix = tokens[valid_rows, target_pos].astype('float64')[:, None]
+
+    return input_matrix, target_matrix
+
+
+def _is_numeric(values):
+    try:
+        for value in values:
+            float(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _tokenize(text):
+    """Return matrix of string tokens, one row for each non-empty line.
+
+    Values are separated by commas or spaces.
+    """
+    values, num_rows, num_columns = _join_lines(text)
+    if num_rows == 0:
+        return numpy.empty((0, 0), dtype=str)
+    return numpy.array(values.split(',')).reshape(num_rows, num_columns)
+
+
+def _join_lines(text):
+    """Return comma separated values of all lines, and number of rows and columns."""
+    lines = [line.strip() for line in text.splitlines()]
+    lines = [line for line in lines if line]
+    if not lines:
+        return '', 0, 0
+
+    values = ','.join(lines)
+    if ' ' in values:
+        values = re.sub(r' +', ',', values)
+        num_columns = len(re.sub(r' +', ',', lines[0]).split(','))
+    else:
+        num_columns = lines[0].count(',') + 1
+
+    if values.count(',') + 1 != len(lines) * num_columns:
+        raise ValueError('Each line must have the same number of values')
+    return values, len(lines), num_columns
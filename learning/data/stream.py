@@ -0,0 +1,206 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Justin Lovinger
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+"""Datasets that are read in chunks, for data that does not fit in memory.
+
+Each dataset yields (input_matrix, target_matrix) chunks,
+and can be iterated any number of times.
+Use with Model.stochastic_train and validation.get_error.
+"""
+import os
+
+import numpy
+
+from learning.data import process
+
+SHARD_PREFIX = 'shard_'
+
+
+class ChunkedDataset(object):
+    """Dataset that yields (input_matrix, target_matrix) chunks.
+
+    Override chunks.
+    """
+
+    def chunks(self):
+        """Return iterator of (input_matrix, target_matrix) chunks."""
+        raise NotImplementedError()
+
+    def __iter__(self):
+        return iter(self.chunks())
+
+
+class GeneratorDataset(ChunkedDataset):
+    """Dataset of chunks from a generator function.
+
+    Args:
+        generator_func: Function returning an iterator of
+            (input_matrix, target_matrix) chunks.
+            Called once for each pass over the dataset.
+        *args, **kwargs: Args passed to generator_func.
+
+    Ex. GeneratorDataset(process.get_data_chunks, 'big.data', 0)
+    """
+
+    def __init__(self, generator_func, *args, **kwargs):
+        super(GeneratorDataset, self).__init__()
+
+        self._generator_func = generator_func
+        self._args = args
+        self._kwargs = kwargs
+
+    def chunks(self):
+        """Return iterator of (input_matrix, target_matrix) chunks."""
+        return self._generator_func(*self._args, **self._kwargs)
+
+
+class MemmapDataset(ChunkedDataset):
+    """Dataset of row chunks from a pair of (memory-mapped) matrices.
+
+    Only the rows of the current chunk are read from disk.
+
+    Args:
+        input_matrix: Matrix with samples in rows, ex. a numpy.memmap.
+        target_matrix: Matrix with samples in rows, ex. a numpy.memmap.
+        chunk_rows: Number of rows in each chunk.
+        shuffle: If True, chunks are given in a random order every pass.
+            Rows within a chunk keep their order, so reads stay sequential.
+        seed: Seed for the random state used to shuffle.
+    """
+
+    def __init__(self,
+                 input_matrix,
+                 target_matrix,
+                 chunk_rows=10000,
+                 shuffle=False,
+                 seed=None):
+        super(MemmapDataset, self).__init__()
+
+        if len(input_matrix) != len(target_matrix):
+            raise ValueError(
+                'input_matrix and target_matrix must have the same number of rows'
+            )
+
+        self._input_matrix = input_matrix
+        self._target_matrix = target_matrix
+        self._chunk_rows = chunk_rows
+        self._shuffle = shuffle
+        self._random_state = numpy.random.RandomState(seed)
+
+    @classmethod
+    def from_directory(cls, directory, **kwargs):
+        """Return dataset of a directory written by process.convert_data."""
+        return cls(*process.load_data(directory), **kwargs)
+
+    def chunks(self):
+        """Return iterator of (input_matrix, target_matrix) chunks."""
+        return _chunk_matrices(self._input_matrix, self._target_matrix,
+                               self._chunk_rows, self._shuffle,
+                               self._random_state)
+
+
+class ShardedDataset(ChunkedDataset):
+    """Dataset of a directory of shards, each written by process.convert_data or save_shards.
+
+    Shards are memory-mapped, and read in order of name.
+
+    Args:
+        directory: Directory containing shard directories.
+        chunk_rows: Number of rows in each chunk.
+            If None, each shard is a single chunk.
+        shuffle: If True, shards are given in a random order every pass.
+        seed: Seed for the random state used to shuffle.
+    """
+
+    def __init__(self, directory, chunk_rows=None, shuffle=False, seed=None):
+        super(ShardedDataset, self).__init__()
+
+        self._shard_directories = [
+            os.path.join(directory, name)
+            for name in sorted(os.listdir(directory))
+            if os.path.isfile(
+                os.path.join(directory, name, process.INPUTS_FILENAME))
+        ]
+        if self._shard_directories == []:
+            raise ValueError('No shards in %s' % directory)
+
+        self._chunk_rows = chunk_rows
+        self._shuffle = shuffle
+        self._random_state = numpy.random.RandomState(seed)
+
+    def chunks(self):
+        """Return iterator of (input_matrix, target_matrix) chunks."""
+        shard_directories = self._shard_directories
+        if self._shuffle:
+            shard_directories = [
+                shard_directories[i] for i in self._random_state.permutation(
+                    len(shard_directories))
+            ]
+
+        for shard_directory in shard_directories:
+            input_matrix, target_matrix = process.load_data(shard_directory)
+            if self._chunk_rows is None:
+                yield input_matrix, target_matrix
+            else:
+                for chunk in _chunk_matrices(input_matrix, target_matrix,
+                                             self._chunk_rows):
+                    yield chunk
+
+
+def save_shards(chunks, directory):
+    """Save (input_matrix, target_matrix) chunks as shards, for ShardedDataset.
+
+    Args:
+        chunks: Iterable of (input_matrix, target_matrix) chunks,
+            ex. a ChunkedDataset, or process.get_data_chunks.
+        directory: Directory to write shards to. Created if missing.
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    for i, (input_matrix, target_matrix) in enumerate(chunks):
+        shard_directory = os.path.join(directory,
+                                       '{}{:05d}'.format(SHARD_PREFIX, i))
+        if not os.path.isdir(shard_directory):
+            os.makedirs(shard_directory)
+        numpy.save(
+            os.path.join(shard_directory, process.INPUTS_FILENAME),
+            input_matrix)
+        numpy.save(
+            os.path.join(shard_directory, process.TARGETS_FILENAME),
+            target_matrix)
+
+
+def _chunk_matrices(input_matrix,
+                    target_matrix,
+                    chunk_rows,
+                    shuffle=False,
+                    random_state=None):
+    """Yield (input_matrix, target_matrix) chunks of chunk_rows rows."""
+    starts = numpy.arange(0, len(input_matrix), chunk_rows)
+    if shuffle:
+        random_state.shuffle(starts)
+
+    for start in starts:
+        yield (input_matrix[start:start + chunk_rows],
+               target_matrix[start:start + chunk_rows])
@@ -23,6 +23,7 @@
 ###############################################################################
 """Error functions for use with some models."""
 
+import math
 import operator
 
 import numpy
@@ -42,6 +43,17 @@ class ErrorFunc(object):
         """Return (error, derivative tensor)."""
         raise NotImplementedError()
 
+    def residuals(self, tensor_a, tensor_b):
+        """Return (residual vector, scale), where error = residuals^T residuals.
+
+        Optional. Only for sum of squares errors.
+        scale is the derivative of each residual,
+        with regard to the corresponding element of tensor_a.
+        """
+        raise NotImplementedError(
+            'residuals are only defined for sum of squares errors, '
+            'such as MeanSquaredError')
+
 
 class MeanSquaredError(ErrorFunc):
     """Mean squared error (MSE), defined by mean((tensor_a - tensor_b)^2)."""
@@ -63,6 +75,12 @@ class MeanSquaredError(ErrorFunc):
 
         return mse, error_tensor
 
+    def residuals(self, tensor_a, tensor_b):
+        """Return (residual vector, scale), where error = residuals^T residuals."""
+        # mean(x^2) = sum((x / sqrt(n))^2)
+        scale = 1.0 / math.sqrt(reduce(operator.mul, numpy.shape(tensor_a)))
+        return numpy.subtract(tensor_a, tensor_b).ravel() * scale, scale
+
 
 class CrossEntropyError(ErrorFunc):
     """Cross entropy error, defined by -mean(log(tensor_a) * tensor_b).
@@ -33,8 +33,10 @@ from learning.optimize.initialstep import (IncrPrevStep, FOChangeInitialStep,
 
 # Step size strategies (line search)
 from learning.optimize.linesearch import (SetStepSize, BacktrackingLineSearch,
-                                          WolfeLineSearch)
+                                          WolfeLineSearch,
+                                          NonmonotoneLineSearch)
 
 # Optimizers
 from learning.optimize.optimizer import (make_optimizer, SteepestDescent,
-                                         SteepestDescentMomentum, BFGS, LBFGS)
+                                         SteepestDescentMomentum, BFGS, LBFGS,
+                                         ConjugateGradient, LevenbergMarquardt)
@@ -169,6 +169,12 @@ class FOChangeInitialStep(InitialStepGetter):
                             'objective value may have increased or step direction is negative.')
             initial_step = 1.0
 
+        if initial_step == 0:
+            # Previous iteration had no first order change,
+            # such as when a previous problem was solved
+            logging.warning('0 initial step in FOChangeInitialStep call, defaulting to 1')
+            initial_step = 1.0
+
         if numpy.isinf(initial_step):
             logging.warning('inf step size, in FOChangeInitialStep call, '\
                             'returning 1.79769313e+308')
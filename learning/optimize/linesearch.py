@@ -25,6 +25,7 @@
 
 import logging
 import itertools
+import collections
 
 import numpy
 
@@ -38,12 +39,23 @@ class StepSizeGetter(object):
     """Returns step size when called.
 
     Used by Optimizer.
+
+    Step size getters that evaluate the objective take a max_evaluations
+    argument, limiting the number of evaluations in a single call.
+    When the budget is exhausted, the best step size found so far is returned.
     """
 
     def reset(self):
         """Reset parameters."""
         pass
 
+    def problem_changed(self):
+        """Prepare for a changed problem, such as a new mini-batch.
+
+        Unlike reset, initial step size memory is kept.
+        """
+        pass
+
     def __call__(self, xk, obj_xk, jac_xk, step_dir, problem):
         """Return step size.
 
@@ -85,11 +97,16 @@ class SetStepSize(StepSizeGetter):
 class BacktrackingLineSearch(StepSizeGetter):
     """Return step size found with backtracking line search."""
 
-    def __init__(self, c_1=0.5, decr_rate=0.5, initial_step_getter=None):
+    def __init__(self,
+                 c_1=0.5,
+                 decr_rate=0.5,
+                 initial_step_getter=None,
+                 max_evaluations=None):
         super(BacktrackingLineSearch, self).__init__()
 
         self._c_1 = c_1
         self._decr_rate = decr_rate
+        self._max_evaluations = _validate_max_evaluations(max_evaluations)
 
         if initial_step_getter is None:
             # Slightly more than 1 step up
@@ -124,7 +141,8 @@ class BacktrackingLineSearch(StepSizeGetter):
             problem.get_obj,
             self._c_1,
             initial_step,
-            decr_rate=self._decr_rate)
+            decr_rate=self._decr_rate,
+            max_evaluations=self._max_evaluations)
 
         self._initial_step_getter.update(step_size)
 
@@ -134,7 +152,11 @@ class BacktrackingLineSearch(StepSizeGetter):
 class WolfeLineSearch(StepSizeGetter):
     """Specialized algorithm for finding step size that satisfies strong wolfe conditions."""
 
-    def __init__(self, c_1=1e-4, c_2=0.9, initial_step_getter=None):
+    def __init__(self,
+                 c_1=1e-4,
+                 c_2=0.9,
+                 initial_step_getter=None,
+                 max_evaluations=100):
         super(WolfeLineSearch, self).__init__()
 
         # "In practice, c_1 is chosen to be quite small, say c_1 = 10^-4"
@@ -151,6 +173,8 @@ class WolfeLineSearch(StepSizeGetter):
             initial_step_getter = QuadraticInitialStep()
         self._initial_step_getter = initial_step_getter
 
+        self._max_evaluations = _validate_max_evaluations(max_evaluations)
+
     def reset(self):
         """Reset parameters."""
         super(WolfeLineSearch, self).reset()
@@ -168,14 +192,187 @@ class WolfeLineSearch(StepSizeGetter):
         initial_step = self._initial_step_getter(xk, obj_xk, jac_xk, step_dir,
                                                  problem)
 
-        step_size = _line_search_wolfe(xk, obj_xk, jac_xk, step_dir,
-                                       problem.get_obj_jac, self._c_1,
-                                       self._c_2, initial_step)
+        step_size = _line_search_wolfe(
+            xk,
+            obj_xk,
+            jac_xk,
+            step_dir,
+            problem.get_obj_jac,
+            self._c_1,
+            self._c_2,
+            initial_step,
+            max_evaluations=self._max_evaluations)
 
         self._initial_step_getter.update(step_size)
         return step_size
 
 
+class NonmonotoneLineSearch(StepSizeGetter):
+    """Backtracking line search that allows the objective to increase temporarily.
+
+    The Armijo rule is checked against a reference value,
+    instead of the current objective value:
+    f(x_k + a_k p_k) <= C_k + c_1 a_k p_k^T grad_f(x_k)
+
+    With reference='max', C_k is the largest of the last memory objective values
+    (Grippo, Lampariello, and Lucidi 1986).
+    With reference='average', C_k is a weighted average of all objective values,
+    C_{k+1} = (eta Q_k C_k + f(x_{k+1})) / Q_{k+1}, Q_{k+1} = eta Q_k + 1
+    (Zhang and Hager 2004).
+
+    Accepting larger steps than a monotone search can speed up optimizers
+    that work well with long steps, such as steepest descent
+    on narrow valleys.
+    """
+
+    def __init__(self,
+                 c_1=1e-4,
+                 decr_rate=0.5,
+                 reference='max',
+                 memory=10,
+                 eta=0.85,
+                 initial_step_getter=None,
+                 max_evaluations=None):
+        super(NonmonotoneLineSearch, self).__init__()
+
+        if reference not in ('max', 'average'):
+            raise ValueError("reference must be 'max' or 'average'")
+        if memory < 1:
+            raise ValueError('memory must be >= 1')
+        if not (0.0 <= eta <= 1.0):
+            raise ValueError('0 <= eta <= 1')
+
+        self._c_1 = c_1
+        self._decr_rate = decr_rate
+        self._reference = reference
+        self._eta = eta
+        self._max_evaluations = _validate_max_evaluations(max_evaluations)
+
+        if initial_step_getter is None:
+            # Slightly more than 1 step up
+            initial_step_getter = IncrPrevStep(
+                incr_rate=2.0 / self._decr_rate - 1.0,
+                lower_bound=0.0,
+                upper_bound=None)
+        self._initial_step_getter = initial_step_getter
+
+        # Objective values of recent iterations, for reference='max'
+        self._prev_objs = collections.deque(maxlen=memory)
+
+        # Weighted average, and weight, for reference='average'
+        self._average_obj = None
+        self._average_weight = None
+
+    def reset(self):
+        """Reset parameters."""
+        super(NonmonotoneLineSearch, self).reset()
+        self._initial_step_getter.reset()
+        self._clear_reference()
+
+    def problem_changed(self):
+        """Prepare for a changed problem, such as a new mini-batch.
+
+        Objective values of the previous problem are not comparable,
+        so the reference value is cleared.
+        """
+        super(NonmonotoneLineSearch, self).problem_changed()
+        self._clear_reference()
+
+    def _clear_reference(self):
+        """Forget objective values of previous iterations."""
+        self._prev_objs.clear()
+        self._average_obj = None
+        self._average_weight = None
+
+    def __call__(self, xk, obj_xk, jac_xk, step_dir, problem):
+        """Return step size.
+
+        xk: x_k; Parameter values at current step.
+        obj_xk: f(x_k); Objective value at x_k.
+        jac_xk: grad_f(x_k); First derivative (jacobian) at x_k.
+        step_dir: p_k; Step direction (ex. jacobian in steepest descent) at x_k.
+        problem: Problem; Problem instance passed to Optimizer
+        """
+        initial_step = self._initial_step_getter(xk, obj_xk, jac_xk, step_dir,
+                                                 problem)
+
+        step_size = _backtracking_line_search(
+            xk,
+            obj_xk,
+            jac_xk,
+            step_dir,
+            problem.get_obj,
+            self._c_1,
+            initial_step,
+            decr_rate=self._decr_rate,
+            max_evaluations=self._max_evaluations,
+            reference_obj=self._get_reference_obj(obj_xk))
+
+        self._initial_step_getter.update(step_size)
+
+        return step_size
+
+    def _get_reference_obj(self, obj_xk):
+        """Add objective value of this iteration, and return reference value."""
+        if self._reference == 'max':
+            self._prev_objs.append(obj_xk)
+            return max(self._prev_objs)
+
+        # Average
+        if self._average_obj is None:
+            self._average_obj = obj_xk
+            self._average_weight = 1.0
+        else:
+            prev_weight = self._eta * self._average_weight
+            self._average_weight = prev_weight + 1.0
+            self._average_obj = (prev_weight * self._average_obj + obj_xk
+                                 ) / self._average_weight
+        return self._average_obj
+
+
+def _validate_max_evaluations(max_evaluations):
+    """Return max_evaluations, or raise ValueError if it is not None or >= 1."""
+    if max_evaluations is not None and max_evaluations < 1:
+        raise ValueError('max_evaluations must be None or >= 1')
+    return max_evaluations
+
+
+class _EvaluationBudget(object):
+    """Count objective evaluations in a line search, remembering the best step size.
+
+    Args:
+        obj_xk: f(x_k); Objective value at x_k (step size 0).
+        max_evaluations: Maximum number of evaluations, or None for no limit.
+    """
+
+    def __init__(self, obj_xk, max_evaluations):
+        self._obj_xk = obj_xk
+        self._max_evaluations = max_evaluations
+
+        self.evaluations = 0
+        self._best_step_size = None
+        self._best_obj = None
+
+    def exhausted(self):
+        """Return True if no more evaluations are allowed."""
+        return (self._max_evaluations is not None
+                and self.evaluations >= self._max_evaluations)
+
+    def add(self, step_size, step_obj):
+        """Count evaluation of objective at step size."""
+        self.evaluations += 1
+        if (step_obj < self._obj_xk
+                and (self._best_obj is None or step_obj < self._best_obj)):
+            self._best_step_size = step_size
+            self._best_obj = step_obj
+
+    def fallback(self, step_size):
+        """Return step size with lowest objective value, or step_size if none improved."""
+        if self._best_step_size is None:
+            return step_size
+        return self._best_step_size
+
+
 def _backtracking_line_search(parameters,
                               obj_xk,
                               jac_xk,
@@ -183,7 +380,9 @@ def _backtracking_line_search(parameters,
                               obj_func,
                               c_1,
                               initial_step,
-                              decr_rate=0.9):
+                              decr_rate=0.9,
+                              max_evaluations=None,
+                              reference_obj=None):
     """Return step size that satisfies the armijo rule.
 
     Discover step size by decreasing step size in small increments.
@@ -195,6 +394,12 @@ def _backtracking_line_search(parameters,
         step_dir: p_k; Step direction (ex. jacobian in steepest descent) at x_k.
         obj_func: Function taking parameters and returning obj value at given parameters.
         c_1: Strictness parameter for Armijo rule.
+        max_evaluations: Maximum number of obj_func calls, or None for no limit.
+            When exceeded, the step size with lowest objective value is returned,
+            or the next (smaller) trial step size if none improved.
+        reference_obj: Objective value that the Armijo rule compares to,
+            for nonmonotone line search. Defaults to obj_xk.
+            Fallback steps must still improve on obj_xk.
     """
     if numpy.isnan(obj_xk):
         # Failsafe because _armijo_rule will never return True
@@ -203,8 +408,12 @@ def _backtracking_line_search(parameters,
         )
         return 1e-25
 
+    if reference_obj is None:
+        reference_obj = obj_xk
+    budget = _EvaluationBudget(obj_xk, max_evaluations)
+
     step_size = initial_step
-    for i in itertools.count(start=1):
+    while True:
         if step_size < 1e-25:
             # Failsafe for numerical precision errors preventing _armijo_rule returning True
             # This can happen if gradient provides very little improvement
@@ -214,9 +423,16 @@ def _backtracking_line_search(parameters,
             )
             return step_size
 
+        if budget.exhausted():
+            logging.warning(
+                '_backtracking_line_search aborting after %d evaluations',
+                budget.evaluations)
+            return budget.fallback(step_size)
+
         obj_xk_plus_ap = obj_func(parameters + step_size * step_dir)
-        if _armijo_rule(step_size, obj_xk, jac_xk, step_dir, obj_xk_plus_ap,
-                        c_1):
+        budget.add(step_size, obj_xk_plus_ap)
+        if _armijo_rule(step_size, reference_obj, jac_xk, step_dir,
+                        obj_xk_plus_ap, c_1):
             assert step_size > 0
             return step_size
 
@@ -227,8 +443,15 @@ def _backtracking_line_search(parameters,
 WOLFE_INCR_RATE = 1.5
 
 
-def _line_search_wolfe(parameters, obj_xk, jac_xk, step_dir, obj_jac_func, c_1,
-                       c_2, initial_step):
+def _line_search_wolfe(parameters,
+                       obj_xk,
+                       jac_xk,
+                       step_dir,
+                       obj_jac_func,
+                       c_1,
+                       c_2,
+                       initial_step,
+                       max_evaluations=100):
     """Return step size that satisfies wolfe conditions.
 
     See Numerical Optimization (2nd) pp. 60
@@ -246,6 +469,10 @@ def _line_search_wolfe(parameters, obj_xk, jac_xk, step_dir, obj_jac_func, c_1,
         obj_jac_func: Function taking parameters and returning obj and jac at given parameters.
         c_1: Strictness parameter for Armijo rule.
         c_2: Strictness parameter for curvature condition.
+        max_evaluations: Maximum number of obj_jac_func calls, or None for no limit.
+            Shared by the bracketing and zoom phases.
+            When exceeded, the step size with lowest objective value is returned,
+            or the next trial step size if none improved.
     """
     if numpy.isnan(obj_xk):
         # Failsafe for erroneously calculated obj_xk (usually overflow or x/0)
@@ -262,18 +489,22 @@ def _line_search_wolfe(parameters, obj_xk, jac_xk, step_dir, obj_jac_func, c_1,
     prev_step_size = 0.0
     prev_step_obj = step_zero_obj
 
+    budget = _EvaluationBudget(obj_xk, max_evaluations)
+
     step_size = initial_step
     for i in itertools.count(start=1):
-        if i >= 100:
+        if budget.exhausted():
             # Failsafe for numerical precision errors preventing convergence
             # This can happen if gradient provides very little improvement
             # (or is in the wrong direction)
-            logging.warning('Wolfe line search aborting after 100 iterations')
-            return step_size
+            logging.warning('Wolfe line search aborting after %d evaluations',
+                            budget.evaluations)
+            return budget.fallback(step_size)
 
         # Evaluate objective and jacobian for most recent step size
         step_obj, step_grad = _step_size_obj_jac_func(step_size, parameters,
                                                       step_dir, obj_jac_func)
+        budget.add(step_size, step_obj)
 
         # True if objective did not improve (step_obj >= prev_step_obj), after first iterations,
         # or armijo condition is False (step_obj > obj_xk + c_1*step_size*step_grad)
@@ -281,7 +512,7 @@ def _line_search_wolfe(parameters, obj_xk, jac_xk, step_dir, obj_jac_func, c_1,
                 or (step_obj > obj_xk + c_1 * step_size * step_grad)):
             return _zoom_wolfe(prev_step_size, prev_step_obj, step_size,
                                parameters, obj_xk, step_zero_grad, step_dir,
-                               obj_jac_func, c_1, c_2)
+                               obj_jac_func, c_1, c_2, budget)
 
         # Check if step size is already an acceptable step length
         # True when gradient is sufficiently small (magnitude wise)
@@ -293,7 +524,7 @@ def _line_search_wolfe(parameters, obj_xk, jac_xk, step_dir, obj_jac_func, c_1,
         elif step_grad >= 0:
             return _zoom_wolfe(step_size, step_obj, prev_step_size, parameters,
                                obj_xk, step_zero_grad, step_dir, obj_jac_func,
-                               c_1, c_2)
+                               c_1, c_2, budget)
 
         # Increase step size, score current values for comparison to previous
         prev_step_size = step_size
@@ -319,18 +550,19 @@ def _line_search_wolfe(parameters, obj_xk, jac_xk, step_dir, obj_jac_func, c_1,
 
 def _zoom_wolfe(step_size_low, step_size_low_obj, step_size_high, parameters,
                 step_zero_obj, step_zero_grad, step_dir, obj_jac_func, c_1,
-                c_2):
+                c_2, budget):
     """Zoom into acceptable step size within a given interval.
 
     Args:
         step_size_low: Step size with low objective value (good)
         step_size_high: Step size with high objective value (high)
+        budget: _EvaluationBudget; Evaluations remaining from _line_search_wolfe.
     """
     # NOTE: lower objective values are better
     # (hence step_size_low better than step_size_high)
     # TODO: Optimize by caching values repeatedly used in inequalities
 
-    for i in itertools.count(start=1):
+    while True:
         # Choose step size
         # NOTE: step_size should not be too close to low or high
         # TODO: Test other strategies (see Interpolation subsection of NumOpt)
@@ -343,16 +575,18 @@ def _zoom_wolfe(step_size_low, step_size_low_obj, step_size_high, parameters,
             max(step_size_low, step_size_high))
         assert step_size >= 0
 
-        if i >= 100:
+        if budget.exhausted():
             # Failsafe for numerical precision errors preventing convergence
             # This can happen if gradient provides very little improvement
             # (or is in the wrong direction)
             logging.warning(
-                'Wolfe line search (zoom) aborting after 100 iterations')
-            return step_size
+                'Wolfe line search (zoom) aborting after %d evaluations',
+                budget.evaluations)
+            return budget.fallback(step_size)
 
         step_obj, step_grad = _step_size_obj_jac_func(step_size, parameters,
                                                       step_dir, obj_jac_func)
+        budget.add(step_size, step_obj)
 
         # If this step is worse, than the projection from initial parameters
         # (a.k.a. Armijo condition if False)
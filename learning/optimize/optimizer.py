@@ -27,20 +27,39 @@ import logging
 
 import numpy
 
+from learning import chunking, profile
 from learning.optimize import WolfeLineSearch, FOChangeInitialStep
 
 
-def make_optimizer(num_parameters):
-    """Return a new optimizer, using simple heuristics."""
+def make_optimizer(num_parameters, memory_budget=None):
+    """Return a new optimizer, using simple heuristics.
+
+    Args:
+        num_parameters: Number of parameters to optimize.
+        memory_budget: Optional. Maximum bytes of optimizer state.
+            If BFGS or L-BFGS state does not fit,
+            conjugate gradient, with only a few vectors of state, is used.
+    """
     # TODO: More heuristics
+    if memory_budget is not None and memory_budget <= 0:
+        raise ValueError('memory_budget must be > 0')
+
+    def fits(num_values):
+        return (memory_budget is None
+                or num_values * chunking.FLOAT_BYTES <= memory_budget)
 
     # If there are too many parameters, use an optimizer that doesn't use hessian matrix
-    if num_parameters > 500:  # NOTE: Cutoff value could use more testing
+    # NOTE: Cutoff value could use more testing
+    if num_parameters <= 500 and fits(
+            BFGS.state_values(num_parameters)):
+        # Few enough weights, use hessian matrix
+        return BFGS()
+    elif fits(LBFGS.state_values(num_parameters)):
         # Too many weights, don't use hessian matrix
         return LBFGS()
     else:
-        # Few enough weights, use hessian matrix
-        return BFGS()
+        # Too many weights for even a few remembered iterations
+        return ConjugateGradient()
 
 
 ################################
@@ -58,6 +77,15 @@ class Optimizer(object):
         self.jacobian = None
         self.hessian = None
 
+    def problem_changed(self):
+        """Prepare for a changed problem, such as a new mini-batch.
+
+        Unlike reset, learned state, such as approximate curvature,
+        and initial step size memory, is kept.
+        """
+        self.jacobian = None
+        self.hessian = None
+
     def next(self, problem, parameters):
         """Return next iteration of this optimizer."""
         raise NotImplementedError()
@@ -86,12 +114,18 @@ class SteepestDescent(Optimizer):
         super(SteepestDescent, self).__init__()
         self._step_size_getter.reset()
 
+    def problem_changed(self):
+        """Prepare for a changed problem, such as a new mini-batch."""
+        super(SteepestDescent, self).problem_changed()
+        self._step_size_getter.problem_changed()
+
     def next(self, problem, parameters):
         """Return next iteration of this optimizer."""
         obj_value, self.jacobian = problem.get_obj_jac(parameters)
 
-        step_size = self._step_size_getter(
-            parameters, obj_value, self.jacobian, -self.jacobian, problem)
+        with profile.phase(profile.LINE_SEARCH):
+            step_size = self._step_size_getter(
+                parameters, obj_value, self.jacobian, -self.jacobian, problem)
 
         # Take a step down the first derivative direction
         return obj_value, parameters - step_size * self.jacobian
@@ -118,6 +152,14 @@ class SteepestDescentMomentum(Optimizer):
         self._step_size_getter.reset()
         self._prev_step = None
 
+    def problem_changed(self):
+        """Prepare for a changed problem, such as a new mini-batch.
+
+        Previous step is kept for momentum.
+        """
+        super(SteepestDescentMomentum, self).problem_changed()
+        self._step_size_getter.problem_changed()
+
     def next(self, problem, parameters):
         """Return next iteration of this optimizer."""
         obj_value, self.jacobian = problem.get_obj_jac(parameters)
@@ -131,8 +173,9 @@ class SteepestDescentMomentum(Optimizer):
         # However, this may negate the primary purpose of momentum
         # (to prevent convergence to small local optima)
         step_dir = -self.jacobian
-        step_size = self._step_size_getter(parameters, obj_value,
-                                           self.jacobian, step_dir, problem)
+        with profile.phase(profile.LINE_SEARCH):
+            step_size = self._step_size_getter(
+                parameters, obj_value, self.jacobian, step_dir, problem)
         step = step_size * step_dir
 
         # Add steps from this and previous iteration
@@ -220,6 +263,17 @@ class BFGS(Optimizer):
         self._prev_jacobian = None
         self._prev_inv_hessian = None
 
+        # True if _prev_jacobian is from a previous problem
+        self._problem_changed = False
+
+    @staticmethod
+    def state_values(num_parameters):
+        """Return approximate number of float values stored while optimizing.
+
+        Approximate inverse hessian, and temporary matrices of the same size.
+        """
+        return 3 * num_parameters**2
+
     def reset(self):
         """Reset optimizer parameters."""
         super(BFGS, self).reset()
@@ -231,20 +285,40 @@ class BFGS(Optimizer):
         self._prev_jacobian = None
         self._prev_inv_hessian = None
 
+        self._problem_changed = False
+
+    def problem_changed(self):
+        """Prepare for a changed problem, such as a new mini-batch.
+
+        Approximate inverse hessian is kept.
+        The previous jacobian is recomputed on the new problem,
+        so the next curvature pair is consistent.
+        """
+        super(BFGS, self).problem_changed()
+        self._step_size_getter.problem_changed()
+        self._problem_changed = True
+
     def next(self, problem, parameters):
         """Return next iteration of this optimizer."""
         self._iteration += 1
         if self._iteration == self._iterations_per_reset:
             self.reset()
 
+        if self._problem_changed:
+            self._prev_jacobian = _get_prev_jacobian(problem, parameters,
+                                                     self._prev_step)
+            self._problem_changed = False
+
         obj_value, self.jacobian = problem.get_obj_jac(parameters)
 
-        approx_inv_hessian = self._get_approx_inv_hessian(self.jacobian)
+        with profile.phase(profile.DIRECTION):
+            approx_inv_hessian = self._get_approx_inv_hessian(self.jacobian)
 
-        step_dir = -(approx_inv_hessian.dot(self.jacobian))
+            step_dir = -(approx_inv_hessian.dot(self.jacobian))
 
-        step_size = self._step_size_getter(parameters, obj_value,
-                                           self.jacobian, step_dir, problem)
+        with profile.phase(profile.LINE_SEARCH):
+            step_size = self._step_size_getter(
+                parameters, obj_value, self.jacobian, step_dir, problem)
 
         # Store this step as parameter diff
         # parameters - prev_parameters = prev_step
@@ -285,6 +359,13 @@ class BFGS(Optimizer):
         return H_kp1
 
 
+def _get_prev_jacobian(problem, parameters, prev_step):
+    """Return jacobian of problem at previous parameters, or None if no previous step."""
+    if prev_step is None:
+        return None
+    return problem.get_jac(parameters - prev_step)
+
+
 def _bfgs_eq(H_k, s_k, y_k):
     """Apply the bfgs update rule to obtain the next approx inverse hessian.
 
@@ -399,6 +480,18 @@ class LBFGS(Optimizer):
         self._prev_param_diffs = []  # Previous s_k values
         self._prev_jac_diffs = []  # Previous y_k values
 
+        # True if _prev_jacobian is from a previous problem
+        self._problem_changed = False
+
+    @staticmethod
+    def state_values(num_parameters, num_remembered_iterations=5):
+        """Return approximate number of float values stored while optimizing.
+
+        Parameter and jacobian differences for each remembered iteration,
+        and a few other vectors.
+        """
+        return (2 * num_remembered_iterations + 4) * num_parameters
+
     def reset(self):
         """Reset optimizer parameters."""
         super(LBFGS, self).reset()
@@ -411,18 +504,38 @@ class LBFGS(Optimizer):
         self._prev_param_diffs = []  # Previous s_k values
         self._prev_jac_diffs = []  # Previous y_k values
 
+        self._problem_changed = False
+
+    def problem_changed(self):
+        """Prepare for a changed problem, such as a new mini-batch.
+
+        Remembered parameter and jacobian differences are kept.
+        The previous jacobian is recomputed on the new problem,
+        so the next jacobian difference is consistent.
+        """
+        super(LBFGS, self).problem_changed()
+        self._step_size_getter.problem_changed()
+        self._problem_changed = True
+
     def next(self, problem, parameters):
         """Return next iteration of this optimizer."""
+        if self._problem_changed:
+            self._prev_jacobian = _get_prev_jacobian(problem, parameters,
+                                                     self._prev_step)
+            self._problem_changed = False
+
         obj_value, self.jacobian = problem.get_obj_jac(parameters)
 
-        # Add param and jac diffs for this iteration
-        self._update_diffs(self.jacobian)
+        with profile.phase(profile.DIRECTION):
+            # Add param and jac diffs for this iteration
+            self._update_diffs(self.jacobian)
 
-        # Approximate step direction, and update parameters
-        step_dir = self._lbfgs_step_dir(self.jacobian)
+            # Approximate step direction, and update parameters
+            step_dir = self._lbfgs_step_dir(self.jacobian)
 
-        step_size = self._step_size_getter(parameters, obj_value,
-                                           self.jacobian, step_dir, problem)
+        with profile.phase(profile.LINE_SEARCH):
+            step_size = self._step_size_getter(
+                parameters, obj_value, self.jacobian, step_dir, problem)
 
         # Store this step as parameter diff
         # parameters - prev_parameters = prev_step
@@ -506,3 +619,265 @@ class LBFGS(Optimizer):
         else:
             return self._initial_hessian_scalar_func(self._prev_param_diffs[0],
                                                      self._prev_jac_diffs[0])
+
+
+def beta_polak_ribiere_plus(jacobian, prev_jacobian, prev_step_dir):
+    """Return Polak-Ribiere+ beta, for conjugate gradient.
+
+    beta = max(0, (jac_k^T (jac_k - jac_{k-1})) / (jac_{k-1}^T jac_{k-1}))
+    Ref: Numerical Optimization pp. 122
+    """
+    prev_jac_dot_prev_jac = prev_jacobian.dot(prev_jacobian)
+    if prev_jac_dot_prev_jac == 0:
+        return 0.0
+    return max(0.0,
+               jacobian.dot(jacobian - prev_jacobian) / prev_jac_dot_prev_jac)
+
+
+def beta_hestenes_stiefel(jacobian, prev_jacobian, prev_step_dir):
+    """Return Hestenes-Stiefel beta, for conjugate gradient.
+
+    beta = (jac_k^T y_k) / (y_k^T p_{k-1}),
+    where
+    y_k = jac_k - jac_{k-1}
+    p_{k-1} = previous step direction
+    Ref: Numerical Optimization pp. 123
+    """
+    jac_diff = jacobian - prev_jacobian
+    jac_diff_dot_dir = jac_diff.dot(prev_step_dir)
+    if jac_diff_dot_dir == 0:
+        return 0.0
+    return jacobian.dot(jac_diff) / jac_diff_dot_dir
+
+
+class ConjugateGradient(Optimizer):
+    """Nonlinear conjugate gradient optimizer.
+
+    Ref: Numerical Optimization pp. 121
+
+    Only a few vectors are stored,
+    so memory use is linear in number of parameters.
+
+    Args:
+        step_size_getter: Step size strategy.
+            Defaults to WolfeLineSearch, with c_2 = 0.1,
+            as recommended for conjugate gradient.
+        beta_func: Function taking (jacobian, prev_jacobian, prev_step_dir),
+            and returning beta, the weight of the previous step direction.
+            Ex. beta_polak_ribiere_plus or beta_hestenes_stiefel.
+        restart_threshold: Restart with steepest descent when
+            |jac_k^T jac_{k-1}| / (jac_k^T jac_k) >= restart_threshold,
+            because consecutive jacobians are far from orthogonal,
+            and conjugacy is lost (Numerical Optimization pp. 125).
+        iterations_per_restart: Restart with steepest descent every
+            iterations_per_restart iterations.
+            Defaults to number of parameters.
+    """
+
+    def __init__(self,
+                 step_size_getter=None,
+                 beta_func=beta_polak_ribiere_plus,
+                 restart_threshold=0.1,
+                 iterations_per_restart=None):
+        super(ConjugateGradient, self).__init__()
+
+        if step_size_getter is None:
+            step_size_getter = WolfeLineSearch(
+                # Values recommended by Numerical Optimization 2nd, pp. 34
+                c_1=1e-4,
+                c_2=0.1,
+                initial_step_getter=FOChangeInitialStep())
+        self._step_size_getter = step_size_getter
+
+        self._beta_func = beta_func
+        self._restart_threshold = restart_threshold
+        self._iterations_per_restart = iterations_per_restart
+
+        # Conjugate gradient parameters
+        self._iterations_since_restart = 0
+        self._prev_jacobian = None
+        self._prev_step_dir = None
+
+    @staticmethod
+    def state_values(num_parameters):
+        """Return approximate number of float values stored while optimizing.
+
+        Current and previous jacobian and step direction.
+        """
+        return 4 * num_parameters
+
+    def reset(self):
+        """Reset optimizer parameters."""
+        super(ConjugateGradient, self).reset()
+        self._step_size_getter.reset()
+
+        # Reset conjugate gradient parameters
+        self._iterations_since_restart = 0
+        self._prev_jacobian = None
+        self._prev_step_dir = None
+
+    def problem_changed(self):
+        """Prepare for a changed problem, such as a new mini-batch.
+
+        Previous directions are not conjugate on a new problem,
+        so the next iteration restarts with steepest descent.
+        Step size memory is kept.
+        """
+        super(ConjugateGradient, self).problem_changed()
+        self._step_size_getter.problem_changed()
+        self._prev_jacobian = None
+        self._prev_step_dir = None
+
+    def next(self, problem, parameters):
+        """Return next iteration of this optimizer."""
+        obj_value, self.jacobian = problem.get_obj_jac(parameters)
+
+        with profile.phase(profile.DIRECTION):
+            step_dir = self._get_step_dir(self.jacobian)
+
+        with profile.phase(profile.LINE_SEARCH):
+            step_size = self._step_size_getter(
+                parameters, obj_value, self.jacobian, step_dir, problem)
+
+        # Save values from current iteration for next iteration
+        self._prev_jacobian = self.jacobian
+        self._prev_step_dir = step_dir
+
+        return obj_value, parameters + step_size * step_dir
+
+    def _get_step_dir(self, jacobian):
+        """Return conjugate step direction, or steepest descent on restart."""
+        iterations_per_restart = self._iterations_per_restart
+        if iterations_per_restart is None:
+            iterations_per_restart = jacobian.shape[0]
+
+        if (self._prev_jacobian is None
+                or self._iterations_since_restart >= iterations_per_restart
+                or self._lost_conjugacy(jacobian)):
+            return self._restart(jacobian)
+
+        beta = self._beta_func(jacobian, self._prev_jacobian,
+                               self._prev_step_dir)
+        step_dir = -jacobian + beta * self._prev_step_dir
+
+        # Conjugate direction may not be a descent direction,
+        # such as with Hestenes-Stiefel beta < 0
+        if jacobian.dot(step_dir) >= 0:
+            return self._restart(jacobian)
+
+        self._iterations_since_restart += 1
+        return step_dir
+
+    def _lost_conjugacy(self, jacobian):
+        """Return True if consecutive jacobians are far from orthogonal."""
+        jac_dot_jac = jacobian.dot(jacobian)
+        return (jac_dot_jac == 0 or abs(jacobian.dot(self._prev_jacobian)) /
+                jac_dot_jac >= self._restart_threshold)
+
+    def _restart(self, jacobian):
+        """Return steepest descent direction, and restart conjugacy."""
+        self._iterations_since_restart = 1
+        return -jacobian
+
+
+class LevenbergMarquardt(Optimizer):
+    """Levenberg-Marquardt optimizer, for sum of squares problems.
+
+    Ref: Numerical Optimization pp. 258
+    Damping update from Nielsen (1999), "Damping Parameter in Marquardt's Method".
+
+    Each iteration solves (J^T J + damping I) p = -J^T r,
+    where r is the residual vector, and J is the residual jacobian,
+    given by Problem.get_residual_jac.
+    Small damping gives Gauss-Newton steps,
+    and large damping gives short steepest descent steps.
+    Damping adapts to how well J^T J predicts the objective.
+
+    J^T J is a num_parameters x num_parameters matrix,
+    so this optimizer is best for small problems,
+    such as mean squared error regression, with a few hundred parameters.
+
+    Args:
+        initial_damping_scale: Initial damping is initial_damping_scale
+            times the largest diagonal of J^T J.
+        max_step_trials: Maximum number of damping increases in each iteration.
+            If no trial step decreases objective value,
+            parameters are not changed.
+    """
+
+    def __init__(self, initial_damping_scale=1e-3, max_step_trials=10):
+        super(LevenbergMarquardt, self).__init__()
+
+        self._initial_damping_scale = initial_damping_scale
+        self._max_step_trials = max_step_trials
+
+        # Levenberg-Marquardt parameters
+        self._damping = None
+        self._damping_increase = 2.0
+
+    def reset(self):
+        """Reset optimizer parameters."""
+        super(LevenbergMarquardt, self).reset()
+
+        # Reset Levenberg-Marquardt parameters
+        self._damping = None
+        self._damping_increase = 2.0
+
+    def next(self, problem, parameters):
+        """Return next iteration of this optimizer."""
+        residuals, residual_jac = problem.get_residual_jac(parameters)
+        if residuals is None:
+            raise ValueError(
+                'LevenbergMarquardt requires a Problem with residual_jac_func')
+
+        obj_value = residuals.dot(residuals)
+        # Half of jacobian of objective, J^T r
+        half_jacobian = residual_jac.T.dot(residuals)
+        self.jacobian = 2.0 * half_jacobian
+
+        if not half_jacobian.any():
+            # Already at a stationary point
+            return obj_value, parameters
+
+        with profile.phase(profile.DIRECTION):
+            approx_hessian = residual_jac.T.dot(residual_jac)
+            if self._damping is None:
+                self._damping = self._initial_damping_scale * numpy.max(
+                    numpy.diag(approx_hessian))
+                if self._damping <= 0.0:
+                    self._damping = self._initial_damping_scale
+
+        with profile.phase(profile.LINE_SEARCH):
+            for _ in range(self._max_step_trials):
+                step = _solve_damped(approx_hessian, self._damping,
+                                     -half_jacobian)
+
+                # Decrease predicted by linear model of residuals,
+                # r^T r - ||r + J p||^2 = p^T (damping p - J^T r)
+                predicted_decrease = step.dot(self._damping * step -
+                                              half_jacobian)
+                step_obj = problem.get_obj(parameters + step)
+
+                if predicted_decrease > 0.0 and step_obj < obj_value:
+                    # Decrease damping more when prediction was accurate
+                    gain_ratio = (obj_value - step_obj) / predicted_decrease
+                    self._damping *= max(1.0 / 3.0,
+                                         1.0 - (2.0 * gain_ratio - 1.0)**3)
+                    self._damping_increase = 2.0
+                    return obj_value, parameters + step
+
+                # Step did not improve objective value,
+                # move towards shorter steepest descent steps
+                self._damping *= self._damping_increase
+                self._damping_increase *= 2.0
+
+        logging.warning('LevenbergMarquardt did not find an improving step '
+                        'after %d trials', self._max_step_trials)
+        return obj_value, parameters
+
+
+def _solve_damped(approx_hessian, damping, vector):
+    """Return p, solving (approx_hessian + damping I) p = vector."""
+    damped_hessian = numpy.copy(approx_hessian)
+    damped_hessian[numpy.diag_indices_from(damped_hessian)] += damping
+    return numpy.linalg.solve(damped_hessian, vector)
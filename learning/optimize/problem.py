@@ -26,6 +26,8 @@
 import functools
 import operator
 
+from learning import profile
+
 
 ############################
 # Problem
@@ -46,6 +48,12 @@ class Problem(object):
 
         obj_jac_hess: obj_jac_hess_func, (obj_jac_func, hess), (obj_hess_func, jac),
             (obj, jac_hess_func), (obj, jac, hess)
+
+    For sum of squares problems, residual_jac_func takes parameters,
+    and returns (residual vector, residual jacobian matrix),
+    where objective = residuals^T residuals,
+    and the residual jacobian has a row for each residual.
+    It is used by optimizers such as LevenbergMarquardt.
     """
 
     def __init__(self,
@@ -55,7 +63,8 @@ class Problem(object):
                  obj_jac_func=None,
                  obj_hess_func=None,
                  jac_hess_func=None,
-                 obj_jac_hess_func=None):
+                 obj_jac_hess_func=None,
+                 residual_jac_func=None):
         # Get objective function
         if obj_func is not None:
             self.get_obj = obj_func
@@ -149,6 +158,37 @@ class Problem(object):
             self.get_obj_jac_hess = functools.partial(
                 _bundle, (self.get_obj, self.get_jac, self.get_hess))
 
+        # Get residuals and residual jacobian function
+        if residual_jac_func is not None:
+            self.get_residual_jac = residual_jac_func
+        else:
+            self.get_residual_jac = _return_none_pair
+
+        # Count evaluations, when training is profiled
+        if profile.get_profiler() is not None:
+            self._count_evaluations()
+
+    def _count_evaluations(self):
+        """Wrap get functions to count evaluations on the active TrainingProfiler."""
+        for attr, names in [('get_obj', ('obj', )), ('get_jac', ('jac', )),
+                            ('get_hess', ('hess', )),
+                            ('get_obj_jac', ('obj', 'jac')),
+                            ('get_obj_hess', ('obj', 'hess')),
+                            ('get_jac_hess', ('jac', 'hess')),
+                            ('get_obj_jac_hess', ('obj', 'jac', 'hess')),
+                            ('get_residual_jac', ('obj', 'jac'))]:
+            setattr(self, attr,
+                    functools.partial(_call_counted, getattr(self, attr), names))
+
+
+def _call_counted(func, names, *args, **kwargs):
+    """Return func called with *args and **kwargs, counting an evaluation of names.
+
+    Use with functools.partial to wrap func.
+    """
+    profile.evaluation(*names)
+    return func(*args, **kwargs)
+
 
 def _call_return_indices(func, indices, *args, **kwargs):
     """Return indices of func called with *args and **kwargs.
@@ -190,3 +230,8 @@ def _tuple_result(func, *args, **kwargs):
 def _return_none(*args, **kwargs):
     """Return None."""
     return None
+
+
+def _return_none_pair(*args, **kwargs):
+    """Return (None, None)."""
+    return None, None
@@ -0,0 +1,445 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Justin Lovinger
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+"""Train models with worker processes.
+
+DataParallelTrainer evaluates each objective value and gradient
+with worker processes. Each worker process holds a shard of the dataset.
+The coordinator broadcasts parameters through shared memory,
+workers write the objective value and gradient of their shard
+to their own shared memory buffers,
+and the coordinator sums these buffers, weighted by shard rows.
+
+Optimizers and line searches run unchanged in the coordinator,
+and every evaluation, including line search trials, is parallelized.
+
+This requires that error is the mean of row errors,
+as with MeanSquaredError and CrossEntropyError.
+
+HogwildTrainer runs asynchronous stochastic gradient descent.
+Worker processes read and update a shared parameter vector without locks,
+each with its own mini-batches.
+"""
+import random
+import multiprocessing
+import traceback
+
+import numpy
+
+from learning import base, chunking, sparse
+
+# Worker commands
+_OBJ = 'obj'
+_OBJ_JAC = 'obj_jac'
+
+
+class DataParallelTrainer(object):
+    """Train a model, with objective and gradient evaluated by worker processes.
+
+    Supports models that implement _get_obj and _get_obj_jac,
+    such as MLP, DropoutMLP, RBF, and regression models.
+    Workers copy the model on the first evaluation of each train call,
+    so model state other than parameters, such as RBF clusters,
+    must not change during training.
+    The exception is per-row dropout masks (DropoutMLP),
+    which are drawn every step, and sent with every evaluation,
+    each worker receiving the rows of its shard.
+
+    Usage:
+        trainer = DataParallelTrainer(model, num_processes=4)
+        trainer.train(input_matrix, target_matrix, iterations=100)
+
+    Args:
+        model: Model to train.
+        num_processes: Number of worker processes, each with a shard of the dataset.
+    """
+
+    def __init__(self, model, num_processes=None):
+        if num_processes is None:
+            num_processes = multiprocessing.cpu_count()
+        if num_processes < 1:
+            raise ValueError('num_processes must be >= 1')
+
+        self._model = model
+        self._num_processes = num_processes
+
+        # Dataset, and workers evaluating it
+        self._dataset = None
+        self._workers = None
+
+    def train(self, input_matrix, target_matrix, **kwargs):
+        """Train model on the given dataset.
+
+        Args:
+            input_matrix: A matrix with samples in rows and attributes in columns.
+            target_matrix: A matrix with samples in rows and target values in columns.
+            **kwargs: Arguments for Model.train.
+                retries and retry_processes are not supported.
+        """
+        if kwargs.get('retries', 0) != 0:
+            raise ValueError('retries are not supported')
+        if kwargs.get('retry_processes') is not None:
+            raise ValueError('retry_processes is not supported')
+
+        model = self._model
+        self._dataset = (input_matrix, target_matrix)
+        # Model calls these instead of its own methods, during training
+        model._get_obj = self._get_obj
+        model._get_obj_jac = self._get_obj_jac
+        try:
+            return model.train(input_matrix, target_matrix, **kwargs)
+        finally:
+            del model._get_obj
+            del model._get_obj_jac
+            self._stop()
+            self._dataset = None
+
+    def _get_obj(self, parameter_vec, input_matrix, target_matrix):
+        """Return objective value, evaluated by workers."""
+        if not self._is_dataset(input_matrix, target_matrix):
+            return type(self._model)._get_obj(self._model, parameter_vec,
+                                              input_matrix, target_matrix)
+        return self._evaluate(_OBJ, parameter_vec)[0]
+
+    def _get_obj_jac(self, parameter_vec, input_matrix, target_matrix):
+        """Return objective value and gradient, evaluated by workers."""
+        if not self._is_dataset(input_matrix, target_matrix):
+            return type(self._model)._get_obj_jac(
+                self._model, parameter_vec, input_matrix, target_matrix)
+        return self._evaluate(_OBJ_JAC, parameter_vec)
+
+    def _is_dataset(self, input_matrix, target_matrix):
+        """Return True if matrices are the dataset held by workers."""
+        return (input_matrix is self._dataset[0]
+                and target_matrix is self._dataset[1])
+
+    def _evaluate(self, command, parameter_vec):
+        """Return (objective value, gradient or None), summed from every worker."""
+        # Model parameters are also set, as with Model._get_obj
+        self._model._set_flat_parameters(parameter_vec)
+
+        if self._workers is None:
+            self._start(parameter_vec.size)
+        workers = self._workers
+
+        # Broadcast parameters, and wait for every worker
+        workers.parameters[:] = parameter_vec
+        masks = getattr(self._model, '_masks', None)
+        for connection, rows in zip(workers.connections, workers.shards):
+            try:
+                connection.send((command, _get_shard_masks(masks, rows)))
+            except (IOError, OSError):
+                raise RuntimeError('Worker process exited unexpectedly')
+        errors = [_receive(connection) for connection in workers.connections]
+        for error in errors:
+            if error is not None:
+                raise RuntimeError('Error in worker process:\n%s' % error)
+
+        obj_value = numpy.dot(workers.weights, workers.objectives)
+        if command == _OBJ:
+            return obj_value, None
+        return obj_value, numpy.dot(workers.weights, workers.jacobians)
+
+    def _start(self, num_parameters):
+        """Start worker processes, each with a shard of the dataset."""
+        input_matrix, target_matrix = self._dataset
+        num_rows = chunking.num_rows(input_matrix)
+        shards = chunking.get_shards(num_rows,
+                                     min(self._num_processes, num_rows))
+
+        workers = _Workers(len(shards), num_parameters)
+        workers.shards = shards
+        workers.weights = numpy.array(
+            [(rows.stop - rows.start) / float(num_rows) for rows in shards])
+        try:
+            for index, rows in enumerate(shards):
+                connection, worker_connection = multiprocessing.Pipe()
+                process = multiprocessing.Process(
+                    target=_evaluation_worker,
+                    args=(self._model, input_matrix[rows],
+                          target_matrix[rows], workers.raw_parameters,
+                          workers.raw_objectives, workers.raw_jacobians,
+                          index, worker_connection))
+                process.daemon = True
+                process.start()
+                # Close our copy of the worker end,
+                # so recv fails, instead of blocking, if the worker dies
+                worker_connection.close()
+                workers.processes.append(process)
+                workers.connections.append(connection)
+        except Exception:
+            workers.stop()
+            raise
+        self._workers = workers
+
+    def _stop(self):
+        """Stop worker processes."""
+        if self._workers is not None:
+            self._workers.stop()
+            self._workers = None
+
+
+class _Workers(object):
+    """Worker processes, and shared memory buffers."""
+
+    def __init__(self, num_workers, num_parameters):
+        # Shared memory, without locks, because workers
+        # only write to their own buffers, while the coordinator waits
+        self.raw_parameters = multiprocessing.RawArray('d', num_parameters)
+        self.raw_objectives = multiprocessing.RawArray('d', num_workers)
+        self.raw_jacobians = multiprocessing.RawArray(
+            'd', num_workers * num_parameters)
+
+        self.parameters = numpy.frombuffer(self.raw_parameters)
+        self.objectives = numpy.frombuffer(self.raw_objectives)
+        self.jacobians = numpy.frombuffer(self.raw_jacobians).reshape(
+            num_workers, num_parameters)
+
+        # Rows, and fraction of rows, in each shard
+        self.shards = None
+        self.weights = None
+
+        self.processes = []
+        self.connections = []
+
+    def stop(self):
+        """Stop every worker process."""
+        for connection in self.connections:
+            try:
+                connection.send(None)
+            except (IOError, OSError):  # Worker already stopped
+                pass
+        for process in self.processes:
+            process.join(timeout=1.0)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        for connection in self.connections:
+            connection.close()
+
+
+def _receive(connection):
+    """Return message from a worker, or raise RuntimeError if the worker died."""
+    try:
+        return connection.recv()
+    except EOFError:
+        raise RuntimeError('Worker process exited unexpectedly')
+
+
+def _get_shard_masks(masks, rows):
+    """Return rows of each dropout mask, or None if model has no masks."""
+    if masks is None:
+        return None
+    return [mask[rows] if mask is not None else None for mask in masks]
+
+
+def _evaluation_worker(model, input_matrix, target_matrix, raw_parameters,
+                       raw_objectives, raw_jacobians, index, connection):
+    """Evaluate (command, masks) from connection, until None is received.
+
+    Objective value and gradient are written to shared memory,
+    then None, or a traceback string, is sent back.
+    """
+    # Use the model's own evaluation, not the coordinator's
+    model.__dict__.pop('_get_obj', None)
+    model.__dict__.pop('_get_obj_jac', None)
+
+    parameters = numpy.frombuffer(raw_parameters)
+    objectives = numpy.frombuffer(raw_objectives)
+    jacobian = numpy.frombuffer(raw_jacobians).reshape(-1,
+                                                       parameters.size)[index]
+
+    while True:
+        message = connection.recv()
+        if message is None:
+            return
+        command, masks = message
+
+        try:
+            # Dropout masks of this step, for the rows of this shard
+            if hasattr(model, '_masks'):
+                model._masks = masks
+
+            # Copy parameters, because the model may keep views of them
+            parameter_vec = numpy.copy(parameters)
+            if command == _OBJ:
+                objectives[index] = model._get_obj(parameter_vec,
+                                                   input_matrix, target_matrix)
+            else:
+                objectives[index], jacobian[:] = model._get_obj_jac(
+                    parameter_vec, input_matrix, target_matrix)
+            connection.send(None)
+        except Exception:
+            connection.send(traceback.format_exc())
+
+
+class HogwildTrainer(object):
+    """Train a model with asynchronous, lock-free, stochastic gradient descent.
+
+    Worker processes share one parameter vector.
+    Each worker repeatedly selects a mini-batch, computes the gradient
+    from the current shared parameters, and takes a step,
+    without waiting for, or locking out, other workers.
+    This works best when updates rarely collide,
+    such as with sparse, high dimensional inputs.
+    With sparse inputs, only components with a nonzero gradient are updated.
+
+    Supports models that implement _get_obj_jac,
+    and _get_flat_parameters and _set_flat_parameters,
+    such as MLP, DropoutMLP, and regression models.
+    Workers draw DropoutMLP masks for every mini-batch.
+
+    Args:
+        model: Model to train.
+        num_processes: Number of worker processes.
+        step_size: Step size of each gradient descent step.
+        pattern_selection_func: Function that takes (input_matrix, target_matrix),
+            and returns a mini-batch. Defaults to base.select_random.
+            Each worker is independently seeded.
+    """
+
+    def __init__(self,
+                 model,
+                 num_processes=None,
+                 step_size=0.01,
+                 pattern_selection_func=None):
+        if num_processes is None:
+            num_processes = multiprocessing.cpu_count()
+        if num_processes < 1:
+            raise ValueError('num_processes must be >= 1')
+        if step_size <= 0.0:
+            raise ValueError('step_size must be > 0')
+        if pattern_selection_func is None:
+            pattern_selection_func = base.select_random
+
+        self._model = model
+        self._num_processes = num_processes
+        self._step_size = step_size
+        self._pattern_selection_func = pattern_selection_func
+
+    def train(self, input_matrix, target_matrix, iterations=1000):
+        """Train model on the given dataset.
+
+        Args:
+            input_matrix: A matrix with samples in rows and attributes in columns.
+            target_matrix: A matrix with samples in rows and target values in columns.
+            iterations: Number of steps taken by each worker.
+
+        Returns:
+            float; Error of trained model on the given dataset.
+        """
+        model = self._model
+        model.converged = False
+
+        # Pre training callback, before workers copy the model
+        model._pre_train(input_matrix, target_matrix)
+
+        initial_parameters = model._get_flat_parameters()
+        raw_parameters = multiprocessing.RawArray('d',
+                                                  initial_parameters.size)
+        parameters = numpy.frombuffer(raw_parameters)
+        parameters[:] = initial_parameters
+
+        # Seeds are drawn from the parent, so runs are
+        # reproducible under a seeded random state
+        seeds = numpy.random.randint(0, 2**31 - 1, size=self._num_processes)
+
+        processes = []
+        connections = []
+        try:
+            for seed in seeds:
+                connection, worker_connection = multiprocessing.Pipe()
+                process = multiprocessing.Process(
+                    target=_hogwild_worker,
+                    args=(model, input_matrix, target_matrix, raw_parameters,
+                          self._step_size, self._pattern_selection_func,
+                          iterations, seed, worker_connection))
+                process.daemon = True
+                process.start()
+                # Close our copy of the worker end,
+                # so recv fails, instead of blocking, if the worker dies
+                worker_connection.close()
+                processes.append(process)
+                connections.append(connection)
+
+            errors = [_receive(connection) for connection in connections]
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+                process.join()
+            for connection in connections:
+                connection.close()
+
+        for error in errors:
+            if error is not None:
+                raise RuntimeError('Error in worker process:\n%s' % error)
+
+        # Copy parameters out of shared memory
+        parameter_vec = numpy.copy(parameters)
+        model._set_flat_parameters(parameter_vec)
+        error = model._get_obj(parameter_vec, input_matrix, target_matrix)
+
+        # Post training callback
+        model._post_train(input_matrix, target_matrix)
+
+        return error
+
+
+def _hogwild_worker(model, input_matrix, target_matrix, raw_parameters,
+                    step_size, pattern_selection_func, iterations, seed,
+                    connection):
+    """Take iterations gradient descent steps on shared parameters.
+
+    None, or a traceback string, is sent to connection when done.
+    """
+    try:
+        # Independently seed each worker
+        random.seed(seed)
+        numpy.random.seed(seed)
+        if getattr(model, '_random_state', None) is not None:
+            # Seeded dropout masks would otherwise match in every worker
+            model._random_state = numpy.random.RandomState(seed)
+        draw_masks = hasattr(model, '_get_masks')
+
+        # Model parameters are views of shared memory,
+        # so every activation uses the latest parameters of all workers
+        parameters = numpy.frombuffer(raw_parameters)
+        update_nonzero = sparse.issparse(input_matrix)
+        for _ in range(iterations):
+            batch_inputs, batch_targets = pattern_selection_func(
+                input_matrix, target_matrix)
+            if draw_masks:
+                model._masks = model._get_masks(batch_inputs.shape[0])
+            _, jacobian = model._get_obj_jac(parameters, batch_inputs,
+                                             batch_targets)
+
+            # Update without locking
+            if update_nonzero:
+                indices = numpy.flatnonzero(jacobian)
+                parameters[indices] -= step_size * jacobian[indices]
+            else:
+                parameters -= step_size * jacobian
+        connection.send(None)
+    except Exception:
+        connection.send(traceback.format_exc())
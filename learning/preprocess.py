@@ -27,6 +27,7 @@ import random
 
 import numpy
 
+from learning import sparse
 from learning.architecture import knn
 
 
@@ -47,17 +48,9 @@ def make_onehot(vector):
 
     Use to convet a vector of class labels into a target_matrix.
     Each one-hot vector has a single 1.0, and many 0.0s.
+    Use LabelEncoder to encode future data with the same classes.
     """
-    # Find classes, and corresponding onehot vectors
-    class_onehots = _class_indices_to_onehots(_class_indices(vector))
-
-    # Add onehot vector to matrix for each value (class) in vector
-    matrix = []
-    for val in vector:
-        # Append a copy of the onehot vector corresponding to this class
-        matrix.append(class_onehots[str(val)].copy())
-
-    return numpy.array(matrix)
+    return LabelEncoder().fit_transform(vector)
 
 
 def make_labels(matrix):
@@ -65,91 +58,338 @@ def make_labels(matrix):
 
     Use to convert onehot matrix into class labels.
     """
-    class_indices = _class_indices(matrix)
-
-    # Make column vector
-    vector = []
-    for row in matrix:
-        vector.append([class_indices[str(row)]])
-
-    return numpy.array(vector)
+    return LabelEncoder(output='labels').fit_transform(matrix)
 
 
-def _class_indices(vector):
-    """Return dict mapping class -> index.
+class LabelEncoder(object):
+    """Encode classes as onehot rows or label indices.
 
+    Each unique value, or unique row of a matrix, is a class.
     Classes get index in order of first appearance.
+
+    Args:
+        output: 'onehot' for a dense matrix of onehot rows,
+            'labels' for a column vector of class indices,
+            or 'sparse' for a sparse CSR matrix of onehot rows
+            (SciPy if available, otherwise sparse.CSRMatrix).
+            Labels and sparse avoid a dense matrix for problems with many classes.
+
+    Attributes:
+        classes: Array of classes, in order of index.
     """
-    # Find all classes
-    # Each unique row is considered a class, whether matrix is 1d, 2d, etc.
-    # This alllows it to work with col vectors, or 1d vectors
-    class_indices = {}
-    index = 0
-    for val in vector:
-        key = str(val)
-        if key not in class_indices:
-            class_indices[key] = index
-            index += 1
-    return class_indices
-
-
-def _class_indices_to_onehots(class_indices):
-    """Return dict mapping class -> onehot_vec."""
-    num_classes = len(class_indices)
-    class_onehots = {}
-    for class_, index in class_indices.iteritems():
-        onehot = numpy.zeros(num_classes)
-        onehot[index] = 1.0
-        class_onehots[class_] = onehot
-    return class_onehots
+
+    def __init__(self, output='onehot'):
+        if output not in ('onehot', 'labels', 'sparse'):
+            raise ValueError("output must be 'onehot', 'labels', or 'sparse'")
+        self._output = output
+
+        self.classes = None
+
+    def fit(self, values):
+        """Find classes in values. Return self."""
+        self._fit(values)
+        return self
+
+    def fit_transform(self, values):
+        """Find classes in values, and return encoded values."""
+        return self._encode(self._fit(values))
+
+    def transform(self, values):
+        """Return encoded values, with classes from fit."""
+        if self.classes is None:
+            raise ValueError('LabelEncoder must be fit before transform')
+
+        values = numpy.asarray(values)
+        num_classes = len(self.classes)
+
+        # Find unique values among classes and values,
+        # and map classes to their index
+        uniques, inverse = numpy.unique(
+            numpy.concatenate([self.classes, values]),
+            return_inverse=True,
+            axis=0)
+        unique_indices = numpy.full(len(uniques), -1, dtype=int)
+        unique_indices[inverse[:num_classes]] = numpy.arange(num_classes)
+
+        class_indices = unique_indices[inverse[num_classes:]]
+        if (class_indices == -1).any():
+            raise ValueError('values contain classes not found by fit')
+        return self._encode(class_indices)
+
+    def inverse_transform(self, encoded):
+        """Return classes of encoded values.
+
+        Onehot rows may be onehot like, ex. model outputs.
+        """
+        if self.classes is None:
+            raise ValueError('LabelEncoder must be fit before inverse_transform')
+
+        if self._output == 'labels':
+            class_indices = numpy.asarray(encoded).ravel()
+        else:
+            if isinstance(encoded, sparse.CSRMatrix):
+                encoded = encoded.toarray()
+            # Greatest element in each row is the class
+            class_indices = numpy.asarray(encoded.argmax(axis=1)).ravel()
+        return self.classes[class_indices]
+
+    def _fit(self, values):
+        """Find classes in values, and return class index of each value."""
+        uniques, first_indices, inverse = numpy.unique(
+            numpy.asarray(values),
+            return_index=True,
+            return_inverse=True,
+            axis=0)
+
+        # Order by first appearance, instead of sorted order
+        order = numpy.argsort(first_indices)
+        self.classes = uniques[order]
+
+        unique_indices = numpy.empty(len(order), dtype=int)
+        unique_indices[order] = numpy.arange(len(order))
+        return unique_indices[inverse]
+
+    def _encode(self, class_indices):
+        """Return class indices in output format."""
+        if self._output == 'labels':
+            return class_indices[:, None]
+
+        num_rows = len(class_indices)
+        if self._output == 'sparse':
+            return sparse.make_csr(
+                numpy.ones(num_rows), class_indices,
+                numpy.arange(num_rows + 1), (num_rows, len(self.classes)))
+
+        # Class index is given a value of 1.0
+        onehot_matrix = numpy.zeros((num_rows, len(self.classes)))
+        onehot_matrix[numpy.arange(num_rows), class_indices] = 1.0
+        return onehot_matrix
 
 
 ########################
 # Normalization
 ########################
 def rescale(matrix):
-    """Scale each column to [-1, 1]."""
-    scaled_matrix = numpy.array(matrix, dtype='float64')
-
-    scaled_matrix -= numpy.min(scaled_matrix, axis=0)  # Each col, min of 0
-    scaled_matrix /= numpy.max(scaled_matrix, axis=0)  # Each col, max of 1
+    """Scale each column to [-1, 1].
 
-    # Scale from [0, 1] to [-1, 1]
-    scaled_matrix *= 2.0
-    scaled_matrix -= 1.0
-
-    return scaled_matrix
+    Columns with a single value are scaled to 0.
+    Use Rescaler to apply the same scaling to other matrices.
+    """
+    return Rescaler().fit(matrix).transform(matrix)
 
 
 def normalize(matrix):
     """Normalize matrix to a mean of 0 and standard devaiation of 1, for each dimension.
 
     This improves numerical stability and allows for easier gradient descent.
+    Use Normalizer to apply the same normalization to other matrices.
 
     Args:
         matrix: numpy.matrix; A matrix of values.
             We expect each row to be a point, and each column to be a dimension.
     """
-    np_matrix = numpy.array(matrix, dtype='float64')
-
-    if np_matrix.shape[0] < 2:
+    if len(matrix) < 2:
         raise ValueError('Cannot normalize a matrix with only one row')
 
-    # Subtract the mean of each attribute from that attribute, for each point
-    np_matrix -= numpy.mean(np_matrix, axis=0)
+    return Normalizer().fit(matrix).transform(matrix)
+
 
-    # Divide the standard deviation of each attribute from that attribute, for each point
-    try:
-        with numpy.errstate(divide='raise', invalid='raise'):
-            np_matrix /= numpy.std(np_matrix, axis=0)
-    except FloatingPointError:
-        # STD of zero
-        np_matrix /= numpy.std(np_matrix, axis=0)
+class Scaler(object):
+    """Column scaling, with statistics from fit, applied by transform.
 
-        # Replace Nan (0 / inf) and inf (x / inf) with 0.0
-        np_matrix[~numpy.isfinite(np_matrix)] = 0.0
+    Statistics can be computed incrementally with partial_fit,
+    for datasets that do not fit in memory.
+    Scalers can be pickled, ex. with the model they were used to train.
+    """
+
+    def reset(self):
+        """Forget statistics from previous fit."""
+        raise NotImplementedError()
+
+    def partial_fit(self, matrix):
+        """Update statistics with rows of matrix. Return self."""
+        raise NotImplementedError()
+
+    def _transform(self, matrix):
+        """Scale matrix in place."""
+        raise NotImplementedError()
+
+    def _inverse_transform(self, matrix):
+        """Undo scaling of matrix in place."""
+        raise NotImplementedError()
+
+    def fit(self, matrix):
+        """Compute statistics of matrix, for transform. Return self."""
+        self.reset()
+        return self.partial_fit(matrix)
+
+    def transform(self, matrix, copy=True, dtype='float64'):
+        """Return scaled matrix.
+
+        Args:
+            matrix: A matrix with samples in rows and attributes in columns.
+            copy: If False, matrix is scaled in place,
+                and must be a numpy array of floats.
+            dtype: dtype of scaled copy, ex. 'float32' to halve memory.
+        """
+        matrix = _scaler_matrix(matrix, copy, dtype)
+        self._transform(matrix)
+        return matrix
+
+    def inverse_transform(self, matrix, copy=True, dtype='float64'):
+        """Return matrix with scaling from transform undone.
+
+        Args: See transform.
+        """
+        matrix = _scaler_matrix(matrix, copy, dtype)
+        self._inverse_transform(matrix)
+        return matrix
+
+    def fit_transform(self, matrix, **kwargs):
+        """Fit to matrix, and return scaled matrix. kwargs passed to transform."""
+        return self.fit(matrix).transform(matrix, **kwargs)
+
+
+class Normalizer(Scaler):
+    """Normalize each column to a mean of 0 and standard deviation of 1.
+
+    Mean and variance are updated with the parallel form of
+    Welford's algorithm, so partial_fit over chunks
+    gives the same statistics as fit over all rows.
+    Columns with a standard deviation of 0 are scaled to 0.
+    """
 
-    return np_matrix
+    def __init__(self):
+        super(Normalizer, self).__init__()
+
+        self.count = 0
+        self.mean = None
+        self._sum_squares = None  # Sum of squared differences from mean
+
+    @property
+    def std(self):
+        """Standard deviation of each column."""
+        return numpy.sqrt(self._sum_squares / self.count)
+
+    def reset(self):
+        """Forget statistics from previous fit."""
+        self.count = 0
+        self.mean = None
+        self._sum_squares = None
+
+    def partial_fit(self, matrix):
+        """Update statistics with rows of matrix. Return self."""
+        matrix = numpy.asarray(matrix)
+        count = matrix.shape[0]
+        if count == 0:
+            return self
+
+        mean = numpy.mean(matrix, axis=0, dtype='float64')
+        sum_squares = numpy.var(matrix, axis=0, dtype='float64') * count
+        if self.count == 0:
+            self.count = count
+            self.mean = mean
+            self._sum_squares = sum_squares
+        else:
+            # Merge statistics of both sets of rows
+            total_count = self.count + count
+            delta = mean - self.mean
+            self.mean = self.mean + delta * (float(count) / total_count)
+            self._sum_squares = self._sum_squares + sum_squares + delta**2 * (
+                float(self.count) * count / total_count)
+            self.count = total_count
+
+        return self
+
+    def _transform(self, matrix):
+        """Scale matrix in place."""
+        if self.count == 0:
+            raise ValueError('Normalizer must be fit before transform')
+
+        matrix -= self.mean
+        # Dividing by inf scales columns with no deviation to 0
+        std = self.std
+        std[std == 0.0] = numpy.inf
+        matrix /= std
+
+    def _inverse_transform(self, matrix):
+        """Undo scaling of matrix in place."""
+        if self.count == 0:
+            raise ValueError('Normalizer must be fit before transform')
+
+        matrix *= self.std
+        matrix += self.mean
+
+
+class Rescaler(Scaler):
+    """Scale each column to [-1, 1], based on column min and max.
+
+    Columns with a single value are scaled to 0.
+    """
+
+    def __init__(self):
+        super(Rescaler, self).__init__()
+
+        self.min = None
+        self.max = None
+
+    def reset(self):
+        """Forget statistics from previous fit."""
+        self.min = None
+        self.max = None
+
+    def partial_fit(self, matrix):
+        """Update statistics with rows of matrix. Return self."""
+        matrix = numpy.asarray(matrix)
+        if matrix.shape[0] == 0:
+            return self
+
+        min_ = numpy.min(matrix, axis=0).astype('float64')
+        max_ = numpy.max(matrix, axis=0).astype('float64')
+        if self.min is None:
+            self.min = min_
+            self.max = max_
+        else:
+            self.min = numpy.minimum(self.min, min_)
+            self.max = numpy.maximum(self.max, max_)
+
+        return self
+
+    def _transform(self, matrix):
+        """Scale matrix in place."""
+        half_range, offset = self._get_half_range_offset()
+        # Scale to [0, 2], then [-1, 1]
+        matrix -= self.min
+        # Dividing by inf scales columns with a single value to 0
+        half_range[half_range == 0.0] = numpy.inf
+        matrix /= half_range
+        matrix -= offset
+
+    def _inverse_transform(self, matrix):
+        """Undo scaling of matrix in place."""
+        half_range, offset = self._get_half_range_offset()
+        matrix += offset
+        matrix *= half_range
+        matrix += self.min
+
+    def _get_half_range_offset(self):
+        if self.min is None:
+            raise ValueError('Rescaler must be fit before transform')
+
+        half_range = (self.max - self.min) / 2.0
+        return half_range, numpy.where(half_range == 0.0, 0.0, 1.0)
+
+
+def _scaler_matrix(matrix, copy, dtype):
+    """Return matrix to scale in place."""
+    if copy:
+        return numpy.array(matrix, dtype=dtype)
+
+    if not (isinstance(matrix, numpy.ndarray)
+            and numpy.issubdtype(matrix.dtype, numpy.floating)):
+        raise TypeError('matrix must be a numpy array of floats, '
+                        'to transform in place')
+    return matrix
 
 
 def softmax_normalize(matrix):
@@ -242,44 +482,251 @@ def _count_classes(target_matrix):
 #########################
 # PCA
 #########################
-def _pca_get_eigenvalues(data_matrix):
-    """Get the eigenvalues and eigenvectors of the covariance matrix.
+class PCA(object):
+    """Principal component analysis, with a projection reusable on new data.
 
     Args:
-        data_matrix; An n by m matrix.
-            We expect each row to be a data point, and each column to be a dimension
+        num_components: Number of components, with the greatest variance, to keep.
+        select_components_func: Function that takes an array of component variances,
+            in descending order, and returns indices of components to keep.
+            Used if num_components is None. If both are None, all components are kept.
+        method: 'full' for an eigendecomposition of the covariance matrix,
+            or 'randomized' for a randomized SVD of only the top num_components.
+            Randomized is much faster when num_components is small
+            relative to the number of attributes.
+        whiten: If True, transformed components have a standard deviation of 1.
+        normalize: If True, attributes are normalized before analysis.
+        num_oversamples: Extra random vectors used by randomized SVD, for accuracy.
+        num_power_iterations: Power iterations used by randomized SVD, for accuracy.
+        seed: Seed for the random state of randomized SVD.
 
-    Returns:
-        numpy.array; Eigenvalues.
-        numpy.array; Eigenvectors.
     """
-    covariance = numpy.cov(data_matrix, rowvar=False)
-    return numpy.linalg.eigh(covariance)
-
-
-def _pca_reduce_dimensions(data_matrix, eigen_vectors, selected_dimensions):
-    """Use principle component analysis to reduce the dimensionality of a data set.
 
-    Args:
-        data_matrix: numpy.array; The n x m matrix to reduce.
-        eigen_vectors: numpy.array; The array of eigenvectors from the
-            covariance matrix of data_matrix.
-        selected_dimensions: list; list of indexes, each corresponding to an
-            eigenvector.
+    def __init__(self,
+                 num_components=None,
+                 select_components_func=None,
+                 method='full',
+                 whiten=False,
+                 normalize=True,
+                 num_oversamples=10,
+                 num_power_iterations=2,
+                 seed=None):
+        if method not in ('full', 'randomized'):
+            raise ValueError("method must be 'full' or 'randomized'")
+        if method == 'randomized' and num_components is None:
+            raise ValueError('randomized method requires num_components')
+
+        self._num_components = num_components
+        self._select_components_func = select_components_func
+        self._method = method
+        self._whiten = whiten
+        self._normalize = normalize
+        self._num_oversamples = num_oversamples
+        self._num_power_iterations = num_power_iterations
+        self._random_state = numpy.random.RandomState(seed)
+
+        self._components = None
+        self._explained_variance = None
+        self._normalizer = Normalizer()
+        # Sum of outer products of rows centered on mean, for partial_fit
+        self._comoment = None
+        self._whiten_std = None
+
+    @property
+    def components(self):
+        """Matrix with a column for each kept component, or None if not fit."""
+        if self._components is None and self._comoment is not None:
+            self._fit_partial_components()
+        return self._components
+
+    @property
+    def explained_variance(self):
+        """Variance along each kept component, or None if not fit."""
+        if self._components is None and self._comoment is not None:
+            self._fit_partial_components()
+        return self._explained_variance
+
+    def reset(self):
+        """Forget components from previous fit."""
+        self._components = None
+        self._explained_variance = None
+        self._normalizer.reset()
+        self._comoment = None
+        self._whiten_std = None
+
+    def fit(self, matrix):
+        """Find components of matrix. Return self."""
+        self._fit(matrix)
+        return self
+
+    def _fit(self, matrix):
+        """Find components of matrix, and return projected matrix."""
+        self.reset()
+
+        matrix = numpy.asarray(matrix)
+        if matrix.shape[0] < 2:
+            raise ValueError('Cannot fit PCA to a matrix with only one row')
+
+        self._normalizer.fit(matrix)
+        centered_matrix = self._center(matrix)
+
+        if self._method == 'randomized':
+            singular_values, components = _randomized_svd(
+                centered_matrix, self._num_components, self._num_oversamples,
+                self._num_power_iterations, self._random_state)
+            variances = singular_values**2 / (matrix.shape[0] - 1)
+        else:
+            variances, components = numpy.linalg.eigh(
+                centered_matrix.T.dot(centered_matrix) /
+                (matrix.shape[0] - 1))
+        self._set_components(variances, components)
+
+        # Use deviation of projected matrix for whitening,
+        # more precise than deviation from variances
+        projected_matrix = centered_matrix.dot(self._components)
+        self._whiten_std = _whiten_std(numpy.std(projected_matrix, axis=0))
+        if self._whiten:
+            projected_matrix /= self._whiten_std
+        return projected_matrix
+
+    def partial_fit(self, matrix):
+        """Update statistics with rows of matrix. Return self.
+
+        Use for datasets that do not fit in memory.
+        Components are found from the covariance of all rows given so far,
+        when next needed.
+        Co-moments are merged like Normalizer variances,
+        so covariance is accurate for attributes with large offsets.
+        """
+        matrix = numpy.asarray(matrix, dtype='float64')
+        count = matrix.shape[0]
+        if count == 0:
+            return self
+
+        prev_count = self._normalizer.count
+        prev_mean = self._normalizer.mean
+        self._normalizer.partial_fit(matrix)
+
+        mean = numpy.mean(matrix, axis=0)
+        centered_matrix = matrix - mean
+        comoment = centered_matrix.T.dot(centered_matrix)
+        if self._comoment is None:
+            self._comoment = comoment
+        else:
+            # Merge co-moments of both sets of rows
+            delta = mean - prev_mean
+            self._comoment += comoment + numpy.outer(delta, delta) * (
+                float(prev_count) * count / (prev_count + count))
+
+        # Components are stale
+        self._components = None
+        self._explained_variance = None
+        return self
+
+    def transform(self, matrix):
+        """Return matrix projected onto components."""
+        if self.components is None:
+            raise ValueError('PCA must be fit before transform')
+
+        projected_matrix = self._center(matrix).dot(self._components)
+        if self._whiten:
+            projected_matrix /= self._whiten_std
+        return projected_matrix
+
+    def fit_transform(self, matrix):
+        """Find components of matrix, and return matrix projected onto components."""
+        return self._fit(matrix)
+
+    def _center(self, matrix):
+        """Return copy of matrix, centered, and normalized if enabled."""
+        if self._normalize:
+            return self._normalizer.transform(matrix)
+        return numpy.asarray(matrix, dtype='float64') - self._normalizer.mean
+
+    def _fit_partial_components(self):
+        """Find components from statistics of partial_fit."""
+        count = self._normalizer.count
+        if count < 2:
+            raise ValueError('Cannot fit PCA to a matrix with only one row')
+
+        covariance = self._comoment / (count - 1)
+        if self._normalize:
+            # Covariance of normalized attributes,
+            # attributes with no deviation are normalized to 0
+            std = self._normalizer.std
+            with numpy.errstate(divide='ignore'):
+                inverse_std = numpy.where(std == 0.0, 0.0, 1.0 / std)
+            covariance *= numpy.outer(inverse_std, inverse_std)
+
+        if self._method == 'randomized':
+            # Covariance is symmetric,
+            # so singular values and vectors are eigenvalues and vectors
+            variances, components = _randomized_svd(
+                covariance, self._num_components, self._num_oversamples,
+                self._num_power_iterations, self._random_state)
+        else:
+            variances, components = numpy.linalg.eigh(covariance)
+
+        self._set_components(variances, components)
+
+    def _set_components(self, variances, components):
+        """Select components, and prepare for transform."""
+        # Descending order of variance
+        order = numpy.argsort(variances)[::-1]
+        variances = variances[order]
+        components = components[:, order]
+
+        if self._num_components is not None:
+            selected = slice(None, self._num_components)
+        elif self._select_components_func is not None:
+            selected = self._select_components_func(variances)
+        else:
+            selected = slice(None)
+        variances = variances[selected]
+        components = components[:, selected]
+
+        # Make signs deterministic, largest element of each component is positive
+        signs = numpy.sign(components[numpy.argmax(
+            numpy.abs(components), axis=0), numpy.arange(components.shape[1])])
+        signs[signs == 0.0] = 1.0
+        components = components * signs
+
+        self._explained_variance = variances
+        self._components = components
+
+        # Standard deviation of each transformed component, for whitening
+        count = self._normalizer.count
+        self._whiten_std = _whiten_std(
+            numpy.sqrt(numpy.maximum(variances, 0.0) * (count - 1.0) / count))
+
+
+def _whiten_std(std):
+    """Return std, with inf for 0, so components with no variance become 0."""
+    std = numpy.array(std, dtype='float64')
+    std[std == 0.0] = numpy.inf
+    return std
+
+
+def _randomized_svd(matrix, num_components, num_oversamples,
+                    num_power_iterations, random_state):
+    """Return top singular values, and matrix with columns of right singular vectors.
+
+    See "Finding structure with randomness: Probabilistic algorithms
+    for constructing approximate matrix decompositions", Halko et al.
     """
-    if not isinstance(selected_dimensions, (list, numpy.ndarray)):
-        raise TypeError('selected_dimensions must be a list of indexes')
-
-    # Key is an array of indexes, each index corresponds to an
-    # eigenvalue and eigenvector
+    num_vectors = min(num_components + num_oversamples, min(matrix.shape))
 
-    # Numpy lets us use this key to easily construct new arrays with
-    # only the chosen indexes. The [:, key] slice selects columns with the
-    # given indexes
-    eigen_vectors = eigen_vectors[:, selected_dimensions]
+    # Find orthonormal basis for range of matrix
+    basis, _ = numpy.linalg.qr(
+        matrix.dot(random_state.normal(size=(matrix.shape[1], num_vectors))))
+    for _ in range(num_power_iterations):
+        basis, _ = numpy.linalg.qr(matrix.T.dot(basis))
+        basis, _ = numpy.linalg.qr(matrix.dot(basis))
 
-    # Perform the reduction using selected eigenvectors
-    return numpy.dot(eigen_vectors.T, data_matrix.T).T
+    # SVD of small matrix, projected onto basis
+    _, singular_values, right_vectors = numpy.linalg.svd(
+        basis.T.dot(matrix), full_matrices=False)
+    return singular_values[:num_components], right_vectors[:num_components].T
 
 
 def pca(data_matrix, desired_num_dimensions=None, select_dimensions_func=None):
@@ -287,6 +734,14 @@ def pca(data_matrix, desired_num_dimensions=None, select_dimensions_func=None):
 
     Note: dataset is normalized before analysis, without side effects,
           and resulting matrix is normalized before returning.
+          Use PCA to reapply the same projection to new data.
+
+    Args:
+        data_matrix: A matrix with samples in rows and attributes in columns.
+        desired_num_dimensions: Number of dimensions, with the greatest variance, to keep.
+        select_dimensions_func: Function that takes an array of eigenvalues,
+            in ascending order, and returns indices of dimensions to keep.
+            Dimensions are returned in the order of these indices.
     """
     if desired_num_dimensions is not None and select_dimensions_func is not None:
         raise ValueError(
@@ -295,24 +750,18 @@ def pca(data_matrix, desired_num_dimensions=None, select_dimensions_func=None):
         raise ValueError(
             'Use either desired_num_dimensions or num_dimensions_func')
 
-    # Normalize
-    normalized_matrix = normalize(data_matrix)
-
-    # Perform PCA, using covariance method
-    eigen_values, eigen_vectors = _pca_get_eigenvalues(normalized_matrix)
-
-    # Select eigenvectors, based on user input
-    if desired_num_dimensions is not None:
-        selected_dimensions = numpy.argsort(
-            eigen_values)[::-1][:desired_num_dimensions]
-
     if select_dimensions_func is not None:
-        selected_dimensions = select_dimensions_func(eigen_values)
+        # PCA gives variances in descending order,
+        # but select_dimensions_func indexes eigenvalues in ascending order
+        def select_components_func(variances):
+            descending_indices = numpy.arange(len(variances))[::-1]
+            return descending_indices[select_dimensions_func(variances[::-1])]
+    else:
+        select_components_func = None
 
-    # Perform the pca reduction
-    reduced_data_matrix = _pca_reduce_dimensions(
-        normalized_matrix, eigen_vectors, selected_dimensions)
-    return normalize(reduced_data_matrix)
+    return PCA(
+        desired_num_dimensions, select_components_func,
+        whiten=True).fit_transform(data_matrix)
 
 
 ##############################
@@ -323,7 +772,16 @@ def _pca_select_greater_than_one(eigen_values):
     return [i for i, v in enumerate(eigen_values) if v > 1]
 
 
-def clean_dataset(input_matrix, target_matrix):
+def clean_dataset(input_matrix, target_matrix, pca_model=None):
+    """Return dataset with reduced and normalized inputs, and cleaned targets.
+
+    Args:
+        input_matrix: A matrix with samples in rows and attributes in columns.
+        target_matrix: A matrix with samples in rows and target values in columns.
+        pca_model: PCA used to reduce inputs, fit to input_matrix if not already fit.
+            Ex. PCA(50, method='randomized', whiten=True) for many attributes.
+            Defaults to keeping components with a variance greater than 1.
+    """
     if not isinstance(input_matrix, numpy.ndarray):
         input_matrix = numpy.array(input_matrix)
     if not isinstance(target_matrix, numpy.ndarray):
@@ -333,8 +791,14 @@ def clean_dataset(input_matrix, target_matrix):
     if input_matrix.shape[1] > 1:  # More than 1 input dimension
         # Reduce input dimensions
         # And normalize (normalization performed by pca)
-        reduced_inputs = pca(
-            input_matrix, select_dimensions_func=_pca_select_greater_than_one)
+        if pca_model is None:
+            reduced_inputs = pca(
+                input_matrix,
+                select_dimensions_func=_pca_select_greater_than_one)
+        elif pca_model.components is None:
+            reduced_inputs = pca_model.fit_transform(input_matrix)
+        else:
+            reduced_inputs = pca_model.transform(input_matrix)
     else:
         # Just normalize
         reduced_inputs = normalize(input_matrix)
@@ -0,0 +1,253 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Justin Lovinger
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+"""Opt-in profiling of Model.train.
+
+Pass a TrainingProfiler to Model.train to record, for every iteration,
+the number of objective, jacobian, and hessian evaluations,
+line search trials, and time spent in each phase of training.
+
+Instrumented code calls the module level phase and evaluation functions.
+These do nothing, when no profiler is active.
+"""
+import json
+import threading
+import time
+
+# Standard phases, timed by models and optimizers
+FORWARD = 'forward'
+BACKWARD = 'backward'
+DIRECTION = 'direction'
+LINE_SEARCH = 'line_search'
+
+
+class TrainingProfiler(object):
+    """Record per iteration evaluation counts and phase timings.
+
+    history is a list with a dict for each iteration:
+        iteration: Iteration number, within attempt.
+        attempt: Attempt number, starting at 0.
+        error: Training error returned by train_step.
+        time: Seconds spent in iteration.
+        obj_evals, jac_evals, hess_evals: Problem evaluations.
+        line_search_trials: Problem evaluations during line search.
+        phases: Dict of phase name to seconds spent in phase.
+
+    Phase times are inclusive. A nested phase, such as forward inside line_search,
+    counts toward both phases.
+    Phases are tracked separately for each thread,
+    and time of a phase in concurrent threads, such as sharded forward passes,
+    is summed.
+
+    Args:
+        timer: Function returning the current time in seconds.
+    """
+
+    def __init__(self, timer=time.time):
+        self._timer = timer
+        self.history = []
+
+        self._attempt = 0
+        self._record = None
+        self._iteration_start = None
+
+        # Guards counters and phase times of the current record
+        self._lock = threading.Lock()
+        # Stack of active phases, for each thread
+        self._local = threading.local()
+
+    @property
+    def _active_phases(self):
+        """Stack of active phase names, in the calling thread."""
+        try:
+            return self._local.active_phases
+        except AttributeError:
+            self._local.active_phases = []
+            return self._local.active_phases
+
+    def reset(self):
+        """Clear recorded history."""
+        self.history = []
+        self._attempt = 0
+        self._record = None
+        self._local = threading.local()
+
+    ######################################
+    # Recording
+    ######################################
+    def start_attempt(self, attempt):
+        """Mark the start of a training attempt."""
+        self._attempt = attempt
+
+    def start_iteration(self):
+        """Mark the start of a training iteration."""
+        self._record = {
+            'attempt': self._attempt,
+            'obj_evals': 0,
+            'jac_evals': 0,
+            'hess_evals': 0,
+            'line_search_trials': 0,
+            'phases': {}
+        }
+        self._iteration_start = self._timer()
+
+    def end_iteration(self, iteration, error):
+        """Mark the end of a training iteration, and add it to history."""
+        if self._record is None:
+            raise ValueError('end_iteration called before start_iteration')
+
+        with self._lock:
+            self._record['time'] = self._timer() - self._iteration_start
+            self._record['iteration'] = iteration
+            self._record['error'] = None if error is None else float(error)
+            self.history.append(self._record)
+            self._record = None
+
+    def phase(self, name):
+        """Return context manager timing phase name."""
+        return _Phase(self, name)
+
+    def evaluation(self, *names):
+        """Count one problem evaluation, of obj, jac, and/or hess.
+
+        Evaluations during the line_search phase are also counted as line search trials.
+        """
+        line_search = LINE_SEARCH in self._active_phases
+        with self._lock:
+            if self._record is None:
+                return
+
+            for name in names:
+                self._record[name + '_evals'] += 1
+            if line_search:
+                self._record['line_search_trials'] += 1
+
+    def _add_phase_time(self, name, seconds):
+        """Add seconds to phase name of current iteration."""
+        with self._lock:
+            if self._record is None:
+                return
+
+            phases = self._record['phases']
+            phases[name] = phases.get(name, 0.0) + seconds
+
+    ######################################
+    # Results
+    ######################################
+    def summary(self):
+        """Return dict of totals over all recorded iterations."""
+        totals = {
+            'iterations': len(self.history),
+            'time': 0.0,
+            'obj_evals': 0,
+            'jac_evals': 0,
+            'hess_evals': 0,
+            'line_search_trials': 0,
+            'phases': {}
+        }
+        for record in self.history:
+            for key in ('time', 'obj_evals', 'jac_evals', 'hess_evals',
+                        'line_search_trials'):
+                totals[key] += record[key]
+            for name, seconds in record['phases'].iteritems():
+                totals['phases'][name] = totals['phases'].get(name,
+                                                              0.0) + seconds
+        return totals
+
+    def save(self, filename):
+        """Save history and summary as a JSON trace."""
+        with open(filename, 'w') as trace_file:
+            json.dump({
+                'summary': self.summary(),
+                'history': self.history
+            }, trace_file, indent=2, sort_keys=True)
+
+
+class _Phase(object):
+    """Context manager adding time spent in block to a profiler phase."""
+
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name = name
+        self._start = None
+
+    def __enter__(self):
+        self._profiler._active_phases.append(self._name)
+        self._start = self._profiler._timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._profiler._add_phase_time(self._name,
+                                       self._profiler._timer() - self._start)
+        self._profiler._active_phases.pop()
+        return False
+
+
+class _NullPhase(object):
+    """Context manager that does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+_active_profiler = None
+_active_profiler_lock = threading.Lock()
+
+
+##########################
+# Instrumentation
+##########################
+def get_profiler():
+    """Return active TrainingProfiler, or None."""
+    return _active_profiler
+
+
+def set_profiler(profiler):
+    """Set active TrainingProfiler, and return previously active profiler.
+
+    Set None to disable profiling.
+    """
+    global _active_profiler
+    with _active_profiler_lock:
+        previous_profiler = _active_profiler
+        _active_profiler = profiler
+    return previous_profiler
+
+
+def phase(name):
+    """Return context manager timing phase name on the active profiler."""
+    profiler = _active_profiler
+    if profiler is None:
+        return _NULL_PHASE
+    return profiler.phase(name)
+
+
+def evaluation(*names):
+    """Count one problem evaluation, of obj, jac, and/or hess, on the active profiler."""
+    profiler = _active_profiler
+    if profiler is not None:
+        profiler.evaluation(*names)
@@ -0,0 +1,191 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Justin Lovinger
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+"""Sparse input matrices.
+
+Models accept SciPy sparse matrices, when SciPy is available,
+or the lightweight built-in CSRMatrix otherwise.
+"""
+import numpy
+
+try:
+    import scipy.sparse as scipy_sparse
+except ImportError:
+    scipy_sparse = None
+
+
+def issparse(matrix):
+    """Return True if matrix is a SciPy sparse matrix or CSRMatrix."""
+    return isinstance(matrix, CSRMatrix) or (scipy_sparse is not None
+                                             and scipy_sparse.issparse(matrix))
+
+
+def csr_matrix(matrix):
+    """Return compressed sparse row matrix of a dense matrix.
+
+    A SciPy CSR matrix if SciPy is available, otherwise a CSRMatrix.
+    """
+    if scipy_sparse is not None:
+        return scipy_sparse.csr_matrix(matrix)
+    return CSRMatrix.from_dense(matrix)
+
+
+def make_csr(data, indices, indptr, shape):
+    """Return compressed sparse row matrix from CSR arrays.
+
+    A SciPy CSR matrix if SciPy is available, otherwise a CSRMatrix.
+    """
+    if scipy_sparse is not None:
+        return scipy_sparse.csr_matrix((data, indices, indptr), shape=shape)
+    return CSRMatrix(data, indices, indptr, shape)
+
+
+def dot(matrix_a, matrix_b):
+    """Return dense product of matrix_a, dense or sparse, and dense matrix_b."""
+    if issparse(matrix_a):
+        return numpy.asarray(matrix_a.dot(matrix_b))
+    return numpy.dot(matrix_a, matrix_b)
+
+
+class CSRMatrix(object):
+    """Compressed sparse row matrix.
+
+    Supports products with dense matrices (dot, and T.dot),
+    and row selection, as needed by models.
+    Uses the same layout as scipy.sparse.csr_matrix.
+
+    Args:
+        data: Non-zero values, in row order.
+        indices: Column index of each value in data.
+        indptr: data[indptr[i]:indptr[i+1]] are the values of row i.
+        shape: (num_rows, num_columns) tuple.
+    """
+
+    def __init__(self, data, indices, indptr, shape):
+        self.data = numpy.asarray(data, dtype='float64')
+        self.indices = numpy.asarray(indices, dtype=int)
+        self.indptr = numpy.asarray(indptr, dtype=int)
+        self.shape = tuple(shape)
+
+        if len(self.indptr) != self.shape[0] + 1:
+            raise ValueError('indptr must have num_rows + 1 elements')
+        if len(self.data) != len(self.indices):
+            raise ValueError('data and indices must have the same length')
+
+        # Transpose is expensive, so it is made once, when first needed
+        self._transpose = None
+
+    @classmethod
+    def from_dense(cls, matrix):
+        """Return CSRMatrix of the non-zero values of a dense matrix."""
+        matrix = numpy.asarray(matrix)
+        if matrix.ndim != 2:
+            raise ValueError('matrix must be 2 dimensional')
+
+        rows, columns = numpy.nonzero(matrix)
+        indptr = numpy.zeros(matrix.shape[0] + 1, dtype=int)
+        numpy.cumsum(numpy.bincount(rows, minlength=matrix.shape[0]),
+                     out=indptr[1:])
+        return cls(matrix[rows, columns], columns, indptr, matrix.shape)
+
+    @property
+    def ndim(self):
+        return 2
+
+    @property
+    def nnz(self):
+        """Number of stored values."""
+        return len(self.data)
+
+    @property
+    def T(self):
+        """Transpose of this matrix, as a CSRMatrix."""
+        if self._transpose is None:
+            # Rows of transpose are columns of this matrix,
+            # stable sort keeps row order within each column
+            order = numpy.argsort(self.indices, kind='mergesort')
+            indptr = numpy.zeros(self.shape[1] + 1, dtype=int)
+            numpy.cumsum(numpy.bincount(self.indices, minlength=self.shape[1]),
+                         out=indptr[1:])
+
+            self._transpose = CSRMatrix(
+                self.data[order], self._row_indices()[order], indptr,
+                (self.shape[1], self.shape[0]))
+            self._transpose._transpose = self
+        return self._transpose
+
+    def dot(self, matrix):
+        """Return dense product of this matrix and a dense matrix or vector."""
+        matrix = numpy.asarray(matrix)
+        if matrix.shape[0] != self.shape[1]:
+            raise ValueError('shapes %s and %s not aligned' % (self.shape,
+                                                               matrix.shape))
+
+        # Multiply each value by its corresponding row of matrix,
+        # then sum products of each row
+        products = self.data.reshape((-1, ) + (1, ) *
+                                     (matrix.ndim - 1)) * matrix[self.indices]
+        result = numpy.zeros((self.shape[0], ) + matrix.shape[1:])
+        nonempty_rows = self.indptr[:-1] < self.indptr[1:]
+        if nonempty_rows.any():
+            result[nonempty_rows] = numpy.add.reduceat(
+                products, self.indptr[:-1][nonempty_rows], axis=0)
+        return result
+
+    def toarray(self):
+        """Return dense numpy array of this matrix."""
+        array = numpy.zeros(self.shape)
+        array[self._row_indices(), self.indices] = self.data
+        return array
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __iter__(self):
+        for i in range(self.shape[0]):
+            yield self[i:i + 1]
+
+    def __getitem__(self, rows):
+        """Return CSRMatrix of selected rows.
+
+        rows can be an int, slice, list or array of indices, or boolean mask.
+        """
+        rows = numpy.arange(self.shape[0])[rows]
+        if rows.ndim == 0:
+            rows = rows.reshape(1)
+
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        indptr = numpy.zeros(len(rows) + 1, dtype=int)
+        numpy.cumsum(lengths, out=indptr[1:])
+
+        # Position in data of each value of selected rows
+        positions = numpy.repeat(starts - indptr[:-1],
+                                 lengths) + numpy.arange(indptr[-1])
+        return CSRMatrix(self.data[positions], self.indices[positions],
+                         indptr, (len(rows), self.shape[1]))
+
+    def _row_indices(self):
+        """Return row index of each value in data."""
+        return numpy.repeat(
+            numpy.arange(self.shape[0]), numpy.diff(self.indptr))
@@ -151,6 +151,18 @@ def _approx_equal(a, b, tol=0.001):
     return abs(a - b) < tol
 
 
+def check_residual_jac(model, input_matrix, target_matrix):
+    """Check that residuals and residual jacobian match objective value and jacobian."""
+    parameters = numpy.copy(model._get_flat_parameters())
+    error, jacobian = model._get_obj_jac(parameters, input_matrix,
+                                         target_matrix)
+    residuals, residual_jac = model._get_residual_jac(
+        parameters, input_matrix, target_matrix)
+    assert residual_jac.shape == (len(residuals), len(parameters))
+    assert approx_equal(residuals.dot(residuals), error)
+    assert approx_equal(2.0 * residual_jac.T.dot(residuals), jacobian)
+
+
 class SaneEqualityArray(numpy.ndarray):
     """Numpy array with working == operator."""
 
@@ -23,13 +23,13 @@
 ###############################################################################
 
 import random
-import copy
 
 import pytest
 import numpy
 
-from learning import (datasets, validation, LinearTransfer, SoftmaxTransfer, MeanSquaredError,
-                      CrossEntropyError)
+from learning import (chunking, datasets, optimize, validation, LinearTransfer,
+                      TanhTransfer, SoftmaxTransfer, SoftplusTransfer,
+                      MeanSquaredError, CrossEntropyError)
 from learning.architecture import mlp
 
 from learning.testing import helpers
@@ -82,7 +82,8 @@ def test_mlp():
 def test_mlp_convergence():
     # Run until convergence
     # assert that network can converge
-    model = mlp.MLP((2, 4, 2))
+    # Exact relu neurons can die, so use enough to solve xor
+    model = mlp.MLP((2, 8, 2))
     dataset = datasets.get_xor()
 
     model.train(*dataset, retries=5, error_break=0.002)
@@ -92,8 +93,11 @@ def test_mlp_convergence():
 def test_mlp_classifier():
     # Run for a couple of iterations
     # assert that new error is less than original
+    # Softplus hidden transfer, because 2 exact relu neurons can both die
     model = mlp.MLP(
-        (2, 2, 2), transfers=SoftmaxTransfer(), error_func=CrossEntropyError())
+        (2, 2, 2),
+        transfers=[SoftplusTransfer(), SoftmaxTransfer()],
+        error_func=CrossEntropyError())
     dataset = datasets.get_xor()
 
     error = validation.get_error(model, *dataset)
@@ -105,8 +109,11 @@ def test_mlp_classifier():
 def test_mlp_classifier_convergence():
     # Run until convergence
     # assert that network can converge
+    # Exact relu neurons can die, and the optimizer then converges
+    # on a plateau without retrying, so use more neurons, and seed
+    numpy.random.seed(0)
     model = mlp.MLP(
-        (2, 3, 2), transfers=SoftmaxTransfer(), error_func=CrossEntropyError())
+        (2, 8, 2), transfers=SoftmaxTransfer(), error_func=CrossEntropyError())
     dataset = datasets.get_and()
 
     model.train(*dataset, retries=5, error_break=0.002)
@@ -143,10 +150,10 @@ def test_mlp_obj_and_obj_jac_match_lin_out_mse():
         (s1, s2, s3), transfers=mlp.LinearTransfer(), error_func=MeanSquaredError()))
 
 
-def test_mlp_obj_and_obj_jac_match_relu_out_ce():
+def test_mlp_obj_and_obj_jac_match_softplus_out_ce():
     _check_obj_and_obj_jac_match(
         lambda s1, s2, s3: mlp.MLP(
-            (s1, s2, s3), transfers=mlp.ReluTransfer(), error_func=CrossEntropyError()),
+            (s1, s2, s3), transfers=SoftplusTransfer(), error_func=CrossEntropyError()),
         classification=True
     )
 
@@ -189,9 +196,9 @@ def test_mlp_jacobian_lin_out_mse():
         (s1, s2, s3), transfers=mlp.LinearTransfer(), error_func=MeanSquaredError()))
 
 
-def test_mlp_jacobian_relu_out_ce():
+def test_mlp_jacobian_softplus_out_ce():
     _check_jacobian(lambda s1, s2, s3: mlp.MLP(
-        (s1, s2, s3), transfers=mlp.ReluTransfer(), error_func=CrossEntropyError()))
+        (s1, s2, s3), transfers=SoftplusTransfer(), error_func=CrossEntropyError()))
 
 
 def test_mlp_jacobian_softmax_out_mse():
@@ -204,6 +211,26 @@ def test_mlp_jacobian_softmax_out_ce():
         (s1, s2, s3), transfers=SoftmaxTransfer(), error_func=CrossEntropyError()))
 
 
+def test_mlp_sparse_inputs():
+    from learning import sparse
+
+    model = mlp.MLP((6, 3, 2))
+    input_matrix = numpy.random.random((10, 6))
+    input_matrix[input_matrix < 0.7] = 0.0
+    target_matrix = numpy.random.random((10, 2))
+    sparse_matrix = sparse.CSRMatrix.from_dense(input_matrix)
+
+    assert numpy.allclose(
+        model.activate(sparse_matrix), model.activate(input_matrix))
+
+    sparse_error, sparse_jacobian = model._get_obj_jac(
+        model._get_flat_parameters(), sparse_matrix, target_matrix)
+    error, jacobian = model._get_obj_jac(model._get_flat_parameters(),
+                                         input_matrix, target_matrix)
+    assert helpers.approx_equal(sparse_error, error)
+    assert numpy.allclose(sparse_jacobian, jacobian)
+
+
 def _check_jacobian(make_model_func):
     attrs = random.randint(1, 10)
     outs = random.randint(1, 10)
@@ -246,10 +273,17 @@ def test_MLP_reset():
         numpy.random.seed(prev_seed)
 
 
+def test_mlp_post_train_clears_transfer_caches():
+    model = mlp.MLP((2, 3, 2), transfers=SoftplusTransfer())
+    model.logging = False
+
+    model.train(*datasets.get_xor(), iterations=1)
+    assert all(transfer._cache is None for transfer in model._transfers)
+
+
 ##############################
 # DropoutMLP
 ##############################
-# TODO: Test dropout MLP jacobians (with inactive neurons)
 def test_dropout_mlp():
     # Run for a couple of iterations
     # assert that new error is less than original
@@ -282,8 +316,15 @@ def test_dropout_mlp_convergence():
 def test_dropout_mlp_classifier():
     # Run for a couple of iterations
     # assert that new error is less than original
+    # Seeded, because every step has different per-sample masks,
+    # and the first order change initial step can extrapolate
+    # a step that saturates softmax for all inputs and neurons
+    numpy.random.seed(1)
     model = mlp.DropoutMLP(
-        (2, 8, 2), transfers=SoftmaxTransfer(), error_func=CrossEntropyError())
+        (2, 8, 2),
+        transfers=SoftmaxTransfer(),
+        error_func=CrossEntropyError(),
+        seed=1)
     dataset = datasets.get_and()
 
     error = validation.get_error(model, *dataset)
@@ -296,12 +337,15 @@ def test_dropout_mlp_classifier_convergence():
     # Run until convergence
     # assert that network can converge
     # Since XOR does not really need dropout, we use high probabilities
+    # Seeded, for the same reason as test_dropout_mlp_classifier
+    numpy.random.seed(0)
     model = mlp.DropoutMLP(
         (2, 8, 2),
         transfers=SoftmaxTransfer(),
         error_func=CrossEntropyError(),
         input_active_probability=1.0,
-        hidden_active_probability=0.9)
+        hidden_active_probability=0.9,
+        seed=0)
     dataset = datasets.get_and()
 
     # Error break lower than cutoff, since dropout may have different error
@@ -313,93 +357,229 @@ def test_dropout_mlp_classifier_convergence():
     assert validation.get_error(model, *dataset) <= 0.1
 
 
+def test_dropout_mlp_masks():
+    model = mlp.DropoutMLP(
+        (2, 4, 3), input_active_probability=0.5, hidden_active_probability=0.25)
+
+    masks = model._get_masks(10)
+    assert len(masks) == 2
+    assert masks[0].shape == (10, 2)
+    assert masks[1].shape == (10, 4)
+
+    # Inverted dropout, active values are scaled by 1 / active probability
+    assert set(masks[0].ravel()) <= set([0.0, 2.0])
+    assert set(masks[1].ravel()) <= set([0.0, 4.0])
+
+
+def test_dropout_mlp_masks_probability_one():
+    model = mlp.DropoutMLP(
+        (2, 4, 3), input_active_probability=1.0, hidden_active_probability=0.5)
+
+    masks = model._get_masks(10)
+    assert masks[0] is None
+    assert masks[1].shape == (10, 4)
+
+    model = mlp.DropoutMLP(
+        (2, 4, 3), input_active_probability=1.0, hidden_active_probability=1.0)
+    assert model._get_masks(10) == [None, None]
+
+
+def test_dropout_mlp_seed():
+    model = mlp.DropoutMLP((2, 4, 3), seed=0)
+    model_2 = mlp.DropoutMLP((2, 4, 3), seed=0)
+
+    for mask, mask_2 in zip(model._get_masks(10), model_2._get_masks(10)):
+        assert (mask == mask_2).all()
+
+
+def test_dropout_mlp_no_seed_uses_global_random_state():
+    model = mlp.DropoutMLP((2, 4, 3))
+    model_2 = mlp.DropoutMLP((2, 4, 3))
+
+    numpy.random.seed(0)
+    masks = [mask.copy() for mask in model._get_masks(10)]
+    numpy.random.seed(0)
+    for mask, mask_2 in zip(masks, model_2._get_masks(10)):
+        assert (mask == mask_2).all()
+
+
+def test_dropout_mlp_serialize_without_mask_buffers():
+    model = mlp.DropoutMLP((2, 4, 3))
+    model._get_masks(10)
+    assert model._mask_buffers is not None
+
+    assert mlp.DropoutMLP.unserialize(model.serialize())._mask_buffers is None
+
+
+def test_dropout_mlp_invalid_probability():
+    with pytest.raises(ValueError):
+        mlp.DropoutMLP((2, 4, 3), input_active_probability=0.0)
+    with pytest.raises(ValueError):
+        mlp.DropoutMLP((2, 4, 3), hidden_active_probability=1.5)
+
+
 def test_dropout_mlp_dropout():
     model = mlp.DropoutMLP(
         (2, 4, 3), input_active_probability=0.5, hidden_active_probability=0.5)
+    input_matrix = numpy.random.random((5, 2))
+    model._masks = model._get_masks(5)
 
-    # Only bias and active neurons should not be 0
-    model.train_step([[1, 1], [0.5, 0.5]], [[1, 1, 1], [0.5, 0.5, 0.5]])
+    model.activate(input_matrix)
+
+    # Dropped out inputs and neurons are 0, and others are scaled
+    assert (model._weight_inputs[0] == input_matrix * model._masks[0]).all()
+    assert helpers.approx_equal(model._weight_inputs[1],
+                                model._transfer_outputs[0] * model._masks[1])
 
-    # Should still have DropoutTransfers (until activation outside of training)
 
-    _validate_weight_inputs(model._weight_inputs[0],
-                            model._input_transfer._active_neurons)
-    for weight_inputs, transfer_func in zip(model._weight_inputs[1:-1],
-                                            model._transfers[:-1]):
-        _validate_weight_inputs(weight_inputs, transfer_func._active_neurons)
+@pytest.mark.parametrize('hidden_transfer', [SoftplusTransfer(), TanhTransfer()])
+def test_dropout_mlp_jacobian(hidden_transfer):
+    model = mlp.DropoutMLP(
+        (3, 4, 2),
+        transfers=[hidden_transfer, LinearTransfer()],
+        input_active_probability=0.5,
+        hidden_active_probability=0.5)
+    inp_matrix, tar_matrix = datasets.get_random_regression(5, 3, 2)
+    model._masks = model._get_masks(5)
+
+    helpers.check_gradient(
+        lambda xk: model._get_obj(xk, inp_matrix, tar_matrix),
+        lambda xk: model._get_obj_jac(xk, inp_matrix, tar_matrix)[1],
+        f_arg_tensor=model._get_flat_parameters(),
+        f_shape='scalar')
 
 
-def test_dropout_mlp_post_training():
-    # Post training should happen on first activate after training (train step),
-    # and not more than once, unless training begins again
+def test_dropout_mlp_activate_after_training():
+    # After training, all inputs and neurons are active,
+    # and weights are not rescaled
     model = mlp.DropoutMLP(
         (2, 4, 3), input_active_probability=0.5, hidden_active_probability=0.5)
 
-    # Train, modifying active neurons and weights
     model.train_step([[1, 1], [0.5, 0.5]], [[1, 1, 1], [0.5, 0.5, 0.5]])
-    pre_procedure_weights = copy.deepcopy(model._weight_matrices)
+    assert model._masks is None
+    trained_parameters = model._get_flat_parameters().copy()
+
+    plain_model = mlp.MLP((2, 4, 3))
+    plain_model._set_flat_parameters(trained_parameters)
+    assert helpers.approx_equal(
+        model.activate([[1, 1]]), plain_model.activate([[1, 1]]))
+    assert (model._get_flat_parameters() == trained_parameters).all()
+
+
+##############################
+# Chunking
+##############################
+def test_mlp_chunked_obj_jac_matches_full():
+    _check_chunked_obj_jac(lambda **kwargs: mlp.MLP((3, 4, 2), **kwargs))
 
-    # Should call post_training procedure after activate
-    model.activate([1, 1])
-    _validate_post_training(model, pre_procedure_weights)
 
-    # Weights should not change after another activate
-    model.activate([1, 1])
-    _validate_post_training(model, pre_procedure_weights)
+def test_mlp_optimizer_memory_budget_selects_optimizer():
+    # Default optimizer state must fit in optimizer_memory_budget
+    assert isinstance(
+        mlp.MLP((3, 4, 2), optimizer_memory_budget=2**20)._optimizer,
+        optimize.BFGS)
+    assert isinstance(
+        mlp.MLP((3, 4, 2), optimizer_memory_budget=21 * 8 * 4)._optimizer,
+        optimize.ConjugateGradient)
 
+    # memory_budget only limits activations
+    assert isinstance(
+        mlp.MLP((3, 4, 2), memory_budget=21 * 8 * 4)._optimizer, optimize.BFGS)
 
-def _validate_post_training(model, pre_procedure_weights):
-    for weight_matrix, orig_matrix in zip(model._weight_matrices,
-                                          pre_procedure_weights):
-        # Weights should be scaled by active probability
-        assert (weight_matrix == orig_matrix * model._hid_act_prob).all()
 
-    # All inputs and neurons should be active
-    assert not isinstance(model._input_transfer, mlp.DropoutTransfer)
-    for transfer_func in model._transfers:
-        assert not isinstance(transfer_func, mlp.DropoutTransfer)
+def test_mlp_chunked_obj_jac_memory_budget():
+    # 3 inputs, and 3 values for each of 6 neurons, is 21 float64 values per row
+    model = mlp.MLP((3, 4, 2), memory_budget=21 * 8 * 4)
+    assert model._get_chunk_rows(numpy.zeros((10, 3))) == 4
 
-    for weight_inputs in model._weight_inputs:
-        _validate_weight_inputs(weight_inputs, [1.0] * len(weight_inputs))
+    _check_chunked_obj_jac(
+        lambda **kwargs: mlp.MLP((3, 4, 2), **kwargs),
+        memory_budget=21 * 8 * 4)
 
 
-def _validate_weight_inputs(weight_inputs, active_neurons):
-    if len(weight_inputs.shape) == 1:
-        weight_inputs = numpy.array([weight_inputs])
+def test_dropout_mlp_chunked_obj_jac_matches_full():
+    def make_model(**kwargs):
+        model = mlp.DropoutMLP((3, 4, 2), seed=0, **kwargs)
+        # Chunks use the corresponding rows of masks
+        model._masks = model._get_masks(10)
+        return model
 
-    assert weight_inputs.shape[1] == len(active_neurons)
+    _check_chunked_obj_jac(make_model)
 
-    for input_row in weight_inputs:
-        for input_, active in zip(input_row, active_neurons):
-            if active == 0.0:
-                assert input_ == 0.0
-            elif active == 1.0:
-                assert input_ != 0.0
-            else:
-                assert 0, 'Invalid active neuron value'
 
+def test_mlp_sharded_obj_jac_matches_full(monkeypatch):
+    monkeypatch.setattr(chunking, 'MIN_SHARD_ROWS', 1)
+    _check_chunked_obj_jac(
+        lambda **kwargs: mlp.MLP((3, 4, 2), **kwargs), num_threads=3)
 
-####################
-# DropoutTransfer
-####################
-def test_dropout_transfer_probability_one():
-    length = random.randint(1, 20)
 
-    dropout_transfer = mlp.DropoutTransfer(mlp.LinearTransfer(), 1.0, length)
-    assert (dropout_transfer._active_neurons == numpy.array(
-        [1.0] * length)).all(), 'All should be active'
+def test_dropout_mlp_sharded_obj_jac_matches_full(monkeypatch):
+    monkeypatch.setattr(chunking, 'MIN_SHARD_ROWS', 1)
 
-    # Random input
-    input_vec = numpy.random.random(length)
-    assert (dropout_transfer(input_vec) == input_vec).all()
+    def make_model(**kwargs):
+        model = mlp.DropoutMLP((3, 4, 2), seed=0, **kwargs)
+        model._masks = model._get_masks(10)
+        return model
 
+    # Each shard is also evaluated in chunks
+    _check_chunked_obj_jac(make_model, num_threads=2, max_batch_rows=2)
 
-def test_dropout_transfer_probability_zero():
-    length = random.randint(1, 20)
 
-    # Can't actually be zero, but can be close enough
-    dropout_transfer = mlp.DropoutTransfer(mlp.LinearTransfer(), 1e-16, length)
+def test_mlp_sharded_train():
+    model = mlp.MLP((2, 4, 2), num_threads=2)
+    # Enough rows for 2 shards
+    dataset = datasets.get_xor()
+    dataset = (numpy.tile(dataset[0], (50, 1)),
+               numpy.tile(dataset[1], (50, 1)))
+    model.train(*dataset, iterations=10)
+    # Training does not leave model in an invalid state
+    assert model.activate(dataset[0]).shape == (200, 2)
+
+
+def test_mlp_invalid_num_threads():
+    with pytest.raises(ValueError):
+        mlp.MLP((2, 2), num_threads=0)
+
+
+def _check_chunked_obj_jac(make_model_func, **chunk_kwargs):
+    if not chunk_kwargs:
+        chunk_kwargs = {'max_batch_rows': 3}
+    model = make_model_func()
+    chunked_model = make_model_func(**chunk_kwargs)
+    parameters = model._get_flat_parameters()
+    inp_matrix, tar_matrix = datasets.get_random_regression(10, 3, 2)
+
+    error, jacobian = model._get_obj_jac(parameters, inp_matrix, tar_matrix)
+    chunked_error, chunked_jacobian = chunked_model._get_obj_jac(
+        parameters, inp_matrix, tar_matrix)
+    assert helpers.approx_equal(chunked_error, error)
+    assert helpers.approx_equal(chunked_jacobian, jacobian)
+
+    assert helpers.approx_equal(
+        chunked_model._get_obj(parameters, inp_matrix, tar_matrix), error)
+
+
+############################
+# Residual jacobian
+############################
+@pytest.mark.parametrize('transfers', [
+    None,
+    TanhTransfer(),
+    SoftmaxTransfer(),
+])
+def test_mlp_residual_jac(transfers):
+    model = mlp.MLP((3, 4, 5, 2), transfers=transfers)
+    helpers.check_residual_jac(model,
+                               *datasets.get_random_regression(10, 3, 2))
+
+
+def test_mlp_levenberg_marquardt():
+    dataset = datasets.get_random_regression(20, 3, 2)
+    model = mlp.MLP(
+        (3, 4, 2),
+        transfers=[SoftplusTransfer(), LinearTransfer()],
+        optimizer=optimize.LevenbergMarquardt())
+    initial_error = validation.get_error(model, *dataset)
+    model.train(*dataset, iterations=20)
+    assert validation.get_error(model, *dataset) < initial_error
 
-    # Should not allow zero active, defaults to 1
-    assert list(dropout_transfer._active_neurons).count(1.0) == 1
-    assert list(dropout_transfer._active_neurons).count(0.0) == length - 1
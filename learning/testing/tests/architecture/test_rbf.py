@@ -27,7 +27,7 @@ import random
 import pytest
 import numpy
 
-from learning import datasets, validation
+from learning import datasets, optimize, validation
 from learning.architecture import rbf
 
 from learning.testing import helpers
@@ -167,3 +167,45 @@ def _check_jacobian(make_model_func):
         f_arg_tensor=rbf._flatten_weights(model._weight_matrix,
                                           model._bias_vec),
         f_shape='scalar')
+
+
+def test_rbf_chunked_obj_jac_matches_full():
+    model = rbf.RBF(3, 4, 2)
+    model.logging = False
+    chunked_model = rbf.RBF(
+        3, 4, 2, clustering_model=model._clustering_model, max_batch_rows=3)
+    parameters = model._get_flat_parameters()
+    inp_matrix, tar_matrix = datasets.get_random_regression(10, 3, 2)
+
+    error, jacobian = model._get_obj_jac(parameters, inp_matrix, tar_matrix)
+    chunked_error, chunked_jacobian = chunked_model._get_obj_jac(
+        parameters, inp_matrix, tar_matrix)
+    assert helpers.approx_equal(chunked_error, error)
+    assert helpers.approx_equal(chunked_jacobian, jacobian)
+
+    assert helpers.approx_equal(
+        chunked_model._get_obj(parameters, inp_matrix, tar_matrix), error)
+
+
+def test_rbf_residual_jac():
+    helpers.check_residual_jac(
+        rbf.RBF(3, 4, 2), *datasets.get_random_regression(10, 3, 2))
+
+
+def test_rbf_residual_jac_scale_by_similarity():
+    helpers.check_residual_jac(
+        rbf.RBF(3, 4, 2, scale_by_similarity=True),
+        *datasets.get_random_regression(10, 3, 2))
+
+
+def test_rbf_levenberg_marquardt():
+    dataset = datasets.get_random_regression(20, 3, 2)
+    model = rbf.RBF(3, 4, 2, optimizer=optimize.LevenbergMarquardt())
+    model.logging = False
+    model.train(*dataset, iterations=20)
+
+    # Output layer is linear least squares, so Levenberg-Marquardt
+    # converges to the minimum in few iterations
+    _, jacobian = model._get_obj_jac(
+        numpy.copy(model._get_flat_parameters()), *dataset)
+    assert helpers.approx_equal(numpy.linalg.norm(jacobian), 0.0, tol=1e-4)
@@ -27,8 +27,8 @@ import random
 import numpy
 import pytest
 
-from learning import (datasets, validation, error, LinearRegressionModel,
-                      LogisticRegressionModel)
+from learning import (datasets, optimize, validation, error, sparse,
+                      LinearRegressionModel, LogisticRegressionModel)
 
 from learning.testing import helpers
 
@@ -125,6 +125,76 @@ def test_LogisticRegressionModel_jacobian():
     _check_jacobian(lambda a, o: LogisticRegressionModel(a, o))
 
 
+######################################
+# Sparse inputs
+######################################
+def test_LinearRegressionModel_sparse_inputs():
+    _check_sparse_inputs(LinearRegressionModel(6, 2))
+
+
+def test_LogisticRegressionModel_sparse_inputs():
+    _check_sparse_inputs(LogisticRegressionModel(6, 2))
+
+
+def _check_sparse_inputs(model):
+    input_matrix = numpy.random.random((10, 6))
+    input_matrix[input_matrix < 0.7] = 0.0
+    target_matrix = numpy.random.random((10, 2))
+    sparse_matrix = sparse.CSRMatrix.from_dense(input_matrix)
+
+    assert numpy.allclose(
+        model.activate(sparse_matrix), model.activate(input_matrix))
+
+    sparse_error, sparse_jacobian = model._get_obj_jac(
+        model._get_flat_parameters(), sparse_matrix, target_matrix)
+    error, jacobian = model._get_obj_jac(model._get_flat_parameters(),
+                                         input_matrix, target_matrix)
+    assert helpers.approx_equal(sparse_error, error)
+    assert numpy.allclose(sparse_jacobian, jacobian)
+
+
+######################################
+# Chunking
+######################################
+def test_LinearRegressionModel_chunked_obj_jac():
+    _check_chunked_obj_jac(
+        lambda **kwargs: LinearRegressionModel(
+            6, 2, penalty_func=error.L2Penalty(), **kwargs),
+        numpy.random.random((10, 6)))
+
+
+def test_LogisticRegressionModel_chunked_obj_jac():
+    _check_chunked_obj_jac(
+        lambda **kwargs: LogisticRegressionModel(6, 2, **kwargs),
+        numpy.random.random((10, 6)))
+
+
+def test_LinearRegressionModel_chunked_obj_jac_sparse_inputs():
+    input_matrix = numpy.random.random((10, 6))
+    input_matrix[input_matrix < 0.7] = 0.0
+    _check_chunked_obj_jac(
+        lambda **kwargs: LinearRegressionModel(6, 2, **kwargs),
+        sparse.CSRMatrix.from_dense(input_matrix))
+
+
+def _check_chunked_obj_jac(make_model_func, input_matrix):
+    model = make_model_func()
+    chunked_model = make_model_func(max_batch_rows=3)
+    flat_weights = model._get_flat_parameters()
+    target_matrix = numpy.random.random((10, 2))
+
+    error, jacobian = model._get_obj_jac(flat_weights, input_matrix,
+                                         target_matrix)
+    chunked_error, chunked_jacobian = chunked_model._get_obj_jac(
+        flat_weights, input_matrix, target_matrix)
+    assert helpers.approx_equal(chunked_error, error)
+    assert numpy.allclose(chunked_jacobian, jacobian)
+
+    assert helpers.approx_equal(
+        chunked_model._get_obj(flat_weights, input_matrix, target_matrix),
+        error)
+
+
 ######################################
 # Helpers
 ######################################
@@ -154,3 +224,52 @@ def _check_get_obj_equals_get_obj_jac(make_model_func):
     assert model._get_obj(flat_weights, inp_matrix,
                           tar_matrix) == model._get_obj_jac(
                               flat_weights, inp_matrix, tar_matrix)[0]
+
+
+def test_linear_regression_residual_jac():
+    helpers.check_residual_jac(
+        LinearRegressionModel(3, 2), *datasets.get_random_regression(10, 3, 2))
+
+
+def test_linear_regression_residual_jac_with_penalty():
+    helpers.check_residual_jac(
+        LinearRegressionModel(3, 2, penalty_func=error.L2Penalty()),
+        *datasets.get_random_regression(10, 3, 2))
+
+
+def test_linear_regression_residual_jac_sparse():
+    input_matrix, target_matrix = datasets.get_random_regression(10, 3, 2)
+    input_matrix[input_matrix < 0.5] = 0.0
+    helpers.check_residual_jac(
+        LinearRegressionModel(3, 2), sparse.CSRMatrix.from_dense(input_matrix),
+        target_matrix)
+
+
+def test_logistic_regression_residual_jac():
+    helpers.check_residual_jac(
+        LogisticRegressionModel(3, 2), *datasets.get_random_regression(10, 3, 2))
+
+
+def test_linear_regression_levenberg_marquardt():
+    input_matrix = numpy.random.random((20, 3))
+    target_matrix = input_matrix.dot(numpy.random.random((3, 2))) + 0.5
+
+    model = LinearRegressionModel(3, 2, optimizer=optimize.LevenbergMarquardt())
+    model.logging = False
+    model.train(input_matrix, target_matrix, iterations=20, error_break=1e-10)
+    assert validation.get_error(model, input_matrix, target_matrix) < 1e-6
+
+
+def test_optimizer_memory_budget_selects_optimizer():
+    # Default optimizer state must fit in optimizer_memory_budget
+    assert isinstance(
+        LinearRegressionModel(3, 2, optimizer_memory_budget=2**20)._optimizer,
+        optimize.BFGS)
+    assert isinstance(
+        LinearRegressionModel(3, 2, optimizer_memory_budget=64)._optimizer,
+        optimize.ConjugateGradient)
+
+    # memory_budget only limits outputs
+    assert isinstance(
+        LinearRegressionModel(3, 2, memory_budget=64)._optimizer,
+        optimize.BFGS)
@@ -0,0 +1,71 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Justin Lovinger
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+
+import os
+
+from learning import calculate
+from learning.benchmarks import micro, suite
+from learning.benchmarks import __main__ as benchmarks_main
+
+
+def test_verify_fast_paths():
+    assert micro.verify_fast_paths() == []
+
+
+def test_verify_fast_paths_mismatch(monkeypatch):
+    fast_paths = dict(calculate.FAST_PATHS)
+    fast_paths['softplus'] = (lambda x: calculate.softplus(x) + 1e-6,
+                              calculate._softplus_reference)
+    monkeypatch.setattr(calculate, 'FAST_PATHS', fast_paths)
+
+    assert micro.verify_fast_paths() == ['softplus']
+
+
+def test_micro_benchmarks_cover_calculate_and_transfer():
+    names = set(micro.MICRO_BENCHMARKS.keys())
+    assert 'calculate.protvecdiv' in names
+    assert 'transfer.ReluTransfer.derivative' in names
+
+
+def test_run_micro_benchmarks():
+    results = micro.run_micro_benchmarks(
+        names=sorted(micro.MICRO_BENCHMARKS.keys()),
+        shape=(10, 5),
+        number=1,
+        repeats=1)
+
+    assert sorted(results['benchmarks'].keys()) == sorted(
+        micro.MICRO_BENCHMARKS.keys())
+    for measurements in results['benchmarks'].values():
+        assert measurements['time'] >= 0.0
+
+
+def test_main_micro(tmpdir):
+    filename = os.path.join(str(tmpdir), 'results.json')
+    args = ['--micro', '--filter', 'calculate.softplus', '--repeats', '1']
+
+    assert benchmarks_main.main(args + ['--output', filename]) == 0
+    assert sorted(suite.load_results(filename)['benchmarks'].keys()) == [
+        'calculate.softplus', 'calculate.softplus_from_exp'
+    ]
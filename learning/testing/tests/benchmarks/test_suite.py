@@ -0,0 +1,174 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Justin Lovinger
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+
+import os
+
+import pytest
+
+from learning import MLP
+from learning.data import datasets
+from learning.benchmarks import suite
+from learning.benchmarks import __main__ as benchmarks_main
+
+
+def _make_benchmarks():
+    return [
+        suite.Benchmark('mlp/xor', lambda a, o: MLP((a, 2, o)),
+                        datasets.get_xor, {'iterations': 2})
+    ]
+
+
+def test_run_benchmarks():
+    results = suite.run_benchmarks(_make_benchmarks(), repeats=2)
+
+    measurements = results['benchmarks']['mlp/xor']
+    assert measurements['wall_time'] >= 0.0
+    assert measurements['iterations'] == 2
+    assert measurements['obj_evals'] > 0
+    assert measurements['jac_evals'] > 0
+    assert 0.0 <= measurements['error']
+    assert 'numpy' in results['environment']
+
+    # Runs are seeded
+    assert suite.run_benchmarks(_make_benchmarks())['benchmarks'][
+        'mlp/xor']['error'] == measurements['error']
+
+
+def test_run_benchmarks_isolated_peak_memory():
+    # Memory used by an earlier benchmark does not hide memory of the next
+    benchmarks = [
+        suite.Benchmark('a', lambda a, o: MLP((a, 2, o)),
+                        lambda: datasets.get_random_regression(100000, 20, 1),
+                        {'iterations': 1}),
+        suite.Benchmark('b', lambda a, o: MLP((a, 2, o)),
+                        lambda: datasets.get_random_regression(100000, 20, 1),
+                        {'iterations': 1})
+    ]
+    results = suite.run_benchmarks(benchmarks, isolate=True)
+
+    if results['benchmarks']['a']['peak_memory'] is None:
+        pytest.skip('peak memory is not available')
+    assert results['benchmarks']['b']['peak_memory'] > 0
+
+
+def test_run_benchmarks_isolated_error():
+    benchmarks = [suite.Benchmark('bad', lambda a, o: None, datasets.get_xor)]
+    with pytest.raises(RuntimeError):
+        suite.run_benchmarks(benchmarks, isolate=True)
+
+
+def test_run_benchmarks_duplicate_name():
+    with pytest.raises(ValueError):
+        suite.run_benchmarks(_make_benchmarks() + _make_benchmarks())
+
+
+def test_save_load_results(tmpdir):
+    results = suite.run_benchmarks(_make_benchmarks())
+    filename = os.path.join(str(tmpdir), 'results.json')
+
+    suite.save_results(results, filename)
+    assert suite.load_results(filename) == results
+
+
+def test_compare_results():
+    baseline = {
+        'benchmarks': {
+            'a': {
+                'wall_time': 1.0,
+                'obj_evals': 10,
+                'error': None
+            },
+            'b': {
+                'wall_time': 1.0
+            }
+        }
+    }
+    results = {
+        'benchmarks': {
+            'a': {
+                'wall_time': 1.1,
+                'obj_evals': 11,
+                'error': 0.5
+            },
+            'b': {
+                'wall_time': 2.0
+            },
+            'c': {
+                'wall_time': 100.0
+            }
+        }
+    }
+
+    assert suite.compare_results(results, baseline) == [{
+        'name': 'a',
+        'measurement': 'obj_evals',
+        'baseline': 10,
+        'current': 11,
+        'ratio': 1.1
+    }, {
+        'name': 'b',
+        'measurement': 'wall_time',
+        'baseline': 1.0,
+        'current': 2.0,
+        'ratio': 2.0
+    }]
+
+
+def test_compare_results_zero_baseline():
+    baseline = {'benchmarks': {'a': {'peak_memory': 0, 'obj_evals': 0}}}
+    results = {'benchmarks': {'a': {'peak_memory': 1024, 'obj_evals': 1}}}
+
+    # Only exact measurements are compared to a 0 baseline
+    assert suite.compare_results(results, baseline) == [{
+        'name': 'a',
+        'measurement': 'obj_evals',
+        'baseline': 0,
+        'current': 1,
+        'ratio': None
+    }]
+
+
+def test_main_baseline(tmpdir):
+    filename = os.path.join(str(tmpdir), 'results.json')
+    args = ['--filter', 'optimizer/lbfgs_wolfe', '--repeats', '1']
+
+    assert benchmarks_main.main(args + ['--output', filename]) == 0
+    assert suite.load_results(filename)['benchmarks'].keys() == [
+        'optimizer/lbfgs_wolfe'
+    ]
+
+    # Evaluations can not regress, from a baseline with many evaluations
+    baseline = suite.load_results(filename)
+    baseline['benchmarks']['optimizer/lbfgs_wolfe']['obj_evals'] = 1000
+    baseline['benchmarks']['optimizer/lbfgs_wolfe']['jac_evals'] = 1000
+    baseline['benchmarks']['optimizer/lbfgs_wolfe']['wall_time'] = 1000.0
+    baseline['benchmarks']['optimizer/lbfgs_wolfe']['activate_time'] = 1000.0
+    baseline['benchmarks']['optimizer/lbfgs_wolfe']['peak_memory'] = 2**40
+    suite.save_results(baseline, filename)
+    assert benchmarks_main.main(args + ['--baseline', filename]) == 0
+
+    # A baseline with fewer evaluations is a regression
+    baseline['benchmarks']['optimizer/lbfgs_wolfe']['obj_evals'] = 1
+    suite.save_results(baseline, filename)
+    assert benchmarks_main.main(args + ['--baseline', filename]) == 1
@@ -0,0 +1,129 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Justin Lovinger
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+
+import numpy
+import pytest
+
+from learning.data import datasets, process
+
+
+def test_convert_load_data_classification(tmpdir):
+    directory = str(tmpdir.join('iris'))
+    process.convert_data(datasets._filename_relative('iris.data'), directory, 0)
+
+    input_matrix, target_matrix = process.load_data(directory)
+    assert isinstance(input_matrix, numpy.memmap)
+    assert isinstance(target_matrix, numpy.memmap)
+
+    expected_inputs, expected_targets = datasets.get_iris()
+    assert numpy.array_equal(input_matrix, expected_inputs)
+    assert numpy.array_equal(target_matrix, expected_targets)
+
+    header = process.load_header(directory)
+    assert header['classes'] == [
+        'Iris-setosa', 'Iris-versicolor', 'Iris-virginica'
+    ]
+    assert numpy.allclose(header['input_min'], [4.3, 2.0, 1.0, 0.1])
+    assert numpy.allclose(header['input_max'], [7.9, 4.4, 6.9, 2.5])
+
+
+def test_convert_load_data_regression(tmpdir):
+    directory = str(tmpdir.join('calhousing'))
+    process.convert_data(
+        datasets._filename_relative('cal_housing.data'),
+        directory,
+        0,
+        classification=False)
+
+    input_matrix, target_matrix = process.load_data(directory, mmap_mode=None)
+    assert not isinstance(input_matrix, numpy.memmap)
+
+    expected_inputs, expected_targets = datasets.get_calhousing()
+    assert numpy.array_equal(input_matrix, expected_inputs)
+    assert numpy.array_equal(target_matrix, expected_targets)
+
+    header = process.load_header(directory)
+    assert header['classes'] is None
+    assert numpy.allclose(header['target_min'], [14999.0])
+    assert numpy.allclose(header['target_max'], [500001.0])
+
+
+def test_get_data_missing_values_and_spaces(tmpdir):
+    data_file = tmpdir.join('test.data')
+    data_file.write('  1  2 b\n'
+                    '3,?,a\n'
+                    '\n'
+                    '5  6,c  \n'
+                    '9,10,b\n')
+
+    input_matrix, target_matrix = process.get_data(str(data_file), 0)
+    assert numpy.array_equal(input_matrix, [[-1, -1], [0, 0], [1, 1]])
+    # 'a' is still a class, even though its only row has a missing value
+    assert numpy.array_equal(target_matrix, [[0, 1, 0], [0, 0, 1], [0, 1, 0]])
+
+
+def test_get_data_ragged_rows(tmpdir):
+    data_file = tmpdir.join('test.data')
+    data_file.write('1,2,a\n3,a\n')
+
+    with pytest.raises(ValueError):
+        process.get_data(str(data_file), 0)
+
+
+def test_get_data_chunks_classification():
+    file_name = datasets._filename_relative('breast-cancer-wisconsin.data')
+    chunks = list(process.get_data_chunks(file_name, 1, chunk_size=2000))
+    assert len(chunks) > 1
+
+    input_matrix, target_matrix, classes = process._read_data(
+        file_name, 1, -1, -1, True)
+    assert numpy.array_equal(
+        numpy.vstack([inputs for inputs, _ in chunks]), input_matrix)
+    assert numpy.array_equal(
+        numpy.vstack([targets for _, targets in chunks]), target_matrix)
+
+    # Given classes
+    chunks = list(
+        process.get_data_chunks(
+            file_name, 1, classes=classes, chunk_size=2000))
+    assert numpy.array_equal(
+        numpy.vstack([targets for _, targets in chunks]), target_matrix)
+
+    with pytest.raises(ValueError):
+        list(process.get_data_chunks(file_name, 1, classes=['2']))
+
+
+def test_get_data_chunks_regression():
+    file_name = datasets._filename_relative('cal_housing.data')
+    chunks = list(
+        process.get_data_chunks(
+            file_name, 0, classification=False, chunk_size=2**16))
+    assert len(chunks) > 1
+
+    input_matrix, target_matrix, _ = process._read_data(
+        file_name, 0, -1, -1, False)
+    assert numpy.array_equal(
+        numpy.vstack([inputs for inputs, _ in chunks]), input_matrix)
+    assert numpy.array_equal(
+        numpy.vstack([targets for _, targets in chunks]), target_matrix)
@@ -0,0 +1,123 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Justin Lovinger
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+
+import numpy
+import pytest
+
+from learning.data import datasets, process, stream
+
+
+def _stack_chunks(dataset):
+    chunks = list(dataset)
+    return (numpy.vstack([inputs for inputs, _ in chunks]),
+            numpy.vstack([targets for _, targets in chunks]))
+
+
+def test_GeneratorDataset():
+    def generator(num_chunks, chunk_rows=2):
+        for i in range(num_chunks):
+            yield numpy.full((chunk_rows, 1), i), numpy.full((chunk_rows, 1), -i)
+
+    dataset = stream.GeneratorDataset(generator, 3, chunk_rows=2)
+
+    # Can iterate more than once
+    for _ in range(2):
+        input_matrix, target_matrix = _stack_chunks(dataset)
+        assert (input_matrix.ravel() == [0, 0, 1, 1, 2, 2]).all()
+        assert (target_matrix.ravel() == [0, 0, -1, -1, -2, -2]).all()
+
+
+def test_MemmapDataset():
+    input_matrix = numpy.arange(10).reshape(10, 1)
+    target_matrix = -input_matrix
+
+    dataset = stream.MemmapDataset(input_matrix, target_matrix, chunk_rows=3)
+    assert [len(inputs) for inputs, _ in dataset] == [3, 3, 3, 1]
+
+    chunk_inputs, chunk_targets = _stack_chunks(dataset)
+    assert (chunk_inputs == input_matrix).all()
+    assert (chunk_targets == target_matrix).all()
+
+
+def test_MemmapDataset_shuffle():
+    input_matrix = numpy.arange(100).reshape(100, 1)
+    target_matrix = -input_matrix
+
+    dataset = stream.MemmapDataset(
+        input_matrix, target_matrix, chunk_rows=10, shuffle=True, seed=0)
+    chunk_inputs, chunk_targets = _stack_chunks(dataset)
+
+    # Every row once, in a different order
+    assert not (chunk_inputs == input_matrix).all()
+    assert (numpy.sort(chunk_inputs, axis=0) == input_matrix).all()
+    assert (chunk_targets == -chunk_inputs).all()
+
+
+def test_MemmapDataset_different_rows():
+    with pytest.raises(ValueError):
+        stream.MemmapDataset(numpy.zeros((3, 1)), numpy.zeros((2, 1)))
+
+
+def test_MemmapDataset_from_directory(tmpdir):
+    directory = str(tmpdir.join('iris'))
+    process.convert_data(datasets._filename_relative('iris.data'), directory, 0)
+
+    dataset = stream.MemmapDataset.from_directory(directory, chunk_rows=40)
+    input_matrix, target_matrix = _stack_chunks(dataset)
+
+    expected_inputs, expected_targets = datasets.get_iris()
+    assert (input_matrix == expected_inputs).all()
+    assert (target_matrix == expected_targets).all()
+
+
+def test_save_shards_ShardedDataset(tmpdir):
+    directory = str(tmpdir.join('shards'))
+    input_matrix = numpy.random.random((25, 3))
+    target_matrix = numpy.random.random((25, 2))
+
+    stream.save_shards(
+        stream.MemmapDataset(input_matrix, target_matrix, chunk_rows=10),
+        directory)
+
+    dataset = stream.ShardedDataset(directory)
+    assert [len(inputs) for inputs, _ in dataset] == [10, 10, 5]
+    chunk_inputs, chunk_targets = _stack_chunks(dataset)
+    assert (chunk_inputs == input_matrix).all()
+    assert (chunk_targets == target_matrix).all()
+
+    # Smaller chunks in each shard
+    dataset = stream.ShardedDataset(directory, chunk_rows=4)
+    assert [len(inputs)
+            for inputs, _ in dataset] == [4, 4, 2, 4, 4, 2, 4, 1]
+
+    # Shuffled shards
+    dataset = stream.ShardedDataset(directory, shuffle=True, seed=0)
+    chunk_inputs, _ = _stack_chunks(dataset)
+    assert (numpy.sort(chunk_inputs, axis=0) == numpy.sort(
+        input_matrix, axis=0)).all()
+
+
+def test_ShardedDataset_no_shards(tmpdir):
+    with pytest.raises(ValueError):
+        stream.ShardedDataset(str(tmpdir))
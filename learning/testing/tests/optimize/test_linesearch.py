@@ -23,7 +23,10 @@
 ###############################################################################
 
 import numpy
+import pytest
 
+from learning.optimize import (Problem, IncrPrevStep, BacktrackingLineSearch,
+                               WolfeLineSearch, NonmonotoneLineSearch)
 from learning.optimize import linesearch
 
 
@@ -82,3 +85,154 @@ def _curvature_test(xk, step_size):
 
     return linesearch._curvature_condition(
         df(xk), -df(xk), df(xk - step_size * df(xk)), 0.1)
+
+
+#########################
+# Evaluation budget
+#########################
+def test_backtracking_line_search_max_evaluations():
+    # Ascent direction never satisfies armijo
+    problem, evaluations = _counted_square_problem()
+    step_size = BacktrackingLineSearch(max_evaluations=5)(
+        numpy.array([1.0]), 1.0, numpy.array([2.0]), numpy.array([1.0]),
+        problem)
+
+    assert len(evaluations) == 5
+    # No step improved, next smaller trial step size is returned
+    assert 0.0 < step_size < min(evaluations)
+
+
+def test_wolfe_line_search_max_evaluations():
+    # Budget is shared by bracketing and zoom
+    problem, evaluations = _counted_square_problem()
+    step_size = WolfeLineSearch(max_evaluations=5)(
+        numpy.array([1.0]), 1.0, numpy.array([2.0]), numpy.array([1.0]),
+        problem)
+
+    assert len(evaluations) == 5
+    assert 0.0 < step_size < min(evaluations)
+
+
+def test_wolfe_line_search_max_evaluations_returns_best_step():
+    # Only one evaluation, initial step improves but does not satisfy curvature
+    problem, evaluations = _counted_square_problem()
+    step_size = WolfeLineSearch(
+        max_evaluations=1,
+        initial_step_getter=IncrPrevStep(incr_rate=1.0, upper_bound=0.1))(
+            numpy.array([1.0]), 1.0, numpy.array([2.0]), numpy.array([-2.0]),
+            problem)
+
+    assert len(evaluations) == 1
+    assert step_size == 0.1
+
+
+def test_evaluation_budget_fallback():
+    budget = linesearch._EvaluationBudget(1.0, 3)
+    assert budget.fallback(0.5) == 0.5
+
+    budget.add(1.0, 2.0)
+    budget.add(0.5, 0.5)
+    assert not budget.exhausted()
+    budget.add(0.25, 0.75)
+    assert budget.exhausted()
+
+    assert budget.fallback(0.125) == 0.5
+
+
+def test_line_search_max_evaluations_invalid():
+    with pytest.raises(ValueError):
+        BacktrackingLineSearch(max_evaluations=0)
+    with pytest.raises(ValueError):
+        WolfeLineSearch(max_evaluations=0)
+    with pytest.raises(ValueError):
+        NonmonotoneLineSearch(max_evaluations=0)
+
+
+def _counted_square_problem():
+    """Return problem for f(x) = x^2, and list of evaluated step sizes from x = 1."""
+    evaluations = []
+
+    def obj_jac_func(vec):
+        evaluations.append(vec[0] - 1.0)
+        return vec[0]**2, 2.0 * vec
+
+    return Problem(obj_jac_func=obj_jac_func), evaluations
+
+
+#########################
+# Nonmonotone line search
+#########################
+@pytest.mark.parametrize('reference', ['max', 'average'])
+def test_nonmonotone_line_search_accepts_increase(reference):
+    # Step from x = 1 to x = -1 does not decrease f(x) = x^2,
+    # but is accepted because of previous larger objective value
+    line_search = _unit_step_nonmonotone(reference)
+    problem = Problem(
+        obj_func=lambda vec: vec[0]**2, jac_func=lambda vec: 2.0 * vec)
+
+    _call_square(line_search, 3.0, problem)
+    assert _call_square(line_search, 1.0, problem) == 1.0
+
+    # Monotone line search rejects the same step
+    assert BacktrackingLineSearch(
+        c_1=1e-4,
+        initial_step_getter=IncrPrevStep(incr_rate=1.0, lower_bound=1.0))(
+            numpy.array([1.0]), 1.0, numpy.array([2.0]), numpy.array([-2.0]),
+            problem) < 1.0
+
+
+@pytest.mark.parametrize('reference', ['max', 'average'])
+def test_nonmonotone_line_search_problem_changed(reference):
+    # Objective values of previous problem are forgotten
+    line_search = _unit_step_nonmonotone(reference)
+    problem = Problem(
+        obj_func=lambda vec: vec[0]**2, jac_func=lambda vec: 2.0 * vec)
+
+    _call_square(line_search, 3.0, problem)
+    line_search.problem_changed()
+    assert _call_square(line_search, 1.0, problem) < 1.0
+
+
+def test_nonmonotone_line_search_max_memory():
+    # Only the last memory objective values are the reference
+    line_search = NonmonotoneLineSearch(
+        memory=2, initial_step_getter=IncrPrevStep(incr_rate=1.0, lower_bound=1.0))
+    problem = Problem(
+        obj_func=lambda vec: vec[0]**2, jac_func=lambda vec: 2.0 * vec)
+
+    _call_square(line_search, 3.0, problem)
+    _call_square(line_search, 0.5, problem)
+    assert _call_square(line_search, 1.0, problem) < 1.0
+
+
+def test_nonmonotone_line_search_max_evaluations_improves_objective():
+    # Fallback step must decrease f(x_k), not only the reference value
+    line_search = NonmonotoneLineSearch(
+        c_1=0.5,
+        initial_step_getter=IncrPrevStep(
+            incr_rate=1.0, lower_bound=1.9, upper_bound=1.9),
+        max_evaluations=1)
+    problem = Problem(
+        obj_func=lambda vec: vec[0]**2, jac_func=lambda vec: 2.0 * vec)
+
+    _call_square(line_search, 3.0, problem)
+    # f(1 - 1.9 * 2) = 7.84 is less than reference 9, but more than f(1) = 1
+    assert _call_square(line_search, 1.0, problem) == 0.95
+
+
+def test_nonmonotone_line_search_invalid_reference():
+    with pytest.raises(ValueError):
+        NonmonotoneLineSearch(reference='min')
+
+
+def _unit_step_nonmonotone(reference):
+    """Return NonmonotoneLineSearch trying step size 1 first."""
+    return NonmonotoneLineSearch(
+        reference=reference, initial_step_getter=IncrPrevStep(incr_rate=1.0, lower_bound=1.0))
+
+
+def _call_square(line_search, x, problem):
+    """Return step size for steepest descent on f(x) = x^2."""
+    return line_search(
+        numpy.array([x]), x**2, numpy.array([2.0 * x]), numpy.array([-2.0 * x]),
+        problem)
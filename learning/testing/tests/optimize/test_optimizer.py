@@ -23,11 +23,13 @@
 ###############################################################################
 
 import numpy
+import pytest
 
 from learning import optimize
 from learning.optimize import (Problem, BacktrackingLineSearch,
-                               WolfeLineSearch, BFGS, LBFGS, SteepestDescent,
-                               SteepestDescentMomentum)
+                               WolfeLineSearch, NonmonotoneLineSearch, BFGS,
+                               LBFGS, SteepestDescent, SteepestDescentMomentum,
+                               ConjugateGradient, LevenbergMarquardt)
 from learning.optimize import optimizer
 
 from learning.testing import helpers
@@ -62,6 +64,22 @@ def test_bfgs_eq():
     assert helpers.approx_equal(H_kp1.dot(y_k), s_k)
 
 
+def test_BFGS_problem_changed_keeps_inv_hessian():
+    my_optimizer = BFGS(step_size_getter=WolfeLineSearch())
+    vec = _optimize_iterations(my_optimizer, _sphere_problem(0.0), 3)
+    prev_step = my_optimizer._prev_step
+    assert my_optimizer._prev_inv_hessian is not None
+
+    my_optimizer.problem_changed()
+    assert my_optimizer.jacobian is None
+    my_optimizer.next(_sphere_problem(1.0), vec)
+
+    # Secant condition holds for jacobian difference on the new problem,
+    # y_k = jac(x_k) - jac(x_{k-1}) = 2 s_k
+    assert helpers.approx_equal(
+        my_optimizer._prev_inv_hessian.dot(2.0 * prev_step), prev_step)
+
+
 #########################
 # L-BFGS
 #########################
@@ -127,6 +145,144 @@ def test_LBFGS_non_smooth_gradient():
     assert obj_value <= 1e-10
 
 
+def test_LBFGS_problem_changed_keeps_diffs():
+    my_optimizer = LBFGS(step_size_getter=WolfeLineSearch())
+    vec = _optimize_iterations(my_optimizer, _sphere_problem(0.0), 3)
+    num_diffs = len(my_optimizer._prev_param_diffs)
+    prev_step = my_optimizer._prev_step
+
+    my_optimizer.problem_changed()
+    assert my_optimizer.jacobian is None
+    my_optimizer.next(_sphere_problem(1.0), vec)
+
+    # Jacobian difference is computed on the new problem only
+    assert len(my_optimizer._prev_param_diffs) == min(
+        num_diffs + 1, my_optimizer._num_remembered_iterations)
+    assert helpers.approx_equal(my_optimizer._prev_jac_diffs[-1],
+                                2.0 * prev_step)
+
+
+#########################
+# Conjugate Gradient
+#########################
+def test_conjugate_gradient_polak_ribiere_plus():
+    check_optimize_sphere_function(
+        ConjugateGradient(beta_func=optimizer.beta_polak_ribiere_plus))
+
+
+def test_conjugate_gradient_hestenes_stiefel():
+    check_optimize_sphere_function(
+        ConjugateGradient(beta_func=optimizer.beta_hestenes_stiefel))
+
+
+def test_conjugate_gradient_ill_conditioned_quadratic():
+    # Conjugate directions handle ill conditioning
+    # much better than steepest descent
+    scales = numpy.array([1.0, 10.0, 100.0])
+    problem = Problem(
+        obj_func=lambda vec: numpy.sum(scales * vec**2),
+        jac_func=lambda vec: 2.0 * scales * vec)
+
+    obj_values = []
+    for my_optimizer in [ConjugateGradient(), SteepestDescent()]:
+        vec = numpy.array([1.0, 1.0, 1.0])
+        for _ in range(20):
+            obj_value, vec = my_optimizer.next(problem, vec)
+        obj_values.append(obj_value)
+    assert obj_values[0] < obj_values[1] / 5.0
+
+
+def test_conjugate_gradient_restarts():
+    my_optimizer = ConjugateGradient(iterations_per_restart=2)
+    jacobian = numpy.array([1.0, 0.0])
+
+    # First iteration is steepest descent
+    assert (my_optimizer._get_step_dir(jacobian) == -jacobian).all()
+    my_optimizer._prev_jacobian = jacobian
+    my_optimizer._prev_step_dir = -jacobian
+
+    # Orthogonal jacobians keep conjugacy
+    step_dir = my_optimizer._get_step_dir(numpy.array([0.0, 1.0]))
+    assert step_dir[0] != 0.0
+
+    # Restart after iterations_per_restart
+    next_jacobian = numpy.array([0.0, 1.0])
+    my_optimizer._prev_jacobian = numpy.array([1.0, 0.0])
+    assert (my_optimizer._get_step_dir(next_jacobian) == -next_jacobian).all()
+
+    # Restart when consecutive jacobians are far from orthogonal
+    my_optimizer._prev_jacobian = numpy.array([1.0, 1.0])
+    assert (my_optimizer._get_step_dir(next_jacobian) == -next_jacobian).all()
+
+
+def test_conjugate_gradient_problem_changed_restarts():
+    my_optimizer = ConjugateGradient()
+    vec = _optimize_iterations(my_optimizer, _sphere_problem(0.0), 2)
+    my_optimizer.problem_changed()
+    assert my_optimizer._prev_jacobian is None
+    assert my_optimizer._prev_step_dir is None
+    my_optimizer.next(_sphere_problem(1.0), vec)
+
+
+#########################
+# Levenberg-Marquardt
+#########################
+def test_levenberg_marquardt_rosenbrock():
+    # Rosenbrock function, as sum of squares
+    # 100 (y - x^2)^2 + (1 - x)^2
+    def residual_jac(vec):
+        return (numpy.array([10.0 * (vec[1] - vec[0]**2), 1.0 - vec[0]]),
+                numpy.array([[-20.0 * vec[0], 10.0], [-1.0, 0.0]]))
+
+    problem = Problem(
+        obj_func=lambda vec: residual_jac(vec)[0].dot(residual_jac(vec)[0]),
+        residual_jac_func=residual_jac)
+
+    my_optimizer = LevenbergMarquardt()
+    vec = numpy.array([-1.2, 1.0])
+    for _ in range(50):
+        obj_value, vec = my_optimizer.next(problem, vec)
+    assert obj_value < 1e-10
+    assert helpers.approx_equal(vec, [1.0, 1.0])
+
+
+def test_levenberg_marquardt_jacobian():
+    problem = Problem(
+        obj_func=lambda vec: vec.dot(vec),
+        residual_jac_func=lambda vec: (vec, numpy.identity(2)))
+    my_optimizer = LevenbergMarquardt()
+    my_optimizer.next(problem, numpy.array([1.0, 2.0]))
+    # Jacobian of objective is 2 J^T r
+    assert helpers.approx_equal(my_optimizer.jacobian, [2.0, 4.0])
+
+
+def test_levenberg_marquardt_requires_residual_jac_func():
+    with pytest.raises(ValueError):
+        LevenbergMarquardt().next(
+            _sphere_problem(0.0), numpy.array([1.0, 1.0]))
+
+
+#########################
+# make_optimizer
+#########################
+def test_make_optimizer():
+    assert isinstance(optimize.make_optimizer(10), BFGS)
+    assert isinstance(optimize.make_optimizer(1000), LBFGS)
+
+
+def test_make_optimizer_memory_budget():
+    # BFGS matrix does not fit
+    assert isinstance(
+        optimize.make_optimizer(100, memory_budget=100 * 100 * 8), LBFGS)
+    # L-BFGS remembered iterations do not fit
+    assert isinstance(
+        optimize.make_optimizer(1000, memory_budget=5 * 1000 * 8),
+        ConjugateGradient)
+
+    with pytest.raises(ValueError):
+        optimize.make_optimizer(10, memory_budget=0)
+
+
 ############################
 # Backtracking Line Search
 ############################
@@ -148,9 +304,57 @@ def test_steepest_descent_wolfe_line_search():
         SteepestDescent(step_size_getter=WolfeLineSearch()))
 
 
+############################
+# Nonmonotone Line Search
+############################
+def test_steepest_descent_nonmonotone_line_search_max():
+    check_optimize_sphere_function(
+        SteepestDescent(step_size_getter=NonmonotoneLineSearch()))
+
+
+def test_steepest_descent_nonmonotone_line_search_average():
+    check_optimize_sphere_function(
+        SteepestDescent(
+            step_size_getter=NonmonotoneLineSearch(reference='average')))
+
+
+def test_BFGS_nonmonotone_line_search():
+    check_optimize_sphere_function(
+        BFGS(step_size_getter=NonmonotoneLineSearch()))
+
+
+@pytest.mark.parametrize('optimizer_class', [
+    SteepestDescent, SteepestDescentMomentum, BFGS, LBFGS, ConjugateGradient
+])
+def test_problem_changed_clears_nonmonotone_reference(optimizer_class):
+    line_search = NonmonotoneLineSearch()
+    my_optimizer = optimizer_class(step_size_getter=line_search)
+    my_optimizer.next(_sphere_problem(numpy.array([0.0, 0.0])),
+                      numpy.array([10.0, -5.0]))
+    assert len(line_search._prev_objs) == 1
+
+    my_optimizer.problem_changed()
+    assert len(line_search._prev_objs) == 0
+
+
 ######################
 # Helpers
 ######################
+def _sphere_problem(center):
+    """Return sphere function problem, with minimum at center."""
+    return Problem(
+        obj_func=lambda vec: numpy.sum((vec - center)**2),
+        jac_func=lambda vec: 2.0 * (vec - center))
+
+
+def _optimize_iterations(my_optimizer, problem, iterations):
+    """Return parameters after iterations of my_optimizer."""
+    vec = numpy.array([10.0, -5.0])
+    for _ in range(iterations):
+        _, vec = my_optimizer.next(problem, vec)
+    return vec
+
+
 def check_optimize_sphere_function(my_optimizer):
     # Attempt to optimize a simple sphere function
     f = lambda vec: vec[0]**2 + vec[1]**2
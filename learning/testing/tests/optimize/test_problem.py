@@ -114,3 +114,16 @@ def test_optimizer_get_obj_jac_hess_individual_obj_jac_hess():
         jac_func=lambda x: x + 1,
         hess_func=lambda x: x + 2)
     assert tuple(problem.get_obj_jac_hess(1)) == (1, 2, 3)
+
+
+##################################
+# Problem.get_residual_jac
+##################################
+def test_optimizer_get_residual_jac_residual_jac_func():
+    problem = Problem(residual_jac_func=lambda x: (x, x + 1))
+    assert tuple(problem.get_residual_jac(1)) == (1, 2)
+
+
+def test_optimizer_get_residual_jac_no_residual_jac_func():
+    problem = Problem(obj_func=lambda x: x)
+    assert tuple(problem.get_residual_jac(1)) == (None, None)
@@ -24,6 +24,7 @@
 
 import pytest
 import copy
+import logging
 import random
 
 import numpy
@@ -182,6 +183,118 @@ def test_select_random(monkeypatch):
         assert (tar_vec == target_matrix[0]).all()  # Due to monkeypatch
 
 
+def test_EpochSelector_covers_epoch():
+    input_matrix, target_matrix = datasets.get_random_classification(
+        10, 2, 2)
+    selector = base.EpochSelector(size=3, seed=0)
+
+    # Each row is selected once per epoch
+    selected_inputs = [selector(input_matrix, target_matrix)[0]
+                       for _ in range(4)]
+    assert [len(inputs) for inputs in selected_inputs] == [3, 3, 3, 1]
+    assert selector.epoch == 0
+    assert (numpy.sort(numpy.vstack(selected_inputs), axis=0) ==
+            numpy.sort(input_matrix, axis=0)).all()
+
+    # Next call starts next epoch
+    selector(input_matrix, target_matrix)
+    assert selector.epoch == 1
+
+
+def test_EpochSelector_matches_targets():
+    input_matrix = numpy.arange(20.0).reshape(10, 2)
+    target_matrix = numpy.arange(10.0).reshape(10, 1)
+
+    for copy_dataset in [True, False]:
+        selector = base.EpochSelector(size=4, copy_dataset=copy_dataset)
+        for _ in range(5):
+            batch_inputs, batch_targets = selector(input_matrix, target_matrix)
+            assert (batch_inputs[:, 0] == 2 * batch_targets[:, 0]).all()
+
+
+def test_EpochSelector_drop_last():
+    input_matrix, target_matrix = datasets.get_random_classification(
+        10, 2, 2)
+    selector = base.EpochSelector(size=3, drop_last=True)
+
+    assert [len(selector(input_matrix, target_matrix)[0])
+            for _ in range(6)] == [3] * 6
+
+
+def test_EpochSelector_seed():
+    input_matrix, target_matrix = datasets.get_random_classification(
+        10, 2, 2)
+
+    assert (base.EpochSelector(size=3, seed=1)(input_matrix, target_matrix)[0]
+            == base.EpochSelector(size=3, seed=1)(input_matrix,
+                                                   target_matrix)[0]).all()
+
+
+def test_EpochSelector_global_seed():
+    input_matrix, target_matrix = datasets.get_random_classification(
+        10, 2, 2)
+
+    # Without a seed, the global random state is used
+    numpy.random.seed(1)
+    first_batch = base.EpochSelector(size=3)(input_matrix, target_matrix)[0]
+    numpy.random.seed(1)
+    assert (base.EpochSelector(size=3)(input_matrix, target_matrix)[0] ==
+            first_batch).all()
+
+
+def test_EpochSelector_stratify():
+    input_matrix = numpy.random.random((100, 2))
+    # 80 of class 0, 20 of class 1
+    target_matrix = numpy.array([[1.0, 0.0]] * 80 + [[0.0, 1.0]] * 20)
+    selector = base.EpochSelector(size=10, stratify=True)
+
+    for _ in range(20):
+        _, batch_targets = selector(input_matrix, target_matrix)
+        assert 1 <= numpy.sum(batch_targets[:, 1]) <= 3
+
+
+def test_PrefetchSelector_same_order():
+    input_matrix, target_matrix = datasets.get_random_classification(
+        20, 2, 2)
+
+    selector = base.EpochSelector(size=3, seed=0)
+    expected = [selector(input_matrix, target_matrix) for _ in range(10)]
+
+    prefetch_selector = base.PrefetchSelector(
+        base.EpochSelector(size=3, seed=0), num_prefetch=3)
+    for expected_inputs, expected_targets in expected:
+        batch_inputs, batch_targets = prefetch_selector(
+            input_matrix, target_matrix)
+        assert (batch_inputs == expected_inputs).all()
+        assert (batch_targets == expected_targets).all()
+    prefetch_selector.close()
+
+
+def test_PrefetchSelector_transform():
+    input_matrix, target_matrix = datasets.get_random_classification(
+        20, 2, 2)
+
+    prefetch_selector = base.PrefetchSelector(
+        base.EpochSelector(size=5, seed=0),
+        transform=lambda X, Y: (2.0 * X, Y))
+    batch_inputs, _ = prefetch_selector(input_matrix, target_matrix)
+    prefetch_selector.close()
+
+    expected_inputs, _ = base.EpochSelector(size=5, seed=0)(input_matrix,
+                                                           target_matrix)
+    assert (batch_inputs == 2.0 * expected_inputs).all()
+
+
+def test_PrefetchSelector_error():
+    def bad_selection_func(input_matrix, target_matrix):
+        raise KeyError()
+
+    prefetch_selector = base.PrefetchSelector(bad_selection_func)
+    with pytest.raises(KeyError):
+        prefetch_selector(*datasets.get_xor())
+    prefetch_selector.close()
+
+
 #############################
 # Model.stochastic_train
 #############################
@@ -191,9 +304,11 @@ def test_Model_stochastic_train():
 
     dataset = datasets.get_iris()
 
+    # Softplus, because 3 exact relu neurons can die on mini-batches
     model = MLP(
         (len(dataset[0][0]), 3, len(dataset[1][0])),
-        transfers=transfer.SoftmaxTransfer(),
+        transfers=[transfer.SoftplusTransfer(),
+                   transfer.SoftmaxTransfer()],
         error_func=error.CrossEntropyError())
 
     # Model should be able to converge with mini-batches
@@ -206,6 +321,155 @@ def test_Model_stochastic_train():
     assert validation.get_error(model, *dataset) <= 0.03
 
 
+def test_Model_stochastic_train_shares_logging_callback(caplog):
+    from learning import callbacks
+
+    class StepModel(helpers.EmptyModel):
+        def train_step(self, input_matrix, target_matrix):
+            return 1.0
+
+    caplog.set_level(logging.INFO, logger=callbacks.LOGGER_NAME)
+    model = StepModel()
+    model.stochastic_train(
+        *datasets.get_xor(),
+        max_iterations=5,
+        error_break=0.0,
+        train_kwargs={'iterations': 3})
+
+    # Logging is rate limited over all mini-batches, not reset for each
+    assert len([
+        record for record in caplog.records
+        if record.getMessage().startswith('Iteration')
+    ]) == 1
+    assert model._logging_callback is None
+
+
+def test_Model_stochastic_train_keep_optimizer_state():
+    from learning import optimize, LinearRegressionModel
+
+    class RecordingLBFGS(optimize.LBFGS):
+        def __init__(self):
+            super(RecordingLBFGS, self).__init__()
+            self.calls = []
+
+        def reset(self):
+            super(RecordingLBFGS, self).reset()
+            self.calls.append('reset')
+
+        def problem_changed(self):
+            super(RecordingLBFGS, self).problem_changed()
+            self.calls.append('problem_changed')
+
+    input_matrix = numpy.random.random((100, 2))
+    target_matrix = 0.5 * input_matrix[:, :1] - 0.25 * input_matrix[:, 1:]
+
+    optimizer = RecordingLBFGS()
+    model = LinearRegressionModel(2, 1, optimizer=optimizer)
+    model.logging = False
+    model.stochastic_train(
+        input_matrix,
+        target_matrix,
+        max_iterations=3,
+        error_break=0.0,
+        train_kwargs={'iterations': 2},
+        reset_optimizer=False)
+
+    assert optimizer.calls == ['problem_changed'] * 3
+    # Curvature is learned across mini-batches
+    assert len(optimizer._prev_param_diffs) > 0
+
+    # Optimizer is reset after train, outside of stochastic_train
+    model.train(input_matrix, target_matrix, iterations=1)
+    assert optimizer.calls[-1] == 'reset'
+
+
+def test_Model_stochastic_train_prefetch():
+    from learning import transfer, error, validation, MLP
+
+    dataset = datasets.get_iris()
+
+    model = MLP(
+        (len(dataset[0][0]), 3, len(dataset[1][0])),
+        transfers=transfer.SoftmaxTransfer(),
+        error_func=error.CrossEntropyError())
+    model.logging = False
+
+    pattern_selection_func = base.PrefetchSelector(
+        base.EpochSelector(size=30))
+    model.stochastic_train(
+        *dataset,
+        max_iterations=5,
+        pattern_selection_func=pattern_selection_func,
+        train_kwargs={'iterations': 5})
+    pattern_selection_func.close()
+
+    assert model.iteration == 5
+
+
+def test_Model_stochastic_train_sparse_inputs():
+    from learning import sparse, validation, LinearRegressionModel
+
+    input_matrix = numpy.random.random((100, 20))
+    input_matrix[input_matrix < 0.8] = 0.0
+    target_matrix = 0.5 * input_matrix[:, :2]
+    sparse_matrix = sparse.CSRMatrix.from_dense(input_matrix)
+
+    model = LinearRegressionModel(20, 2)
+    model.logging = False
+    model.stochastic_train(
+        sparse_matrix,
+        target_matrix,
+        error_break=0.0001,
+        train_kwargs={'iterations': 10})
+
+    assert validation.get_error(model, sparse_matrix, target_matrix) <= 0.0001
+
+
+def test_Model_stochastic_train_chunked_dataset():
+    from learning import validation, LinearRegressionModel
+    from learning.data import stream
+
+    input_matrix = numpy.random.random((100, 2))
+    target_matrix = 0.5 * input_matrix[:, :1] - 0.25 * input_matrix[:, 1:]
+    dataset = stream.MemmapDataset(
+        input_matrix, target_matrix, chunk_rows=30, shuffle=True)
+
+    model = LinearRegressionModel(2, 1)
+    model.logging = False
+    model.stochastic_train(
+        dataset, error_break=0.0001, train_kwargs={'iterations': 10})
+
+    assert validation.get_error(model, dataset) <= 0.0001
+    assert validation.get_error(model, input_matrix,
+                                target_matrix) <= 0.0001
+
+
+def test_Model_stochastic_train_chunked_dataset_selection_func():
+    from learning.data import stream
+
+    input_matrix = numpy.random.random((100, 2))
+    target_matrix = numpy.random.random((100, 1))
+    dataset = stream.MemmapDataset(input_matrix, target_matrix, chunk_rows=50)
+
+    selected = []
+
+    def pattern_selection_func(chunk_inputs, chunk_targets):
+        selected.append(chunk_inputs)
+        return chunk_inputs[:10], chunk_targets[:10]
+
+    model = helpers.EmptyModel()
+    model.stochastic_train(
+        dataset,
+        max_iterations=3,
+        pattern_selection_func=pattern_selection_func)
+
+    # Chunks are given in turn, starting again after the last chunk
+    assert len(selected) == 3
+    assert (selected[0] == input_matrix[:50]).all()
+    assert (selected[1] == input_matrix[50:]).all()
+    assert (selected[2] == input_matrix[:50]).all()
+
+
 ####################
 # Model.train
 ####################
@@ -271,6 +535,239 @@ def test_model_train_retry():
     assert 0
 
 
+def test_Model_train_retry_processes():
+    """Attempts can be trained in parallel processes."""
+    from learning import validation, MLP
+
+    dataset = datasets.get_xor()
+    # Exact relu neurons can die, so use enough to solve xor
+    model = MLP((2, 8, 2))
+    model.logging = False
+
+    model.train(*dataset, retries=5, error_break=0.002, retry_processes=2)
+    assert validation.get_error(model, *dataset) <= 0.02
+
+
+def test_Model_train_retry_processes_no_converge():
+    """Best attempt is kept, when no attempt converges."""
+    from learning import MLP, LinearTransfer, SoftplusTransfer
+
+    dataset = datasets.get_xor()
+    # Softplus, because dead relu neurons converge with a 0 jacobian
+    model = MLP((2, 2, 2), transfers=[SoftplusTransfer(), LinearTransfer()])
+    model.logging = False
+
+    # No attempt can converge with error_break=0
+    error = model.train(
+        *dataset,
+        iterations=5,
+        retries=3,
+        error_break=0.0,
+        error_improve_iters=10,
+        retry_processes=2)
+    assert not model.converged
+    assert model.iteration == 5
+    assert 0.0 < error < float('inf')
+
+
+class _RandomErrorModel(helpers.EmptyModel):
+    """Model with a random error, that converges when error is high."""
+
+    def train_step(self, input_matrix, target_matrix):
+        error = numpy.random.random()
+        self.converged = error >= 0.5
+        return error
+
+
+def test_Model_train_retry_processes_no_cancel_on_converge():
+    """Lowest error attempt is kept, even if a worse attempt converged."""
+    numpy.random.seed(0)
+    seeds = numpy.random.randint(0, 2**31 - 1, size=6)
+    attempt_errors = []
+    for seed in seeds:
+        numpy.random.seed(seed)
+        attempt_errors.append(numpy.random.random())
+    assert min(attempt_errors) < 0.5 <= max(attempt_errors)
+
+    numpy.random.seed(0)
+    model = _RandomErrorModel()
+    model.logging = False
+    error = model.train(
+        *datasets.get_xor(),
+        iterations=1,
+        retries=5,
+        retry_processes=2,
+        retry_cancel_on_converge=False)
+    assert error == min(attempt_errors)
+    assert not model.converged
+
+
+def test_Model_train_retry_processes_attempt_end_index():
+    """on_attempt_end is given the index of each attempt, not completion order."""
+    from learning import callbacks
+
+    class _AttemptCallback(callbacks.Callback):
+        def __init__(self):
+            self.attempts = {}
+
+        def on_attempt_end(self, model, attempt, error):
+            self.attempts[attempt] = error
+
+    numpy.random.seed(0)
+    seeds = numpy.random.randint(0, 2**31 - 1, size=6)
+    attempt_errors = []
+    for seed in seeds:
+        numpy.random.seed(seed)
+        attempt_errors.append(numpy.random.random())
+
+    numpy.random.seed(0)
+    model = _RandomErrorModel()
+    model.logging = False
+    callback = _AttemptCallback()
+    model.train(
+        *datasets.get_xor(),
+        iterations=1,
+        retries=5,
+        retry_processes=3,
+        retry_cancel_on_converge=False,
+        callbacks=[callback])
+    assert callback.attempts == dict(enumerate(attempt_errors))
+
+
+def test_Model_train_retry_processes_post_pattern_callback():
+    model = helpers.EmptyModel()
+    with pytest.raises(ValueError):
+        model.train(
+            *datasets.get_xor(),
+            retry_processes=2,
+            post_pattern_callback=lambda *args: None)
+
+
+class _ValidationModel(helpers.EmptyModel):
+    """Model with predetermined validation errors, for each iteration."""
+
+    def __init__(self, validation_errors):
+        super(_ValidationModel, self).__init__()
+        self.logging = False
+        self.steps = 0
+        self._validation_errors = validation_errors
+
+    def train_step(self, input_matrix, target_matrix):
+        self.steps += 1
+        return 1.0 / self.steps
+
+    def _get_validation_error(self, input_matrix, target_matrix):
+        return self._validation_errors[self.steps - 1]
+
+    def _get_snapshot(self):
+        return self.steps
+
+    def _restore_snapshot(self, snapshot):
+        self.steps = snapshot
+
+
+def test_Model_train_validation_set_restores_best():
+    model = _ValidationModel([5.0, 4.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0])
+
+    error = model.train(
+        [[0.0]], [[0.0]],
+        iterations=8,
+        error_break=0.0,
+        validation_set=([[0.0]], [[0.0]]),
+        validation_patience=3)
+
+    # Stop after 3 checks without improvement,
+    # and restore model from best validation error
+    assert model.iteration == 6
+    assert model.steps == 3
+    assert error == 1.0 / 3
+
+
+def test_Model_train_validation_set_interval():
+    model = _ValidationModel([5.0, 4.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0])
+
+    model.train(
+        [[0.0]], [[0.0]],
+        iterations=8,
+        error_break=0.0,
+        validation_set=([[0.0]], [[0.0]]),
+        validation_interval=2,
+        validation_patience=2)
+
+    # Checks on 2, 4, 6. Best is 2
+    assert model.iteration == 6
+    assert model.steps == 2
+
+
+def test_Model_train_validation_set_mlp():
+    from learning import MLP
+
+    # Validation set follows the same function as training set
+    inputs = numpy.random.random((20, 2))
+    targets = 0.5 * inputs[:, :1] - 0.25 * inputs[:, 1:]
+    training_set = (inputs[:10], targets[:10])
+    validation_set = (inputs[10:], targets[10:])
+    model = MLP((2, 10, 1))
+    model.logging = False
+
+    initial_error = model._get_validation_error(*validation_set)
+    model.train(
+        *training_set,
+        iterations=50,
+        validation_set=validation_set,
+        validation_patience=5)
+    assert model._get_validation_error(*validation_set) <= initial_error
+
+
+def test_Model_validation_error_uses_error_func():
+    from learning import MLP, SoftmaxTransfer, CrossEntropyError
+
+    # Classifier validation error is cross entropy, not mean squared error
+    dataset = datasets.get_xor()
+    model = MLP(
+        (2, 3, 2), transfers=SoftmaxTransfer(), error_func=CrossEntropyError())
+
+    assert helpers.approx_equal(
+        model._get_validation_error(*dataset),
+        CrossEntropyError()(model.activate(dataset[0]), dataset[1]))
+
+
+def test_Model_snapshot_mlp():
+    from learning import MLP
+
+    dataset = datasets.get_xor()
+    model = MLP((2, 2, 2))
+    model.logging = False
+
+    snapshot = model._get_snapshot()
+    output = model.activate(dataset[0])
+    # Only parameters are copied
+    assert helpers.approx_equal(snapshot, model._get_flat_parameters())
+
+    model.train(*dataset, iterations=5)
+    assert not (model.activate(dataset[0]) == output).all()
+
+    model._restore_snapshot(snapshot)
+    assert (model.activate(dataset[0]) == output).all()
+
+
+def test_Model_snapshot_som():
+    from learning import SOM
+
+    dataset = datasets.get_xor()
+    model = SOM(2, 4)
+    model.logging = False
+
+    snapshot = model._get_snapshot()
+    output = model.activate(dataset[0])
+
+    model.train(*dataset, iterations=5)
+    assert not (model.activate(dataset[0]) == output).all()
+
+    model._restore_snapshot(snapshot)
+    assert (model.activate(dataset[0]) == output).all()
+
+
 def test_Model_custom_converged():
     class ConvergeModel(helpers.SetOutputModel):
         def train_step(self, *args, **kwargs):
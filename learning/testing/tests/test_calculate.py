@@ -220,49 +220,146 @@ def test_dsoftmax_matrix():
 ##############
 # ReLU
 ##############
-def test_relu_transfer():
+def test_relu():
+    assert list(calculate.relu(numpy.array([-1.5, 0., 0.5, 1000.]))) == [
+        0., 0., 0.5, 1000.
+    ]
+
+
+def test_relu_out():
+    x = numpy.array([-1.5, 0., 0.5])
+    out = numpy.empty(3)
+    assert calculate.relu(x, out=out) is out
+    assert list(out) == [0., 0., 0.5]
+
+
+def test_drelu():
+    assert list(calculate.drelu(numpy.array([-1.5, 0., 0.5, 1000.]))) == [
+        0., 0., 1., 1.
+    ]
+
+
+def test_drelu_vector():
+    # Away from 0, where relu is not differentiable
+    helpers.check_gradient(
+        calculate.relu,
+        calculate.drelu,
+        f_arg_tensor=numpy.array([-1.5, -0.5, 0.5, 1.5]),
+        f_shape='lin')
+
+
+def test_leaky_relu():
+    assert list(
+        calculate.leaky_relu(numpy.array([-2., 0., 0.5]), alpha=0.25)) == [
+            -0.5, 0., 0.5
+        ]
+
+
+def test_dleaky_relu():
+    assert list(
+        calculate.dleaky_relu(numpy.array([-2., 0., 0.5]), alpha=0.25)) == [
+            0.25, 0.25, 1.
+        ]
+
+
+def test_dleaky_relu_vector():
+    helpers.check_gradient(
+        calculate.leaky_relu,
+        calculate.dleaky_relu,
+        f_arg_tensor=numpy.array([-1.5, -0.5, 0.5, 1.5]),
+        f_shape='lin')
+
+
+##############
+# Softplus
+##############
+def test_softplus():
     assert helpers.approx_equal(
-        calculate.relu(numpy.array([0, 1])), [0.6931471805, 1.3132616875])
+        calculate.softplus(numpy.array([0, 1])), [0.6931471805, 1.3132616875])
     assert helpers.approx_equal(
-        calculate.relu(numpy.array([-1.5, 10])), [0.201413, 10.00004539])
+        calculate.softplus(numpy.array([-1.5, 10])), [0.201413, 10.00004539])
 
 
-def test_big_relu():
-    """Naive relu can overflow with large input values."""
+def test_big_softplus():
+    """Naive softplus can overflow with large input values."""
     assert helpers.approx_equal(
-        calculate.relu(numpy.array([0., 1000.])), [0.6931471805, 1000])
+        calculate.softplus(numpy.array([0., 1000.])), [0.6931471805, 1000])
 
 
-def test_drelu_simple():
+def test_dsoftplus_simple():
     assert helpers.approx_equal(
-        calculate.drelu(numpy.array([0, 1])), [0.5, 0.73105857])
+        calculate.dsoftplus(numpy.array([0, 1])), [0.5, 0.73105857])
     assert helpers.approx_equal(
-        calculate.drelu(numpy.array([-1.5, 10])), [0.182426, 0.9999546])
+        calculate.dsoftplus(numpy.array([-1.5, 10])), [0.182426, 0.9999546])
 
 
-def test_big_drelu_simple():
-    """Naive relu can overflow with large input values."""
+def test_big_dsoftplus_simple():
+    """Naive softplus can overflow with large input values."""
     assert helpers.approx_equal(
-        calculate.drelu(numpy.array([0., 1000.])), [0.5, 1.0])
+        calculate.dsoftplus(numpy.array([0., 1000.])), [0.5, 1.0])
 
 
-def test_drelu_vector():
-    helpers.check_gradient(calculate.relu, calculate.drelu, f_shape='lin')
+def test_dsoftplus_vector():
+    helpers.check_gradient(
+        calculate.softplus, calculate.dsoftplus, f_shape='lin')
 
 
-def test_drelu_matrix():
+def test_dsoftplus_matrix():
     tensor_shape = [random.randint(1, 10) for _ in range(2)]
 
     helpers.check_gradient(
-        lambda X: calculate.relu(X),
-        lambda X: calculate.drelu(X),
+        lambda X: calculate.softplus(X),
+        lambda X: calculate.dsoftplus(X),
         f_arg_tensor=numpy.random.random(tensor_shape),
         f_shape='lin')
 
 
-def test_big_drelu():
+def test_big_dsoftplus():
     helpers.check_gradient(
-        calculate.relu,
-        calculate.drelu,
+        calculate.softplus,
+        calculate.dsoftplus,
         f_arg_tensor=numpy.array([0., 1000.]),
         f_shape='lin')
+
+
+def test_softplus_scalar():
+    assert helpers.approx_equal(calculate.softplus(0.0), 0.6931471805)
+    assert calculate.softplus(1000.0) == 1000.0
+
+
+def test_softplus_from_exp():
+    x = numpy.array([-1000., -1.5, 0., 1., 10., 1000.])
+    with numpy.errstate(over='ignore'):
+        e_pow_x = numpy.exp(x)
+    assert helpers.approx_equal(
+        calculate.softplus_from_exp(x, e_pow_x), calculate.softplus(x))
+
+
+def test_dsoftplus_from_exp():
+    x = numpy.array([-1000., -1.5, 0., 1., 10., 1000.])
+    with numpy.errstate(over='ignore'):
+        e_pow_x = numpy.exp(x)
+    assert helpers.approx_equal(
+        calculate.dsoftplus_from_exp(e_pow_x), calculate.dsoftplus(x))
+
+
+#####################
+# Fast paths
+#####################
+def test_protvecdiv_broadcast():
+    assert (calculate.protvecdiv(
+        numpy.array([[1.0, 2.0], [3.0, 4.0]]),
+        numpy.array([2.0, 0.0])) == numpy.array([[0.5, 0.0], [1.5,
+                                                             0.0]])).all()
+
+
+@pytest.mark.parametrize('name', sorted(calculate.FAST_PATHS.keys()))
+def test_fast_path_matches_reference(name):
+    fast_func, reference_func = calculate.FAST_PATHS[name]
+    if name == 'protvecdiv':
+        args = (numpy.random.random(20), numpy.random.random(20) *
+                numpy.random.randint(0, 2, 20))
+    else:
+        args = (numpy.random.random(20) * 40.0 - 20.0, )
+
+    assert helpers.approx_equal(fast_func(*args), reference_func(*args))
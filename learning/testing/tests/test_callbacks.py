@@ -0,0 +1,187 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Justin Lovinger
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+
+import logging
+
+import pytest
+
+from learning import callbacks, datasets, validation
+
+from learning.testing import helpers
+
+
+class _RecordCallback(callbacks.Callback):
+    """Callback recording every event, except pattern events."""
+
+    def __init__(self):
+        super(_RecordCallback, self).__init__()
+        self.events = []
+
+    def on_iteration_end(self, model, iteration, error):
+        self.events.append(('iteration', iteration, error))
+
+    def on_converged(self, model, error):
+        self.events.append(('converged', model.iteration, error))
+
+    def on_attempt_end(self, model, attempt, error):
+        self.events.append(('attempt', attempt, error))
+
+    def on_fold_end(self, model, fold, stats):
+        self.events.append(('fold', fold))
+
+
+###################
+# CallbackList
+###################
+def test_callback_list_pattern_callbacks():
+    record_callback = _RecordCallback()
+    pattern_callback = callbacks.PatternCallback(lambda *args: None)
+    callback_list = callbacks.CallbackList([record_callback, pattern_callback])
+
+    assert callback_list.pattern_callbacks == [pattern_callback]
+
+
+def test_callback_list_dispatch():
+    callback_a = _RecordCallback()
+    callback_b = _RecordCallback()
+    callback_list = callbacks.CallbackList([callback_a, callback_b])
+
+    callback_list.on_iteration_end(None, 1, 0.5)
+    callback_list.on_attempt_end(None, 0, 0.5)
+    callback_list.on_fold_end(None, 2, {})
+
+    assert callback_a.events == [('iteration', 1, 0.5), ('attempt', 0, 0.5),
+                                 ('fold', 2)]
+    assert callback_b.events == callback_a.events
+
+
+###################
+# LoggingCallback
+###################
+def _make_timer(times):
+    times = iter(times)
+    return lambda: next(times)
+
+
+def test_logging_callback_sample_every(caplog):
+    caplog.set_level(logging.INFO, logger=callbacks.LOGGER_NAME)
+    callback = callbacks.LoggingCallback(sample_every=3, min_interval=None)
+
+    for iteration in range(1, 8):
+        callback.on_iteration_end(None, iteration, 0.5)
+
+    assert [record.getMessage() for record in caplog.records] == [
+        'Iteration 3, Error: 0.5', 'Iteration 6, Error: 0.5'
+    ]
+
+
+def test_logging_callback_min_interval(caplog):
+    caplog.set_level(logging.INFO, logger=callbacks.LOGGER_NAME)
+    callback = callbacks.LoggingCallback(
+        min_interval=1.0, timer=_make_timer([0.0, 0.5, 1.0, 1.5, 2.5]))
+
+    for iteration in range(1, 6):
+        callback.on_iteration_end(None, iteration, 0.5)
+
+    assert [record.getMessage() for record in caplog.records] == [
+        'Iteration 1, Error: 0.5', 'Iteration 3, Error: 0.5',
+        'Iteration 5, Error: 0.5'
+    ]
+
+
+def test_logging_callback_disabled_logger(caplog):
+    caplog.set_level(logging.WARNING, logger=callbacks.LOGGER_NAME)
+
+    # Timer is not needed when nothing is logged
+    callback = callbacks.LoggingCallback(timer=None)
+    callback.on_iteration_end(None, 1, 0.5)
+
+    assert caplog.records == []
+
+
+def test_logging_callback_bad_sample_every():
+    with pytest.raises(ValueError):
+        callbacks.LoggingCallback(sample_every=0)
+
+
+###################
+# Training events
+###################
+def test_model_train_callbacks():
+    model = helpers.SetOutputModel(1.0)
+    model.logging = False
+    record_callback = _RecordCallback()
+
+    model.train([[0.0]], [[1.0]], iterations=5, callbacks=[record_callback])
+
+    assert record_callback.events == [('iteration', 1, 0.0),
+                                      ('converged', 1, 0.0),
+                                      ('attempt', 0, 0.0)]
+
+
+def test_model_train_callbacks_retries():
+    model = helpers.SetOutputModel(0.0)
+    model.logging = False
+    record_callback = _RecordCallback()
+
+    model.train(
+        [[0.0]], [[1.0]],
+        iterations=2,
+        retries=1,
+        callbacks=[record_callback])
+
+    assert record_callback.events == [('iteration', 1, 1.0),
+                                      ('iteration', 2, 1.0),
+                                      ('attempt', 0, 1.0),
+                                      ('iteration', 1, 1.0),
+                                      ('iteration', 2, 1.0),
+                                      ('attempt', 1, 1.0)]
+
+
+def test_model_train_logging(caplog):
+    caplog.set_level(logging.INFO, logger=callbacks.LOGGER_NAME)
+    model = helpers.SetOutputModel(1.0)
+
+    model.train([[0.0]], [[1.0]], iterations=5)
+
+    assert [record.getMessage() for record in caplog.records] == [
+        'Iteration 1, Error: 0.0', 'Converged at iteration 1, Error: 0.0',
+        'Attempt 0 finished, Error: 0.0'
+    ]
+
+
+def test_cross_validate_callbacks():
+    model = helpers.SetOutputModel([1.0, 0.0])
+    model.logging = False
+    record_callback = _RecordCallback()
+
+    validation.cross_validate(
+        model,
+        datasets.get_xor(),
+        num_folds=2,
+        iterations=1,
+        callbacks=[record_callback])
+
+    assert [event for event in record_callback.events
+            if event[0] == 'fold'] == [('fold', 0), ('fold', 1)]
@@ -0,0 +1,115 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Justin Lovinger
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+
+import numpy
+import pytest
+
+from learning import chunking
+
+from learning.testing import helpers
+
+
+def test_get_chunk_rows_no_limits():
+    assert chunking.get_chunk_rows(100, 10) is None
+
+
+def test_get_chunk_rows_max_batch_rows():
+    assert chunking.get_chunk_rows(100, 10, max_batch_rows=30) == 30
+    assert chunking.get_chunk_rows(100, 10, max_batch_rows=100) is None
+
+    with pytest.raises(ValueError):
+        chunking.get_chunk_rows(100, 10, max_batch_rows=0)
+
+
+def test_get_chunk_rows_memory_budget():
+    # 10 float64 values per row is 80 bytes
+    assert chunking.get_chunk_rows(100, 10, memory_budget=800) == 10
+    assert chunking.get_chunk_rows(100, 10, memory_budget=8000) is None
+
+    # At least 1 row
+    assert chunking.get_chunk_rows(100, 10, memory_budget=1) == 1
+
+    # Smallest of both limits
+    assert chunking.get_chunk_rows(
+        100, 10, max_batch_rows=5, memory_budget=800) == 5
+
+    with pytest.raises(ValueError):
+        chunking.get_chunk_rows(100, 10, memory_budget=0)
+
+
+def test_iter_chunks():
+    assert list(chunking.iter_chunks(10, 4)) == [
+        slice(0, 4), slice(4, 8), slice(8, 10)
+    ]
+
+
+def test_chunked_obj_jac_matches_full():
+    input_matrix = numpy.random.random((10, 3))
+    target_matrix = numpy.random.random((10, 3))
+
+    def obj_jac_func(rows):
+        # Mean squared error, and its gradient with regard to inputs mean
+        error_matrix = input_matrix[rows] - target_matrix[rows]
+        return (numpy.mean(error_matrix**2),
+                2.0 * numpy.mean(error_matrix, axis=0) / 3.0)
+
+    obj_value, jacobian = obj_jac_func(slice(0, 10))
+    chunked_obj_value, chunked_jacobian = chunking.chunked_obj_jac(
+        obj_jac_func, 10, 4)
+    assert helpers.approx_equal(chunked_obj_value, obj_value)
+    assert helpers.approx_equal(chunked_jacobian, jacobian)
+
+    assert helpers.approx_equal(
+        chunking.chunked_obj(lambda rows: obj_jac_func(rows)[0], 10, 4),
+        obj_value)
+
+
+def test_get_num_shards():
+    assert chunking.get_num_shards(10 * chunking.MIN_SHARD_ROWS, 4) == 4
+    # At least MIN_SHARD_ROWS in each shard
+    assert chunking.get_num_shards(2 * chunking.MIN_SHARD_ROWS, 4) == 2
+    assert chunking.get_num_shards(10, 4) == 1
+
+    with pytest.raises(ValueError):
+        chunking.get_num_shards(100, 0)
+
+
+def test_sharded_obj_jac_matches_full():
+    input_matrix = numpy.random.random((10, 3))
+    target_matrix = numpy.random.random((10, 3))
+
+    def obj_jac_func(rows):
+        error_matrix = input_matrix[rows] - target_matrix[rows]
+        return (numpy.mean(error_matrix**2),
+                2.0 * numpy.mean(error_matrix, axis=0) / 3.0)
+
+    obj_value, jacobian = obj_jac_func(slice(0, 10))
+    sharded_obj_value, sharded_jacobian = chunking.sharded_obj_jac(
+        obj_jac_func, 10, 3)
+    assert helpers.approx_equal(sharded_obj_value, obj_value)
+    assert helpers.approx_equal(sharded_jacobian, jacobian)
+
+    assert helpers.approx_equal(
+        chunking.sharded_obj(lambda rows: obj_jac_func(rows)[0], 10, 3),
+        obj_value)
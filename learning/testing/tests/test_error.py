@@ -73,6 +73,22 @@ def test_mse_derivative_error_equals_call_error_matrix():
         error.MeanSquaredError(), tensor_d=2)
 
 
+def test_mse_residuals():
+    tensor_a = numpy.random.random((3, 2))
+    tensor_b = numpy.random.random((3, 2))
+    residuals, scale = error.MeanSquaredError().residuals(tensor_a, tensor_b)
+    assert residuals.shape == (6, )
+    assert helpers.approx_equal(
+        residuals.dot(residuals), error.MeanSquaredError()(tensor_a, tensor_b))
+    assert helpers.approx_equal(residuals, scale * (tensor_a - tensor_b).ravel())
+
+
+def test_residuals_not_implemented():
+    with pytest.raises(NotImplementedError):
+        error.CrossEntropyError().residuals(
+            numpy.array([0.5, 0.5]), numpy.array([0.0, 1.0]))
+
+
 #########################
 # Cross Entropy
 #########################
@@ -0,0 +1,222 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Justin Lovinger
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+
+import copy
+import os
+import signal
+
+import numpy
+import pytest
+
+from learning import datasets, parallel, sparse, L2Penalty, SoftplusTransfer
+from learning.architecture import mlp, regression
+
+from learning.testing import helpers
+
+
+def test_data_parallel_obj_jac_matches_model():
+    _check_obj_jac(mlp.MLP((3, 4, 2)))
+
+
+def test_data_parallel_obj_jac_matches_model_with_penalty():
+    # Penalty is added once, not once per worker
+    _check_obj_jac(
+        regression.LinearRegressionModel(3, 2, penalty_func=L2Penalty()))
+
+
+def test_data_parallel_train_matches_model_train():
+    dataset = datasets.get_random_regression(20, 3, 2)
+    model = mlp.MLP((3, 4, 2))
+    parallel_model = copy.deepcopy(model)
+
+    error = model.train(*dataset, iterations=10)
+    parallel_error = parallel.DataParallelTrainer(
+        parallel_model, num_processes=3).train(*dataset, iterations=10)
+
+    assert helpers.approx_equal(parallel_error, error)
+    assert helpers.approx_equal(parallel_model._get_flat_parameters(),
+                                model._get_flat_parameters())
+
+    # Model uses its own methods after training
+    assert '_get_obj' not in parallel_model.__dict__
+    assert '_get_obj_jac' not in parallel_model.__dict__
+
+
+def test_data_parallel_dropout_mlp_matches_model_train():
+    # Workers use the rows of the dropout masks drawn for each step
+    dataset = datasets.get_random_regression(40, 3, 2)
+    model = mlp.DropoutMLP((3, 4, 2), seed=0)
+    parallel_model = copy.deepcopy(model)
+
+    error = model.train(*dataset, iterations=3)
+    parallel_error = parallel.DataParallelTrainer(
+        parallel_model, num_processes=2).train(*dataset, iterations=3)
+
+    assert helpers.approx_equal(parallel_error, error)
+    assert helpers.approx_equal(parallel_model._get_flat_parameters(),
+                                model._get_flat_parameters())
+
+
+def test_data_parallel_worker_error():
+    model = regression.LinearRegressionModel(3, 2)
+    input_matrix, target_matrix = datasets.get_random_regression(10, 3, 2)
+    with pytest.raises(RuntimeError):
+        # Target does not match model outputs
+        parallel.DataParallelTrainer(model, num_processes=2).train(
+            input_matrix, target_matrix[:, :1], iterations=1)
+
+
+def test_data_parallel_worker_killed():
+    model = regression.LinearRegressionModel(3, 2)
+    input_matrix, target_matrix = datasets.get_random_regression(10, 3, 2)
+    parameters = numpy.copy(model._get_flat_parameters())
+
+    trainer = parallel.DataParallelTrainer(model, num_processes=2)
+    trainer._dataset = (input_matrix, target_matrix)
+    try:
+        trainer._get_obj(parameters, input_matrix, target_matrix)
+
+        # Evaluation fails, instead of waiting forever for a dead worker
+        process = trainer._workers.processes[0]
+        os.kill(process.pid, signal.SIGKILL)
+        process.join()
+        with pytest.raises(RuntimeError):
+            trainer._get_obj(parameters, input_matrix, target_matrix)
+    finally:
+        trainer._stop()
+
+
+def test_data_parallel_retries_not_supported():
+    trainer = parallel.DataParallelTrainer(mlp.MLP((3, 2)), num_processes=2)
+    with pytest.raises(ValueError):
+        trainer.train(*datasets.get_random_regression(10, 3, 2), retries=1)
+
+
+def test_data_parallel_invalid_num_processes():
+    with pytest.raises(ValueError):
+        parallel.DataParallelTrainer(mlp.MLP((3, 2)), num_processes=0)
+
+
+def _check_obj_jac(model):
+    input_matrix, target_matrix = datasets.get_random_regression(10, 3, 2)
+    parameters = numpy.copy(model._get_flat_parameters())
+    error, jacobian = model._get_obj_jac(parameters, input_matrix,
+                                         target_matrix)
+
+    trainer = parallel.DataParallelTrainer(model, num_processes=3)
+    trainer._dataset = (input_matrix, target_matrix)
+    try:
+        parallel_error, parallel_jacobian = trainer._get_obj_jac(
+            parameters, input_matrix, target_matrix)
+        assert helpers.approx_equal(parallel_error, error)
+        assert helpers.approx_equal(parallel_jacobian, jacobian)
+
+        assert helpers.approx_equal(
+            trainer._get_obj(parameters, input_matrix, target_matrix), error)
+    finally:
+        trainer._stop()
+
+
+def test_hogwild_reduces_error():
+    _check_hogwild_reduces_error(*datasets.get_random_regression(50, 3, 2))
+
+
+def test_hogwild_sparse_reduces_error():
+    input_matrix, target_matrix = datasets.get_random_regression(50, 3, 2)
+    # Mostly zero inputs
+    input_matrix[numpy.random.random(input_matrix.shape) < 0.5] = 0.0
+    _check_hogwild_reduces_error(sparse.csr_matrix(input_matrix),
+                                 target_matrix)
+
+
+def test_hogwild_dropout_mlp_uses_masks():
+    dataset = datasets.get_random_regression(20, 3, 2)
+    model = mlp.DropoutMLP((3, 4, 2), seed=0)
+    # Same weights, without dropout
+    model_2 = mlp.DropoutMLP(
+        (3, 4, 2), input_active_probability=1.0, hidden_active_probability=1.0)
+    model_2._set_flat_parameters(numpy.copy(model._get_flat_parameters()))
+
+    # Seeded, so both models train on the same mini-batches
+    numpy.random.seed(0)
+    parallel.HogwildTrainer(model, num_processes=1).train(
+        *dataset, iterations=5)
+    numpy.random.seed(0)
+    parallel.HogwildTrainer(model_2, num_processes=1).train(
+        *dataset, iterations=5)
+    assert not numpy.array_equal(model._get_flat_parameters(),
+                                 model_2._get_flat_parameters())
+
+    # Masks are only used during training
+    assert model._masks is None
+
+
+def test_hogwild_post_train_clears_transfer_caches():
+    model = mlp.MLP((3, 4, 2), transfers=SoftplusTransfer())
+    parallel.HogwildTrainer(model, num_processes=1).train(
+        *datasets.get_random_regression(10, 3, 2), iterations=1)
+    assert all(transfer._cache is None for transfer in model._transfers)
+
+
+def test_hogwild_worker_error():
+    model = regression.LinearRegressionModel(3, 2)
+    input_matrix, target_matrix = datasets.get_random_regression(10, 3, 2)
+    with pytest.raises(RuntimeError):
+        # Target does not match model outputs
+        parallel.HogwildTrainer(model, num_processes=2).train(
+            input_matrix, target_matrix[:, :1], iterations=1)
+
+
+def test_hogwild_worker_exit():
+    def exit_selection_func(input_matrix, target_matrix):
+        os._exit(1)
+
+    model = regression.LinearRegressionModel(3, 2)
+    with pytest.raises(RuntimeError):
+        parallel.HogwildTrainer(
+            model, num_processes=2,
+            pattern_selection_func=exit_selection_func).train(
+                *datasets.get_random_regression(10, 3, 2), iterations=1)
+
+
+def test_hogwild_invalid_args():
+    with pytest.raises(ValueError):
+        parallel.HogwildTrainer(mlp.MLP((3, 2)), num_processes=0)
+    with pytest.raises(ValueError):
+        parallel.HogwildTrainer(mlp.MLP((3, 2)), step_size=0.0)
+
+
+def _check_hogwild_reduces_error(input_matrix, target_matrix):
+    model = regression.LinearRegressionModel(3, 2)
+    initial_error = model._get_obj(
+        numpy.copy(model._get_flat_parameters()), input_matrix, target_matrix)
+
+    error = parallel.HogwildTrainer(
+        model, num_processes=2, step_size=0.1).train(
+            input_matrix, target_matrix, iterations=100)
+    assert error < initial_error
+    assert helpers.approx_equal(
+        model._get_obj(
+            numpy.copy(model._get_flat_parameters()), input_matrix,
+            target_matrix), error)
@@ -23,6 +23,7 @@
 ###############################################################################
 
 import random
+import pickle
 import copy
 
 import pytest
@@ -83,12 +84,58 @@ def test_make_onehot_2d():
                                                            [1, 0]])).all()
 
 
-def make_labels():
+def test_make_onehot_float():
+    assert (preprocess.make_onehot([0.1, 0.30000000000000004, 0.1]) ==
+            numpy.array([[1, 0], [0, 1], [1, 0]])).all()
+
+
+def test_make_labels():
     onehot = numpy.array([[1, 0], [0, 1], [1, 0]])
     assert (preprocess.make_labels(onehot) == numpy.array([[0], [1],
                                                            [0]])).all()
 
 
+def test_LabelEncoder_transform():
+    encoder = preprocess.LabelEncoder().fit(['b', 'a', 'b', 'c'])
+    assert (encoder.classes == ['b', 'a', 'c']).all()
+
+    onehot_matrix = encoder.transform(['c', 'b'])
+    assert (onehot_matrix == numpy.array([[0, 0, 1], [1, 0, 0]])).all()
+    assert (encoder.inverse_transform(onehot_matrix) == ['c', 'b']).all()
+
+    with pytest.raises(ValueError):
+        encoder.transform(['d'])
+
+
+def test_LabelEncoder_transform_rows():
+    encoder = preprocess.LabelEncoder(output='labels')
+    labels = encoder.fit_transform([[1, 2], [0, 1], [1, 2]])
+    assert (labels == numpy.array([[0], [1], [0]])).all()
+
+    labels = encoder.transform([[0, 1], [0, 1], [1, 2]])
+    assert (labels == numpy.array([[1], [1], [0]])).all()
+    assert (encoder.inverse_transform(labels) == numpy.array([[0, 1], [0, 1],
+                                                              [1, 2]])).all()
+
+    with pytest.raises(ValueError):
+        encoder.transform([[1, 0]])
+
+
+def test_LabelEncoder_sparse():
+    encoder = preprocess.LabelEncoder(output='sparse')
+    onehot_matrix = encoder.fit_transform([3, 1, 3, 2])
+    assert (onehot_matrix.toarray() == numpy.array([[1, 0, 0], [0, 1, 0],
+                                                    [1, 0, 0], [0, 0, 1]])).all()
+    assert (encoder.inverse_transform(onehot_matrix) == [3, 1, 3, 2]).all()
+
+
+def test_LabelEncoder_not_fit():
+    with pytest.raises(ValueError):
+        preprocess.LabelEncoder().transform([1])
+    with pytest.raises(ValueError):
+        preprocess.LabelEncoder(output='dense')
+
+
 #################
 # Normalization
 #################
@@ -139,6 +186,114 @@ def test_normalize_one_row():
         preprocess.normalize(numpy.array(matrix))
 
 
+def test_rescale_single_value_column():
+    assert (preprocess.rescale(numpy.array([[1.0, 2.0], [1.0, 4.0]])) ==
+            numpy.array([[0.0, -1.0], [0.0, 1.0]])).all()
+
+
+def test_Normalizer_partial_fit():
+    matrix = numpy.random.random((100, 5)) * 10.0 + 3.0
+
+    normalizer = preprocess.Normalizer()
+    for i in range(0, 100, 30):
+        normalizer.partial_fit(matrix[i:i + 30])
+
+    assert normalizer.count == 100
+    assert numpy.allclose(normalizer.mean, numpy.mean(matrix, axis=0))
+    assert numpy.allclose(normalizer.std, numpy.std(matrix, axis=0))
+    assert numpy.allclose(
+        normalizer.transform(matrix), preprocess.normalize(matrix))
+
+
+def test_Normalizer_fit_resets():
+    normalizer = preprocess.Normalizer()
+    normalizer.fit(numpy.random.random((10, 2)) + 100.0)
+
+    matrix = numpy.random.random((10, 2))
+    normalizer.fit(matrix)
+    assert normalizer.count == 10
+    assert numpy.allclose(normalizer.mean, numpy.mean(matrix, axis=0))
+
+
+def test_Normalizer_transform_other_matrix():
+    normalizer = preprocess.Normalizer().fit(
+        numpy.array([[0.0, 1.0], [2.0, 1.0]]))
+
+    # Uses statistics from fit, and column with no deviation becomes 0
+    assert (normalizer.transform(numpy.array([[1.0, 5.0], [3.0, 1.0]])) ==
+            numpy.array([[0.0, 0.0], [2.0, 0.0]])).all()
+
+
+def test_Normalizer_inverse_transform():
+    matrix = numpy.random.random((10, 3))
+    normalizer = preprocess.Normalizer().fit(matrix)
+
+    assert numpy.allclose(
+        normalizer.inverse_transform(normalizer.transform(matrix)), matrix)
+
+
+def test_Normalizer_not_fit():
+    with pytest.raises(ValueError):
+        preprocess.Normalizer().transform(numpy.random.random((10, 3)))
+
+
+def test_Rescaler_partial_fit():
+    matrix = numpy.random.random((100, 5)) * 10.0 - 3.0
+
+    rescaler = preprocess.Rescaler()
+    for i in range(0, 100, 30):
+        rescaler.partial_fit(matrix[i:i + 30])
+
+    assert (rescaler.min == numpy.min(matrix, axis=0)).all()
+    assert (rescaler.max == numpy.max(matrix, axis=0)).all()
+    assert (rescaler.transform(matrix) == preprocess.rescale(matrix)).all()
+
+
+def test_Rescaler_inverse_transform():
+    matrix = numpy.random.random((10, 3))
+    matrix[:, 1] = 2.0
+    rescaler = preprocess.Rescaler().fit(matrix)
+
+    assert numpy.allclose(
+        rescaler.inverse_transform(rescaler.transform(matrix)), matrix)
+
+
+def test_Scaler_transform_in_place():
+    matrix = numpy.random.random((10, 3))
+    expected = preprocess.rescale(matrix)
+
+    scaled_matrix = preprocess.Rescaler().fit(matrix).transform(
+        matrix, copy=False)
+    assert scaled_matrix is matrix
+    assert (matrix == expected).all()
+
+    # Only arrays of floats
+    with pytest.raises(TypeError):
+        preprocess.Rescaler().fit([[1, 2], [3, 4]]).transform(
+            [[1, 2], [3, 4]], copy=False)
+    with pytest.raises(TypeError):
+        preprocess.Rescaler().fit([[1, 2], [3, 4]]).transform(
+            numpy.array([[1, 2], [3, 4]]), copy=False)
+
+
+def test_Scaler_transform_dtype():
+    matrix = numpy.random.random((10, 3))
+    scaled_matrix = preprocess.Normalizer().fit(matrix).transform(
+        matrix, dtype='float32')
+
+    assert scaled_matrix.dtype == numpy.float32
+    assert numpy.allclose(scaled_matrix, preprocess.normalize(matrix), atol=1e-6)
+
+
+def test_Scaler_pickle():
+    matrix = numpy.random.random((10, 3))
+    normalizer = preprocess.Normalizer().fit(matrix)
+
+    unpickled_normalizer = pickle.loads(pickle.dumps(normalizer))
+    assert (unpickled_normalizer.transform(matrix) == normalizer.transform(
+        matrix)).all()
+
+
 ######################
 # Depuration functions
 ######################
@@ -237,6 +392,27 @@ def test_pca_using_num_dimensions_func():
         preprocess.pca(data, select_dimensions_func=selection_func), expected)
 
 
+def test_pca_num_dimensions_func_ascending_indices():
+    # Two correlated attributes, and one independent attribute
+    base = numpy.random.random(20)
+    data = numpy.vstack([
+        base, base + numpy.random.normal(scale=0.1, size=20),
+        numpy.random.random(20)
+    ]).T
+    components = preprocess.PCA(whiten=True).fit_transform(data)
+
+    # Indices are for eigenvalues in ascending order
+    assert numpy.allclose(
+        preprocess.pca(data, select_dimensions_func=lambda v: [2, 0]),
+        components[:, [0, 2]])
+
+    # Eigenvalues are given in ascending order
+    eigen_values = []
+    preprocess.pca(
+        data, select_dimensions_func=lambda v: eigen_values.extend(v) or [0])
+    assert eigen_values == sorted(eigen_values)
+
+
 def test_pca_no_expected_or_func():
     with pytest.raises(ValueError):
         preprocess.pca([], None, None)
@@ -247,6 +423,88 @@ def test_pca_both_expected_and_func():
         preprocess.pca([], 1, lambda x: [0])
 
 
+def test_PCA_transform_new_data():
+    matrix = numpy.random.random((50, 5))
+    pca_model = preprocess.PCA(2)
+    reduced_matrix = pca_model.fit_transform(matrix[:40])
+
+    assert reduced_matrix.shape == (40, 2)
+    assert numpy.allclose(pca_model.transform(matrix[:40]), reduced_matrix)
+    assert pca_model.transform(matrix[40:]).shape == (10, 2)
+
+    # Components in order of variance
+    assert pca_model.explained_variance[0] >= pca_model.explained_variance[1]
+    assert numpy.allclose(
+        numpy.var(reduced_matrix, axis=0, ddof=1),
+        pca_model.explained_variance)
+
+
+def test_PCA_whiten():
+    matrix = numpy.random.random((50, 5))
+    reduced_matrix = preprocess.PCA(3, whiten=True).fit_transform(matrix)
+
+    assert numpy.allclose(numpy.std(reduced_matrix, axis=0), 1.0)
+
+
+def test_PCA_randomized():
+    # Low rank matrix with noise
+    matrix = numpy.random.random((200, 3)).dot(numpy.random.random(
+        (3, 30))) + 0.01 * numpy.random.random((200, 30))
+
+    full_pca = preprocess.PCA(3).fit(matrix)
+    randomized_pca = preprocess.PCA(3, method='randomized').fit(matrix)
+
+    assert numpy.allclose(randomized_pca.explained_variance,
+                          full_pca.explained_variance)
+    assert numpy.allclose(
+        randomized_pca.components, full_pca.components, atol=1e-6)
+
+
+def test_PCA_partial_fit():
+    matrix = numpy.random.random((100, 5))
+
+    pca_model = preprocess.PCA(3)
+    for i in range(0, 100, 30):
+        pca_model.partial_fit(matrix[i:i + 30])
+    full_pca = preprocess.PCA(3).fit(matrix)
+
+    assert numpy.allclose(pca_model.explained_variance, full_pca.explained_variance)
+    assert numpy.allclose(pca_model.transform(matrix), full_pca.transform(matrix))
+
+
+def test_PCA_partial_fit_large_offset():
+    # Covariance must not lose precision when attributes have a large mean
+    matrix = numpy.random.random((100, 3)).dot(numpy.random.random((3, 5)))
+
+    pca_model = preprocess.PCA(3, normalize=False)
+    for i in range(0, 100, 30):
+        pca_model.partial_fit(matrix[i:i + 30] + 1e8)
+    full_pca = preprocess.PCA(3, normalize=False).fit(matrix)
+
+    assert numpy.allclose(pca_model.explained_variance, full_pca.explained_variance)
+
+
+def test_PCA_partial_fit_randomized():
+    matrix = numpy.random.random((100, 3)).dot(numpy.random.random((3, 10)))
+
+    pca_model = preprocess.PCA(3, method='randomized', normalize=False)
+    for i in range(0, 100, 30):
+        pca_model.partial_fit(matrix[i:i + 30])
+    full_pca = preprocess.PCA(3, normalize=False).fit(matrix)
+
+    assert numpy.allclose(pca_model.transform(matrix), full_pca.transform(matrix))
+
+
+def test_PCA_not_fit():
+    with pytest.raises(ValueError):
+        preprocess.PCA(1).transform([[0, 1], [1, 0]])
+
+
+def test_PCA_randomized_no_num_components():
+    with pytest.raises(ValueError):
+        preprocess.PCA(method='randomized')
+
+
 ###########################
 # Default cleaning function
 ###########################
@@ -307,3 +565,21 @@ def test_clean_dataset_with_pca():
     ]
     assert ((numpy.array(preprocess.clean_dataset(*zip(*patterns))) ==
              numpy.array(zip(*expected)))).all()
+
+
+def test_clean_dataset_with_pca_model():
+    input_matrix = numpy.array([[0.0, 0.0]] * 4 + [[1.0, 1.0]] * 4)
+    target_matrix = numpy.array([(0, )] * 4 + [(1, )] * 4)
+
+    pca_model = preprocess.PCA(1, method='randomized', whiten=True)
+    cleaned_inputs, _ = preprocess.clean_dataset(
+        input_matrix, target_matrix, pca_model=pca_model)
+    assert pca_model.components is not None
+    assert numpy.allclose(cleaned_inputs, [[-1.0]] * 4 + [[1.0]] * 4)
+
+    # Reuses fit projection
+    components = pca_model.components
+    cleaned_inputs, _ = preprocess.clean_dataset(
+        input_matrix, target_matrix, pca_model=pca_model)
+    assert pca_model.components is components
+    assert numpy.allclose(cleaned_inputs, [[-1.0]] * 4 + [[1.0]] * 4)
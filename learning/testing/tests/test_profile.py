@@ -0,0 +1,194 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Justin Lovinger
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+
+import json
+import os
+import threading
+
+import pytest
+
+from learning import profile, MLP
+from learning.data import datasets
+from learning.optimize import Problem, BFGS, WolfeLineSearch
+
+
+def _make_timer():
+    """Return timer that advances by 1 every call."""
+    times = iter(range(1000))
+    return lambda: float(next(times))
+
+
+############################
+# TrainingProfiler
+############################
+def test_training_profiler_phase_and_evaluation():
+    profiler = profile.TrainingProfiler(timer=_make_timer())
+
+    profiler.start_iteration()  # t = 0
+    with profiler.phase('a'):  # t = 1
+        profiler.evaluation('obj', 'jac')
+        with profiler.phase(profile.LINE_SEARCH):  # t = 2
+            profiler.evaluation('obj')
+            profiler.evaluation('obj')
+        # t = 3
+    # t = 4
+    profiler.end_iteration(1, 0.5)  # t = 5
+
+    assert profiler.history == [{
+        'iteration': 1,
+        'attempt': 0,
+        'error': 0.5,
+        'time': 5.0,
+        'obj_evals': 3,
+        'jac_evals': 1,
+        'hess_evals': 0,
+        'line_search_trials': 2,
+        'phases': {
+            'a': 3.0,
+            profile.LINE_SEARCH: 1.0
+        }
+    }]
+
+
+def test_training_profiler_phases_per_thread():
+    profiler = profile.TrainingProfiler()
+    worker_entered = threading.Event()
+    main_exited = threading.Event()
+
+    def worker():
+        with profiler.phase(profile.FORWARD):
+            worker_entered.set()
+            main_exited.wait()
+            profiler.evaluation('obj')
+
+    profiler.start_iteration()
+    with profiler.phase(profile.LINE_SEARCH):
+        thread = threading.Thread(target=worker)
+        thread.start()
+        worker_entered.wait()
+    # Exiting a phase in the main thread does not end the worker phase
+    main_exited.set()
+    thread.join()
+    profiler.end_iteration(1, 0.5)
+
+    assert profiler._active_phases == []
+    record = profiler.history[0]
+    assert record['obj_evals'] == 1
+    assert record['line_search_trials'] == 0
+    assert sorted(record['phases']) == [profile.FORWARD, profile.LINE_SEARCH]
+
+
+def test_training_profiler_ignores_outside_iteration():
+    profiler = profile.TrainingProfiler()
+    profiler.evaluation('obj')
+    with profiler.phase('a'):
+        pass
+    assert profiler.history == []
+
+    with pytest.raises(ValueError):
+        profiler.end_iteration(1, 0.5)
+
+
+def test_training_profiler_summary_and_save(tmpdir):
+    profiler = profile.TrainingProfiler(timer=_make_timer())
+    for iteration in range(1, 3):
+        profiler.start_iteration()
+        with profiler.phase('a'):
+            profiler.evaluation('jac')
+        profiler.end_iteration(iteration, None)
+
+    summary = profiler.summary()
+    assert summary == {
+        'iterations': 2,
+        'time': 6.0,
+        'obj_evals': 0,
+        'jac_evals': 2,
+        'hess_evals': 0,
+        'line_search_trials': 0,
+        'phases': {
+            'a': 2.0
+        }
+    }
+
+    filename = os.path.join(str(tmpdir), 'trace.json')
+    profiler.save(filename)
+    with open(filename) as trace_file:
+        trace = json.load(trace_file)
+    assert trace['summary'] == summary
+    assert trace['history'] == profiler.history
+
+
+############################
+# Instrumentation
+############################
+def test_problem_counts_evaluations_when_profiling():
+    profiler = profile.TrainingProfiler()
+    previous_profiler = profile.set_profiler(profiler)
+    try:
+        problem = Problem(obj_jac_func=lambda x: (x, 2 * x))
+        profiler.start_iteration()
+        assert problem.get_obj_jac(1) == (1, 2)
+        assert problem.get_jac(1) == 2
+        profiler.end_iteration(1, None)
+    finally:
+        profile.set_profiler(previous_profiler)
+
+    assert profiler.history[0]['obj_evals'] == 1
+    assert profiler.history[0]['jac_evals'] == 2
+
+
+def test_problem_not_wrapped_without_profiler():
+    obj_jac_func = lambda x: (x, 2 * x)
+    assert Problem(obj_jac_func=obj_jac_func).get_obj_jac is obj_jac_func
+
+
+def test_model_train_profiler():
+    dataset = datasets.get_xor()
+    model = MLP((2, 2, 2), optimizer=BFGS(step_size_getter=WolfeLineSearch()))
+
+    profiler = profile.TrainingProfiler()
+    model.train(*dataset, iterations=5, retries=1, profiler=profiler)
+
+    # Profiler is only active during train
+    assert profile.get_profiler() is None
+
+    assert len(profiler.history) > 0
+    assert [record['iteration'] for record in profiler.history
+            if record['attempt'] == 0][:2] == [1, 2]
+    for record in profiler.history:
+        # First evaluation is for direction, the rest are line search trials
+        assert record['obj_evals'] == record['jac_evals']
+        assert record['obj_evals'] == record['line_search_trials'] + 1
+        assert set(record['phases']) == set([
+            profile.FORWARD, profile.BACKWARD, profile.DIRECTION,
+            profile.LINE_SEARCH
+        ])
+
+
+def test_model_train_profiler_retry_processes():
+    with pytest.raises(ValueError):
+        MLP((2, 2, 2)).train(
+            *datasets.get_xor(),
+            retry_processes=2,
+            profiler=profile.TrainingProfiler())
@@ -0,0 +1,97 @@
+###############################################################################
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Justin Lovinger
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+###############################################################################
+
+import numpy
+import pytest
+
+from learning import sparse
+
+
+def _random_sparse_dense(shape=(8, 6), density=0.3):
+    matrix = numpy.random.random(shape)
+    matrix[numpy.random.random(shape) > density] = 0.0
+    # Include an empty row
+    matrix[1] = 0.0
+    return matrix
+
+
+def test_CSRMatrix_from_dense_toarray():
+    matrix = _random_sparse_dense()
+    csr_matrix = sparse.CSRMatrix.from_dense(matrix)
+
+    assert csr_matrix.shape == matrix.shape
+    assert csr_matrix.nnz == numpy.count_nonzero(matrix)
+    assert (csr_matrix.toarray() == matrix).all()
+
+
+def test_CSRMatrix_dot():
+    matrix = _random_sparse_dense()
+    csr_matrix = sparse.CSRMatrix.from_dense(matrix)
+
+    dense_matrix = numpy.random.random((6, 3))
+    assert numpy.allclose(csr_matrix.dot(dense_matrix), matrix.dot(dense_matrix))
+
+    dense_vector = numpy.random.random(6)
+    assert numpy.allclose(csr_matrix.dot(dense_vector), matrix.dot(dense_vector))
+
+    with pytest.raises(ValueError):
+        csr_matrix.dot(numpy.random.random((5, 3)))
+
+
+def test_CSRMatrix_transpose_dot():
+    matrix = _random_sparse_dense()
+    csr_matrix = sparse.CSRMatrix.from_dense(matrix)
+
+    dense_matrix = numpy.random.random((8, 3))
+    assert numpy.allclose(csr_matrix.T.dot(dense_matrix),
+                          matrix.T.dot(dense_matrix))
+    assert (csr_matrix.T.toarray() == matrix.T).all()
+    assert csr_matrix.T.T is csr_matrix
+
+
+def test_CSRMatrix_getitem():
+    matrix = _random_sparse_dense()
+    csr_matrix = sparse.CSRMatrix.from_dense(matrix)
+
+    assert (csr_matrix[2:5].toarray() == matrix[2:5]).all()
+    assert (csr_matrix[[4, 0, 1, 4]].toarray() == matrix[[4, 0, 1, 4]]).all()
+    assert (csr_matrix[3].toarray() == matrix[3:4]).all()
+    assert [row.shape for row in csr_matrix] == [(1, 6)] * 8
+
+
+def test_dot():
+    matrix = _random_sparse_dense()
+    dense_matrix = numpy.random.random((6, 3))
+
+    assert numpy.allclose(
+        sparse.dot(sparse.csr_matrix(matrix), dense_matrix),
+        matrix.dot(dense_matrix))
+    assert numpy.allclose(
+        sparse.dot(matrix, dense_matrix), matrix.dot(dense_matrix))
+
+
+def test_issparse():
+    assert sparse.issparse(sparse.csr_matrix(numpy.eye(2)))
+    assert sparse.issparse(sparse.CSRMatrix.from_dense(numpy.eye(2)))
+    assert not sparse.issparse(numpy.eye(2))
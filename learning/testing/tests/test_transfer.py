@@ -22,4 +22,99 @@
 # SOFTWARE.
 ###############################################################################
 
+import copy
+
+import numpy
+import pytest
+
+from learning import calculate, transfer
+
+from learning.testing import helpers
+
+
 # TODO: Check gradient of transfer functions
+def test_softplus_transfer_shares_exp_with_derivative():
+    transfer_func = transfer.SoftplusTransfer()
+    input_matrix = numpy.random.random((3, 2)) * 10.0 - 5.0
+
+    output_matrix = transfer_func(input_matrix)
+    assert helpers.approx_equal(output_matrix, calculate.softplus(input_matrix))
+    assert transfer_func._cache[0] is input_matrix
+    assert helpers.approx_equal(
+        transfer_func.derivative(input_matrix, output_matrix),
+        calculate.dsoftplus(input_matrix))
+
+    # Derivative of other inputs does not use cached e^x
+    other_matrix = input_matrix + 1.0
+    assert helpers.approx_equal(
+        transfer_func.derivative(other_matrix,
+                                 calculate.softplus(other_matrix)),
+        calculate.dsoftplus(other_matrix))
+
+    # Cache is not copied
+    assert copy.deepcopy(transfer_func)._cache is None
+
+    transfer_func.clear_cache()
+    assert transfer_func._cache is None
+
+
+def test_relu_transfer_is_exact():
+    transfer_func = transfer.ReluTransfer()
+    input_vec = numpy.array([-2.0, -0.5, 0.5, 2.0])
+    output_vec = transfer_func(input_vec)
+
+    assert list(output_vec) == [0.0, 0.0, 0.5, 2.0]
+    assert list(transfer_func.derivative(input_vec, output_vec)) == [
+        0.0, 0.0, 1.0, 1.0
+    ]
+
+
+def test_leaky_relu_transfer():
+    transfer_func = transfer.LeakyReluTransfer(alpha=0.1)
+    input_vec = numpy.array([-2.0, 0.5])
+    output_vec = transfer_func(input_vec)
+
+    assert helpers.approx_equal(output_vec, [-0.2, 0.5])
+    assert helpers.approx_equal(
+        transfer_func.derivative(input_vec, output_vec), [0.1, 1.0])
+
+
+def test_leaky_relu_transfer_invalid_alpha():
+    with pytest.raises(ValueError):
+        transfer.LeakyReluTransfer(alpha=1.0)
+    with pytest.raises(ValueError):
+        transfer.LeakyReluTransfer(alpha=-0.1)
+
+
+def test_linear_transfer_is_identity():
+    transfer_func = transfer.LinearTransfer()
+    input_vec = numpy.random.random(3)
+
+    assert transfer_func.identity
+    assert transfer_func(input_vec) is input_vec
+    assert list(transfer_func.derivative(input_vec, input_vec)) == [1.0] * 3
+
+
+@pytest.mark.parametrize('transfer_func', [
+    transfer.LinearTransfer(),
+    transfer.TanhTransfer(),
+    transfer.ReluTransfer(),
+    transfer.LeakyReluTransfer(),
+    transfer.SoftplusTransfer(),
+    transfer.GaussianTransfer(),
+    transfer.SoftmaxTransfer(),
+])
+def test_transfer_out_matches_allocating(transfer_func):
+    input_matrix = numpy.random.random((3, 4)) * 4.0 - 2.0
+    expected_output = transfer_func(input_matrix)
+    expected_derivative = transfer_func.derivative(input_matrix,
+                                                   expected_output)
+
+    out = numpy.empty_like(input_matrix)
+    assert transfer_func(input_matrix, out=out) is out
+    assert helpers.approx_equal(out, expected_output)
+
+    derivative_out = numpy.empty_like(expected_derivative)
+    assert transfer_func.derivative(
+        input_matrix, out, out=derivative_out) is derivative_out
+    assert helpers.approx_equal(derivative_out, expected_derivative)
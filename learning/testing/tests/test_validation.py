@@ -28,7 +28,7 @@ import time
 import numpy
 
 from learning import validation, MeanSquaredError
-from learning.data import datasets
+from learning.data import datasets, stream
 
 from learning.testing import helpers
 
@@ -329,6 +329,18 @@ def test_get_error():
         error_func=MeanSquaredError()) == 0.25
 
 
+def test_get_error_chunked_dataset():
+    model = helpers.SetOutputModel([1])
+    # Uneven chunks are weighted by number of rows
+    dataset = stream.MemmapDataset(
+        numpy.array([[1], [1], [1]]),
+        numpy.array([[1], [0], [0]]),
+        chunk_rows=2)
+    assert helpers.approx_equal(
+        validation.get_error(model, dataset, error_func=MeanSquaredError()),
+        2.0 / 3.0)
+
+
 def test_get_accuracy():
     model = helpers.SetOutputModel([1])
     assert validation.get_accuracy(model,
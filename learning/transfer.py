@@ -31,65 +31,157 @@ from learning import calculate
 
 
 class Transfer(object):
-    def __call__(self, input_vec):
+    """Transfer function, applied element-wise to the layers of a model.
+
+    Transfers may cache intermediate values from __call__, for use in derivative,
+    with _set_cache and _get_cache.
+    A cached value is only used for the same input array, and is not pickled.
+    """
+
+    # If True, this transfer returns its input, and has a derivative of 1.
+    # Models can skip multiplying by the derivative of an identity transfer.
+    identity = False
+
+    # (input_vec, value) from last __call__
+    _cache = None
+
+    def __call__(self, input_vec, out=None):
+        """Return the output of this function.
+
+        Args:
+            input_vec: Input tensor.
+            out: Optional array to store output in, with the shape of input_vec.
+        """
         raise NotImplementedError()
 
-    def derivative(self, input_vec, output_vec):
+    def derivative(self, input_vec, output_vec, out=None):
         """Return the derivative of this function.
 
         We take both input and output vector because
         some derivatives can be more efficiently calculated from
         the output of this function.
+
+        Returns a newly allocated array, or out if given.
         """
         raise NotImplementedError()
 
+    def _set_cache(self, input_vec, value):
+        """Cache value computed for input_vec, for use in derivative."""
+        self._cache = (input_vec, value)
+
+    def _get_cache(self, input_vec):
+        """Return value cached for input_vec, or None."""
+        if self._cache is not None and self._cache[0] is input_vec:
+            return self._cache[1]
+        return None
+
+    def clear_cache(self):
+        """Release cached values, such as after training."""
+        self._cache = None
+
+    def __getstate__(self):
+        # Do not pickle or copy cached values
+        state = self.__dict__.copy()
+        state.pop('_cache', None)
+        return state
+
 
 class LinearTransfer(Transfer):
-    def __call__(self, input_vec):
-        return input_vec
+    identity = True
+
+    def __call__(self, input_vec, out=None):
+        return _store(input_vec, out)
 
-    def derivative(self, input_vec, output_vec):
+    def derivative(self, input_vec, output_vec, out=None):
         """Return the derivative of this function.
 
         We take both input and output vector because
         some derivatives can be more efficiently calculated from
         the output of this function.
         """
-        return numpy.ones(input_vec.shape)
+        if out is None:
+            return numpy.ones(numpy.shape(input_vec))
+        out.fill(1.0)
+        return out
 
 
 class TanhTransfer(Transfer):
-    def __call__(self, input_vec):
-        return calculate.tanh(input_vec)
+    def __call__(self, input_vec, out=None):
+        return calculate.tanh(input_vec, out=out)
 
-    def derivative(self, input_vec, output_vec):
+    def derivative(self, input_vec, output_vec, out=None):
         """Return the derivative of this function.
 
         We take both input and output vector because
         some derivatives can be more efficiently calculated from
         the output of this function.
         """
-        return calculate.dtanh(output_vec)
+        return calculate.dtanh(output_vec, out=out)
 
 
-# TODO: Rename to SoftplusTransfer, and add proper ReLU (same for calculate.relu)
 class ReluTransfer(Transfer):
-    """Smooth approximation of a rectified linear unit (ReLU).
+    """Rectified linear unit (ReLU), f(x) = max(0, x)."""
+
+    def __call__(self, input_vec, out=None):
+        return calculate.relu(input_vec, out=out)
+
+    def derivative(self, input_vec, output_vec, out=None):
+        """Return the derivative of this function.
+
+        We take both input and output vector because
+        some derivatives can be more efficiently calculated from
+        the output of this function.
+        """
+        return calculate.drelu(input_vec, out=out)
+
 
-    Also known as softplus.
+class LeakyReluTransfer(Transfer):
+    """Leaky rectified linear unit, f(x) = max(alpha x, x).
+
+    Args:
+        alpha: Slope for negative inputs, 0 <= alpha < 1.
     """
 
-    def __call__(self, input_vec):
-        return calculate.relu(input_vec)
+    def __init__(self, alpha=0.01):
+        super(LeakyReluTransfer, self).__init__()
+
+        if not 0.0 <= alpha < 1.0:
+            raise ValueError('alpha must be in range [0, 1)')
+        self._alpha = alpha
 
-    def derivative(self, input_vec, output_vec):
+    def __call__(self, input_vec, out=None):
+        return calculate.leaky_relu(input_vec, self._alpha, out=out)
+
+    def derivative(self, input_vec, output_vec, out=None):
         """Return the derivative of this function.
 
         We take both input and output vector because
         some derivatives can be more efficiently calculated from
         the output of this function.
         """
-        return calculate.drelu(input_vec)
+        return calculate.dleaky_relu(input_vec, self._alpha, out=out)
+
+
+class SoftplusTransfer(Transfer):
+    """Smooth approximation of a rectified linear unit, f(x) = ln(1 + e^x)."""
+
+    def __call__(self, input_vec, out=None):
+        # Share e^x with derivative
+        e_pow_x = numpy.exp(input_vec)
+        self._set_cache(input_vec, e_pow_x)
+        return calculate.softplus_from_exp(input_vec, e_pow_x, out=out)
+
+    def derivative(self, input_vec, output_vec, out=None):
+        """Return the derivative of this function.
+
+        We take both input and output vector because
+        some derivatives can be more efficiently calculated from
+        the output of this function.
+        """
+        e_pow_x = self._get_cache(input_vec)
+        if e_pow_x is not None:
+            return calculate.dsoftplus_from_exp(e_pow_x, out=out)
+        return _store(calculate.dsoftplus(input_vec), out)
 
 
 # TODO
@@ -103,28 +195,40 @@ class GaussianTransfer(Transfer):
 
         self._variance = variance
 
-    def __call__(self, input_vec):
-        return calculate.gaussian(input_vec, self._variance)
+    def __call__(self, input_vec, out=None):
+        return _store(calculate.gaussian(input_vec, self._variance), out)
 
-    def derivative(self, input_vec, output_vec):
+    def derivative(self, input_vec, output_vec, out=None):
         """Return the derivative of this function.
 
         We take both input and output vector because
         some derivatives can be more efficiently calculated from
         the output of this function.
         """
-        return calculate.dgaussian(input_vec, output_vec, self._variance)
+        return _store(
+            calculate.dgaussian(input_vec, output_vec, self._variance), out)
 
 
 class SoftmaxTransfer(Transfer):
-    def __call__(self, input_vec):
-        return calculate.softmax(input_vec)
+    def __call__(self, input_vec, out=None):
+        return _store(calculate.softmax(input_vec), out)
 
-    def derivative(self, input_vec, output_vec):
+    def derivative(self, input_vec, output_vec, out=None):
         """Return the derivative of this function.
 
+        Returns a jacobian for each row of output_vec,
+        so out, if given, must have an extra dimension.
+
         We take both input and output vector because
         some derivatives can be more efficiently calculated from
         the output of this function.
         """
-        return calculate.dsoftmax(output_vec)
+        return _store(calculate.dsoftmax(output_vec), out)
+
+
+def _store(value, out):
+    """Return value, copied into out if given."""
+    if out is None:
+        return value
+    out[...] = value
+    return out
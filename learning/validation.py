@@ -32,6 +32,8 @@ import collections
 import numpy
 
 from learning import MeanSquaredError
+from learning.callbacks import CallbackList, LoggingCallback
+from learning.data import stream
 
 
 def compare(names, models, datasets, num_folds=3, num_runs=30, all_kwargs={}):
@@ -127,20 +129,28 @@ def benchmark(model, dataset, num_folds=3, num_runs=30, **kwargs):
 
 
 def cross_validate(model, dataset, num_folds=3, **kwargs):
-    """Return various stats for model on all folds of dataset."""
+    """Return various stats for model on all folds of dataset.
+
+    Args:
+        model: The model to validate.
+        dataset: (input_matrix, target_matrix) tuple.
+        num_folds: Number of cross validation folds.
+        **kwargs: Args passed to model.train.
+            callbacks are also given fold end events.
+    """
     # Get our sets, for use in cross validation
     train_test_sets = make_cross_validation_sets(*dataset, num_folds=num_folds)
 
+    callbacks = list(kwargs.get('callbacks') or [])
+    if model.logging:
+        callbacks.append(LoggingCallback())
+    callback_list = CallbackList(callbacks)
+
     # Get the stats on each set
     folds = []
     for i, (train_set, test_set) in enumerate(train_test_sets):
-        if model.logging:
-            print 'Fold {}:'.format(i)
-
         folds.append(_validate_model(model, train_set, test_set, **kwargs))
-
-        if model.logging:
-            print
+        callback_list.on_fold_end(model, i, folds[-1])
 
     stats = {'folds': folds}
 
@@ -232,9 +242,23 @@ def _validate_model(model,
 ######################
 def get_error(model,
               input_matrix,
-              target_matrix,
+              target_matrix=None,
               error_func=MeanSquaredError()):
-    """Return mean error of model on given dataset."""
+    """Return mean error of model on given dataset.
+
+    input_matrix may instead be a stream.ChunkedDataset, with no target_matrix.
+    Error is then computed one chunk at a time.
+    """
+    if isinstance(input_matrix, stream.ChunkedDataset):
+        # Mean of chunk means, weighted by rows in chunk
+        total_error = 0.0
+        num_rows = 0
+        for chunk_inputs, chunk_targets in input_matrix:
+            total_error += get_error(model, chunk_inputs, chunk_targets,
+                                     error_func) * len(chunk_inputs)
+            num_rows += len(chunk_inputs)
+        return total_error / num_rows
+
     # TODO: Activate model on matrix (once all models support it)
     return numpy.mean([
         error_func(model.activate(input_vec), target_vec)